@@ -0,0 +1,178 @@
+"""
+Рассылка уведомлений админам.
+
+Уведомление уходит всем админам из config.ADMIN_IDS параллельно: одновременно не больше
+ADMIN_NOTIFY_CONCURRENCY запросов и не чаще ADMIN_NOTIFY_RATE сообщений в секунду
+(общий лимит Telegram - около 30 сообщений в секунду на бота). На RetryAfter рассылка
+ждет указанное Telegram время и повторяет отправку один раз.
+
+Админ, заблокировавший бота (403 Forbidden), исключается из рассылки на
+ADMIN_NOTIFY_SUPPRESS_SECONDS секунд, чтобы не тратить на него запрос каждый раз.
+
+Тикеты низкого приоритета не рассылаются сразу, а копятся в сводку, которая уходит
+раз в ADMIN_DIGEST_INTERVAL секунд (0 - сводка отключена, все уведомления сразу).
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+
+from config import config
+from post_templates import _truncate, utf16_length
+from ticket_history import MESSAGE_LIMIT
+from ticket_priority import LOW
+
+# Сколько тикетов перечислять в одной сводке, остальные - только числом
+DIGEST_MAX_LINES = 30
+
+
+class RateLimiter:
+    """Равномерно распределяет запросы: не больше rate в секунду"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + 1 / self.rate
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class AdminNotifier:
+    def __init__(self):
+        self._semaphore = asyncio.Semaphore(config.ADMIN_NOTIFY_CONCURRENCY)
+        self._limiter = RateLimiter(config.ADMIN_NOTIFY_RATE)
+        # {admin_id: time.monotonic(), до которого админ исключен из рассылки}
+        self._suppressed: Dict[int, float] = {}
+        self._digest: List[str] = []
+        self._digest_task: Optional[asyncio.Task] = None
+
+    def is_suppressed(self, admin_id: int) -> bool:
+        until = self._suppressed.get(admin_id)
+        if until is None:
+            return False
+        if until <= time.monotonic():
+            del self._suppressed[admin_id]
+            return False
+        return True
+
+    async def _send(self, bot: Bot, admin_id: int, text: str, **kwargs) -> bool:
+        async with self._semaphore:
+            for attempt in range(2):
+                await self._limiter.wait()
+                try:
+                    await bot.send_message(admin_id, text, **kwargs)
+                    return True
+                except TelegramRetryAfter as e:
+                    if attempt:
+                        logging.error(f"Не удалось уведомить админа {admin_id}: лимит Telegram ({e.retry_after} с)")
+                        return False
+                    await asyncio.sleep(e.retry_after)
+                except TelegramForbiddenError as e:
+                    self._suppressed[admin_id] = time.monotonic() + config.ADMIN_NOTIFY_SUPPRESS_SECONDS
+                    logging.warning(f"Админ {admin_id} недоступен, исключен из рассылки на "
+                                    f"{config.ADMIN_NOTIFY_SUPPRESS_SECONDS} с: {e}")
+                    return False
+                except Exception as e:
+                    logging.error(f"Не удалось уведомить админа {admin_id}: {e}")
+                    return False
+        return False
+
+    async def notify(self, bot: Bot, text: str, admin_ids: Iterable[int] = None, **kwargs) -> int:
+        """
+        Отправляет сообщение всем админам параллельно.
+
+        Returns:
+            сколько админов получили сообщение
+        """
+        recipients = [admin_id for admin_id in dict.fromkeys(admin_ids or config.ADMIN_IDS)
+                      if not self.is_suppressed(admin_id)]
+        if not recipients:
+            return 0
+        results = await asyncio.gather(*(self._send(bot, admin_id, text, **kwargs) for admin_id in recipients))
+        return sum(results)
+
+    async def notify_ticket(self, bot: Bot, ticket, text: str) -> int:
+        """Уведомление о новом тикете: низкий приоритет уходит в сводку, остальные - сразу"""
+        if ticket.priority == LOW and config.ADMIN_DIGEST_INTERVAL > 0:
+            self._digest.append(text)
+            return 0
+        return await self.notify(bot, text)
+
+    def _digest_messages(self, lines: List[str]) -> List[str]:
+        """Текст сводки, разбитый на сообщения в пределах лимита Telegram (он считается в UTF-16)"""
+        header = f"📋 Сводка новых тикетов низкого приоритета: {len(lines)}\n\n"
+        shown = lines[:DIGEST_MAX_LINES]
+        messages, current, length = [], header, utf16_length(header)
+        for line in shown:
+            entry = line + "\n\n"
+            entry_length = utf16_length(entry)
+            if length + entry_length > MESSAGE_LIMIT and current != header:
+                messages.append(current.rstrip())
+                current, length = "", 0
+            if length + entry_length > MESSAGE_LIMIT:
+                # Строка длиннее целого сообщения
+                entry = _truncate(line, MESSAGE_LIMIT - length - 2) + "\n\n"
+                entry_length = utf16_length(entry)
+            current += entry
+            length += entry_length
+        if len(lines) > len(shown):
+            suffix = f"… и еще {len(lines) - len(shown)}"
+            # Хвост не влезает в последнее сообщение - отдельным сообщением
+            if length + utf16_length(suffix) > MESSAGE_LIMIT:
+                messages.append(current.rstrip())
+                current = ""
+            current += suffix
+        messages.append(current.rstrip())
+        return messages
+
+    async def flush_digest(self, bot: Bot):
+        """Отправляет накопленную сводку"""
+        if not self._digest:
+            return
+        lines, self._digest = self._digest, []
+        for text in self._digest_messages(lines):
+            await self.notify(bot, text)
+
+    async def _digest_loop(self, bot: Bot):
+        while True:
+            await asyncio.sleep(config.ADMIN_DIGEST_INTERVAL)
+            try:
+                await self.flush_digest(bot)
+            except Exception as e:
+                logging.error(f"Ошибка отправки сводки тикетов: {e}", exc_info=True)
+
+    def start(self, bot: Bot):
+        """Запускает отправку сводок (ADMIN_DIGEST_INTERVAL = 0 - сводки отключены)"""
+        if config.ADMIN_DIGEST_INTERVAL <= 0:
+            return
+        if self._digest_task is None or self._digest_task.done():
+            self._digest_task = asyncio.create_task(self._digest_loop(bot))
+
+    async def stop(self, bot: Bot):
+        """Останавливает сводки и отправляет то, что успело накопиться"""
+        if self._digest_task:
+            self._digest_task.cancel()
+            try:
+                await self._digest_task
+            except asyncio.CancelledError:
+                pass
+            self._digest_task = None
+        try:
+            await self.flush_digest(bot)
+        except Exception as e:
+            logging.error(f"Ошибка отправки сводки тикетов при остановке: {e}")
+
+
+# Глобальный экземпляр
+admin_notifier = AdminNotifier()
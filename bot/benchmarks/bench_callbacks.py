@@ -0,0 +1,92 @@
+"""
+Бенчмарк маршрутизации callback: цепочка F.data.startswith(...) против CallbackTable.
+
+Строит два диспетчера aiogram с одинаковым числом обработчиков-заглушек: в первом каждый
+обработчик зарегистрирован с фильтром F.data.startswith("префикс_"), как было раньше, во
+втором - через CallbackTable (поиск по ключу в словаре). Через feed_update прогоняются
+callback к первому, среднему и последнему обработчику.
+
+Запуск:
+    python benchmarks/bench_callbacks.py --handlers 40 --updates 5000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from aiogram import Bot, Dispatcher, F, Router  # noqa: E402
+from aiogram.types import CallbackQuery, Update, User  # noqa: E402
+
+from callbacks import CallbackAction, CallbackTable  # noqa: E402
+
+
+async def noop(callback: CallbackQuery):
+    pass
+
+
+async def noop_with_data(callback: CallbackQuery, callback_data):
+    pass
+
+
+def build_prefix_dispatcher(count: int) -> Dispatcher:
+    router = Router()
+    for index in range(count):
+        router.callback_query.register(noop, F.data.startswith(f"action{index}_"))
+    dispatcher = Dispatcher()
+    dispatcher.include_router(router)
+    return dispatcher
+
+
+def build_table_dispatcher(actions) -> Dispatcher:
+    router = Router()
+    table = CallbackTable(router)
+    for action in actions:
+        table(action)(noop_with_data)
+    dispatcher = Dispatcher()
+    dispatcher.include_router(router)
+    return dispatcher
+
+
+def make_update(data: str) -> Update:
+    return Update(update_id=1, callback_query=CallbackQuery(
+        id="1", from_user=User(id=1, is_bot=False, first_name="bench"), chat_instance="bench", data=data
+    ))
+
+
+async def measure(dispatcher: Dispatcher, bot: Bot, data: str, updates: int) -> float:
+    update = make_update(data)
+    started = time.perf_counter()
+    for _ in range(updates):
+        await dispatcher.feed_update(bot, update)
+    return (time.perf_counter() - started) / updates * 1e6
+
+
+async def run(count: int, updates: int):
+    # Коды с префиксом bench, чтобы не пересечься с действиями бота
+    actions = [CallbackAction(f"bench{index}", item_id=int) for index in range(count)]
+    prefix_dispatcher = build_prefix_dispatcher(count)
+    table_dispatcher = build_table_dispatcher(actions)
+    bot = Bot("1:bench")
+    try:
+        print(f"{'обработчик':<12} {'startswith, мкс':>16} {'таблица, мкс':>14}")
+        for index in (0, count // 2, count - 1):
+            prefix_us = await measure(prefix_dispatcher, bot, f"action{index}_12345", updates)
+            table_us = await measure(table_dispatcher, bot, actions[index].pack(12345), updates)
+            print(f"#{index:<11} {prefix_us:16.1f} {table_us:14.1f}")
+    finally:
+        await bot.session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--handlers", type=int, default=40, help="обработчиков в роутере")
+    parser.add_argument("--updates", type=int, default=5000, help="callback на замер")
+    args = parser.parse_args()
+    asyncio.run(run(args.handlers, args.updates))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Микробенчмарк рендера подписей объявлений.
+
+Сравнивает post_templates.render_post_caption с прежней сборкой подписи через f-строку
+(словарь эмодзи и ветвление цены на каждый вызов) - как есть и с экранированием
+пользовательского текста, которого в ней не было, - и проверяет, что подписи на случайных
+длинных входах не выходят за лимит Telegram.
+
+Запуск:
+    python benchmarks/bench_captions.py --renders 200000
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from config import config  # noqa: E402
+from post_templates import CAPTION_LIMIT, escape, render_post_caption, visible_length  # noqa: E402
+
+PRICES = ["1500", "торг", "бесплатно", "договорная", "250"]
+
+
+def legacy_caption(post_data: dict, user_privilege: str) -> str:
+    """Подпись в том виде, как ее собирал PostService.format_post_text"""
+    privilege_label = config.PRIVILEGES[user_privilege]["label"]
+    privilege_emoji = {
+        "user": "👤",
+        "vip": "💎",
+        "premium": "⭐",
+        "god": "👑",
+        "ultra_seller": "🔥"
+    }
+    privilege_emoji_icon = privilege_emoji.get(user_privilege, "⭐")
+
+    price_display = post_data['price']
+    if price_display.lower() == "торг":
+        price_line = "🤝 <b>Торг</b>"
+    elif price_display.lower() == "бесплатно":
+        price_line = "🎁 <b>Бесплатно</b>"
+    elif price_display.isdigit():
+        price_line = f"💰 <b>Цена:</b> <code>{price_display}</code> ₽"
+    else:
+        price_line = f"💰 <b>Цена:</b> {price_display}"
+
+    text = f"""
+━━━━━━━━━━━━━━━━━━━━
+<b>📦 {post_data['title']}</b>
+━━━━━━━━━━━━━━━━━━━━
+
+{price_line}
+
+━━━━━━━━━━━━━━━━━━━━
+<b>📝 Описание:</b>
+━━━━━━━━━━━━━━━━━━━━
+
+{post_data['description']}
+
+━━━━━━━━━━━━━━━━━━━━
+{privilege_emoji_icon} <b>Статус продавца:</b> {privilege_label}
+━━━━━━━━━━━━━━━━━━━━
+"""
+    text += "\n💬 <b>Написать продавцу:</b> Нажмите кнопку ниже ⬇️"
+    return text
+
+
+def escaped_legacy_caption(post_data: dict, user_privilege: str) -> str:
+    """Прежняя подпись с экранированием названия и описания - честная база для сравнения"""
+    return legacy_caption({'title': escape(post_data['title']), 'price': post_data['price'],
+                           'description': escape(post_data['description'])}, user_privilege)
+
+
+def make_realistic_post() -> dict:
+    return {
+        'title': "Vaporesso XROS 3 mini, новый",
+        'price': "1500",
+        'description': ("Продаю под Vaporesso XROS 3 mini в идеальном состоянии, пользовался неделю. "
+                        "В комплекте два картриджа, кабель и коробка. Самовывоз у метро, "
+                        "возможна доставка. Торг уместен, обмен не интересует."),
+        'user_id': 123456789
+    }
+
+
+def make_post(rnd: random.Random, description_length: int) -> dict:
+    alphabet = "абвгдеёжзийклмнопрстуфхцчшщыэюя <>&\"'🔥😀"
+    return {
+        'title': "".join(rnd.choice(alphabet) for _ in range(rnd.randint(5, 150))),
+        'price': rnd.choice(PRICES),
+        'description': "".join(rnd.choice(alphabet) for _ in range(description_length)),
+        'user_id': rnd.randint(10 ** 8, 10 ** 10)
+    }
+
+
+def check_limit(rnd: random.Random, samples: int) -> int:
+    """Максимальная видимая длина подписи на случайных (в т.ч. очень длинных) входах"""
+    worst = 0
+    for _ in range(samples):
+        post = make_post(rnd, rnd.choice([10, 500, 1000, 4096]))
+        for privilege in config.PRIVILEGES:
+            for contact in (False, True):
+                caption = render_post_caption(post, privilege, "seller_username", include_contact_info=contact)
+                length = visible_length(caption)
+                assert length <= CAPTION_LIMIT, f"подпись длиннее лимита: {length}"
+                worst = max(worst, length)
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--renders", type=int, default=200000)
+    parser.add_argument("--samples", type=int, default=2000, help="случайных постов для проверки лимита")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    post = make_realistic_post()
+    privilege = "vip"
+
+    for name, render in (("f-строка (было)", lambda: legacy_caption(post, privilege)),
+                         ("f-строка + escape", lambda: escaped_legacy_caption(post, privilege)),
+                         ("post_templates", lambda: render_post_caption(post, privilege))):
+        # Минимум из нескольких прогонов - меньше шума от соседних процессов
+        seconds = min(timeit.repeat(render, number=args.renders, repeat=5))
+        print(f"{name:<18} {seconds / args.renders * 1e6:7.2f} мкс/подпись")
+
+    worst = check_limit(rnd, args.samples)
+    print(f"Лимит подписи: максимум {worst} из {CAPTION_LIMIT} символов на {args.samples} случайных постах")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Бенчмарк обработки апдейтов: полный диспетчер бота без сети.
+
+Апдейты прогоняются через Dispatcher.feed_update со всеми роутерами бота, а запросы к
+Bot API уходят в MockSession (benchmarks/fake_telegram.py). Время и SQL-запросы по
+обработчикам считает handler_profiler - та же сводка, что бот пишет в лог, с самыми дорогими
+SQL-запросами из query_profiler.
+
+Апдейты берутся из файла, записанного ботом с UPDATE_RECORD_FILE (один JSON в строке),
+или генерируются: каждый пользователь проходит /start, /myid, профиль, помощь, тикеты,
+покупку привилегии, свои объявления и /search.
+
+Результат можно сохранить (--output) и сравнить с прошлым прогоном (--baseline): если
+p50 какого-то обработчика вырос больше чем на --threshold процентов, выход с кодом 1.
+
+База создается во временной директории, рабочая baraholka.db не затрагивается.
+
+Запуск:
+    python benchmarks/bench_dispatch.py --users 50 --output dispatch.json
+    python benchmarks/bench_dispatch.py --updates updates.jsonl --baseline dispatch.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from itertools import count
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Пути из аргументов считаются от директории запуска
+START_DIR = os.getcwd()
+# Путь к базе в database.py относительный - переходим во временную директорию до подключения
+os.chdir(tempfile.mkdtemp(prefix="bench_dispatch_"))
+
+from aiogram import Bot, Dispatcher  # noqa: E402
+from aiogram.fsm.storage.memory import MemoryStorage  # noqa: E402
+from aiogram.types import Update  # noqa: E402
+
+import handlers  # noqa: E402
+from chat_sessions import chat_sessions  # noqa: E402
+from database import engine, init_db  # noqa: E402
+from fake_telegram import BOT_USER, FakeTelegram, MockSession  # noqa: E402
+from handler_profiler import handler_profiler  # noqa: E402
+from privilege_catalogue import privilege_catalogue  # noqa: E402
+from query_profiler import query_profiler  # noqa: E402
+from ticket_message_buffer import ticket_message_buffer  # noqa: E402
+
+# Первый id синтетических пользователей - не пересекается с ADMIN_IDS из .env
+FIRST_USER_ID = 7_000_000_000
+
+COMMANDS = ["/start", "/myid", "/search"]
+CALLBACKS = ["profile", "help", "my_tickets", "buy_privilege", "main", "my_posts"]
+
+
+def synthetic_updates(users: int):
+    """Сценарий на каждого пользователя: сообщения и нажатия кнопок в личке с ботом"""
+    update_ids = count(1)
+    message_ids = count(1)
+    now = int(time.time())
+    for index in range(users):
+        user = {"id": FIRST_USER_ID + index, "is_bot": False, "first_name": f"bench{index}", "username": f"bench{index}"}
+        chat = {"id": user["id"], "type": "private", "first_name": user["first_name"]}
+        for text in COMMANDS[:2]:
+            yield {"update_id": next(update_ids), "message": {
+                "message_id": next(message_ids), "date": now, "chat": chat, "from": user, "text": text,
+                "entities": [{"type": "bot_command", "offset": 0, "length": len(text)}],
+            }}
+        bot_message = {"message_id": next(message_ids), "date": now, "chat": chat, "from": BOT_USER, "text": "меню"}
+        for data in CALLBACKS:
+            yield {"update_id": next(update_ids), "callback_query": {
+                "id": str(next(update_ids)), "from": user, "chat_instance": str(user["id"]),
+                "message": bot_message, "data": data,
+            }}
+        yield {"update_id": next(update_ids), "message": {
+            "message_id": next(message_ids), "date": now, "chat": chat, "from": user, "text": "/search велосипед",
+            "entities": [{"type": "bot_command", "offset": 0, "length": len("/search")}],
+        }}
+
+
+def load_updates(args, bot: Bot):
+    if args.updates:
+        with open(os.path.join(START_DIR, args.updates), encoding="utf-8") as file:
+            return [Update.model_validate_json(line, context={"bot": bot}) for line in file if line.strip()]
+    return [Update.model_validate(raw, context={"bot": bot}) for raw in synthetic_updates(args.users)]
+
+
+def by_user(updates):
+    """Апдейты по пользователям с сохранением порядка: один пользователь не шлет апдейты параллельно"""
+    streams = {}
+    for update in updates:
+        user = getattr(update.event, "from_user", None)
+        streams.setdefault(user.id if user else -update.update_id, []).append(update)
+    return list(streams.values())
+
+
+async def replay(dispatcher: Dispatcher, bot: Bot, streams, concurrency: int) -> float:
+    """Пользователи обрабатываются параллельно (не больше concurrency), апдейты пользователя - по порядку"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def feed(stream):
+        async with semaphore:
+            for update in stream:
+                await dispatcher.feed_update(bot, update)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(feed(stream) for stream in streams))
+    return time.perf_counter() - started
+
+
+def compare(report: dict, baseline_path: str, threshold: float) -> bool:
+    """Печатает обработчики, у которых p50 вырос сильнее порога; True - регрессий нет"""
+    with open(os.path.join(START_DIR, baseline_path), encoding="utf-8") as file:
+        baseline = {row["name"]: row for row in json.load(file)["handlers"]}
+    ok = True
+    for row in report["handlers"]:
+        before = baseline.get(row["name"])
+        if not before or not before["p50_ms"]:
+            continue
+        change = (row["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100
+        if change > threshold:
+            ok = False
+            print(f"❌ {row['name']}: p50 {before['p50_ms']:.2f} -> {row['p50_ms']:.2f} мс (+{change:.0f}%)")
+    if ok:
+        print(f"✅ Регрессий больше {threshold:.0f}% относительно {baseline_path} нет")
+    return ok
+
+
+async def run(args) -> bool:
+    await init_db()
+    await asyncio.gather(privilege_catalogue.load(), chat_sessions.load())
+
+    telegram = FakeTelegram(latency=args.latency / 1000)
+    bot = Bot("1:bench", session=MockSession(telegram))
+    dispatcher = Dispatcher(storage=MemoryStorage())
+    handler_profiler.install(dispatcher)
+    dispatcher.include_routers(*handlers.load_routers())
+
+    try:
+        updates = load_updates(args, bot)
+        streams = by_user(updates)
+        elapsed = 0.0
+        for _ in range(args.repeat):
+            elapsed += await replay(dispatcher, bot, streams, args.concurrency)
+        total = len(updates) * args.repeat
+        print(f"Апдейтов: {total}, {elapsed:.2f} с, {total / elapsed:.0f} апдейтов/с\n")
+
+        rows = handler_profiler.summary()
+        width = max((len(row[0]) for row in rows), default=10)
+        print(f"{'':<{width}} {'вызовов':>8} {'p50, мс':>10} {'p90, мс':>10} {'p99, мс':>10}  SQL ср/макс  SQL, мс")
+        for name, calls, quantiles, avg_queries, max_queries, query_seconds in rows:
+            p50, p90, p99 = (value * 1e3 for value in quantiles)
+            print(f"{name:<{width}} {calls:8} {p50:10.2f} {p90:10.2f} {p99:10.2f}"
+                  f"  {avg_queries:5.1f}/{max_queries:<5} {query_seconds * 1e3:7.2f}")
+        print(f"\nSQL: {query_profiler.queries} запросов, {query_profiler.seconds:.2f} с; самые дорогие:")
+        for statement, calls, seconds, max_seconds in query_profiler.top(5):
+            print(f"  {seconds * 1e3:9.1f} мс  {calls:6} раз  {' '.join(statement.split())[:120]}")
+        print("\nBot API: " + ", ".join(f"{method} {calls}" for method, calls in telegram.calls.most_common()))
+
+        report = {
+            "updates": total,
+            "seconds": elapsed,
+            "handlers": [
+                {"name": name, "calls": calls, "p50_ms": quantiles[0] * 1e3, "p90_ms": quantiles[1] * 1e3,
+                 "p99_ms": quantiles[2] * 1e3, "avg_queries": avg_queries, "max_queries": max_queries,
+                 "avg_query_ms": query_seconds * 1e3}
+                for name, calls, quantiles, avg_queries, max_queries, query_seconds in rows
+            ],
+            "api_calls": dict(telegram.calls),
+        }
+        if args.output:
+            with open(os.path.join(START_DIR, args.output), "w", encoding="utf-8") as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        return compare(report, args.baseline, args.threshold) if args.baseline else True
+    finally:
+        # Отложенные удаления message_cleaner и прочие фоновые задачи обработчиков
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        await ticket_message_buffer.close()
+        await bot.session.close()
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", help="файл с апдейтами (UPDATE_RECORD_FILE); без него - синтетический сценарий")
+    parser.add_argument("--users", type=int, default=50, help="пользователей в синтетическом сценарии")
+    parser.add_argument("--repeat", type=int, default=1, help="сколько раз прогнать апдейты")
+    parser.add_argument("--concurrency", type=int, default=20, help="пользователей в обработке одновременно")
+    parser.add_argument("--latency", type=float, default=0, help="задержка ответа Bot API, мс")
+    parser.add_argument("--output", help="сохранить результат в JSON")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=20, help="допустимый рост p50, %%")
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Бенчмарк времени импорта модулей бота.
+
+Каждый модуль импортируется в отдельном свежем процессе без BOT_TOKEN в окружении
+(импорт не должен требовать токена). Печатает медиану времени импорта и самые
+дорогие модули по собственному времени из python -X importtime.
+
+Запуск:
+    python benchmarks/bench_import.py --runs 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+MODULES = ["config", "database", "services", "keyboards", "handlers"]
+
+# Замер внутри процесса: только сам импорт, без запуска интерпретатора
+PROBE = (
+    "import time, sys; sys.path.insert(0, {path!r}); started = time.perf_counter(); "
+    "import {module}; print(time.perf_counter() - started)"
+)
+
+
+def clean_env() -> dict:
+    env = dict(os.environ)
+    env.pop("BOT_TOKEN", None)
+    return env
+
+
+def measure(module: str, runs: int, cwd: str) -> float:
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE.format(path=os.path.abspath(BOT_DIR), module=module)],
+            capture_output=True, text=True, env=clean_env(), cwd=cwd, check=True
+        )
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return statistics.median(timings)
+
+
+def top_self_times(module: str, cwd: str, limit: int):
+    """Модули с наибольшим собственным временем импорта (мкс) по -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import sys; sys.path.insert(0, {os.path.abspath(BOT_DIR)!r}); import {module}"],
+        capture_output=True, text=True, env=clean_env(), cwd=cwd, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), name.strip()))
+    rows.sort(reverse=True)
+    return rows[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="запусков на модуль")
+    parser.add_argument("--top", type=int, default=10, help="сколько самых дорогих модулей показать")
+    args = parser.parse_args()
+
+    # Рабочая директория - временная: импорт не должен ничего создавать рядом с ботом
+    cwd = tempfile.mkdtemp(prefix="bench_import_")
+    for module in MODULES:
+        print(f"{module:<10} {measure(module, args.runs, cwd) * 1e3:8.1f} мс")
+
+    print("\nСамые дорогие модули при импорте handlers (собственное время):")
+    for self_us, name in top_self_times("handlers", cwd, args.top):
+        print(f"{self_us / 1e3:8.1f} мс  {name}")
+
+    created = os.listdir(cwd)
+    if created:
+        print(f"\n⚠️  Импорт создал файлы в рабочей директории: {', '.join(created)}")
+
+
+if __name__ == "__main__":
+    main()
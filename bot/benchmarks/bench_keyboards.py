@@ -0,0 +1,65 @@
+"""
+Микробенчмарк клавиатур: сколько стоит получить клавиатуру на один callback.
+
+Для каждого меню сравнивает сборку заново (функция без кэша, __wrapped__) с выдачей
+из кэша keyboards.py и показывает, сколько стоит сериализация клавиатуры в запрос
+к Bot API - ее кэш не убирает. Отдельно замеряется первый вызов после изменения
+каталога привилегий (сброс и пересборка клавиатур с ценами).
+
+Запуск:
+    python benchmarks/bench_keyboards.py --calls 20000
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import keyboards  # noqa: E402
+from privilege_catalogue import privilege_catalogue  # noqa: E402
+
+# (название, функция, аргументы) - как их вызывают обработчики
+MENUS = [
+    ("main_menu", keyboards._main_menu, (False,)),
+    ("main_menu (админ)", keyboards._main_menu, (True,)),
+    ("help_menu", keyboards.help_menu, ()),
+    ("help_menu (тикеты)", keyboards.help_menu, (True,)),
+    ("admin_menu", keyboards.admin_menu, ()),
+    ("ticket_status_keyboard", keyboards.ticket_status_keyboard, ()),
+    ("user_management_keyboard", keyboards.user_management_keyboard, ()),
+    ("privileges_menu", keyboards.privileges_menu, ()),
+    ("price_keyboard", keyboards.price_keyboard, ("vip",)),
+    ("cooldown_keyboard", keyboards.cooldown_keyboard, ("vip",)),
+]
+
+
+def per_call_us(func, args, calls: int) -> float:
+    return min(timeit.repeat(lambda: func(*args), number=calls, repeat=3)) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20000, help="вызовов на замер")
+    args = parser.parse_args()
+
+    print(f"{'клавиатура':<26} {'сборка, мкс':>12} {'кэш, мкс':>10} {'сериализация, мкс':>18}")
+    for name, cached, call_args in MENUS:
+        build = cached.__wrapped__
+        keyboard = cached(*call_args)
+        assert keyboard.model_dump() == build(*call_args).model_dump(), f"{name}: кэш отличается от сборки"
+        print(f"{name:<26} {per_call_us(build, call_args, args.calls):12.1f} "
+              f"{per_call_us(cached, call_args, args.calls):10.2f} "
+              f"{per_call_us(keyboard.model_dump_json, (), args.calls):18.1f}")
+
+    # Смена версии каталога: первый вызов пересобирает клавиатуры с ценами, остальные - снова из кэша
+    rounds = 1000
+    total = 0.0
+    for _ in range(rounds):
+        privilege_catalogue._version += 1
+        total += timeit.timeit(lambda: keyboards.price_keyboard("vip"), number=1)
+    print(f"\nprice_keyboard после изменения каталога: {total / rounds * 1e6:.1f} мкс")
+
+
+if __name__ == "__main__":
+    main()
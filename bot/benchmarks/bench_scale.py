@@ -0,0 +1,415 @@
+"""
+Бенчмарк масштабируемости базы: как время методов сервисов растет с объемом данных.
+
+Для каждого масштаба (число пользователей) создается своя baraholka.db той же схемы, что у
+бота (init_db), и заполняется пачками через executemany: пользователи, объявления, тикеты с
+перепиской и рефералы в пропорциях из аргументов. Затем каждый метод services.py и
+simple_referral.py и админские обработчики статистики (через Dispatcher и MockSession)
+вызываются --calls раз со случайными аргументами: p50/p90/среднее и число SQL-запросов на вызов.
+
+По каждому методу считается показатель роста - наклон log(время)/log(объем) между соседними
+масштабами: около 0 - время не зависит от объема (индекс), около 1 - растет линейно (полный
+просмотр таблицы или N+1), больше 1 - сверхлинейно. Отчет - JSON (--output) с ревизией git,
+чтобы сравнивать релизы.
+
+Каждый масштаб считается в отдельном процессе: путь к базе в database.py задается при импорте.
+Базы лежат в --dir/users-<N>/ и с --reuse не пересоздаются (пишущие методы добавляют в них
+немного строк). Рабочая baraholka.db бота не затрагивается.
+
+Запуск:
+    python benchmarks/bench_scale.py --scales 10000,100000,1000000 --output scale.json
+    python benchmarks/bench_scale.py --scales 10000,100000 --dir /tmp/scale --reuse --calls 50
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BOT_DIR)
+
+# Id админа вне диапазона синтетических пользователей 1..N
+ADMIN_ID = 10 ** 12
+BATCH = 50_000
+
+THEMES = ["❓ Вопросы о боте", "📢 Купить рекламу", "📞 Другое", "💎 Покупка привилегии VIP", "👑 Покупка привилегии PREMIUM"]
+PRIVILEGES = [("user", 0.9), ("vip", 0.06), ("premium", 0.025), ("god", 0.01), ("ultra_seller", 0.005)]
+WORDS = ["велосипед", "диван", "телефон", "куртка", "коляска", "ноутбук", "стол", "лампа", "книги", "палатка",
+         "гитара", "самокат", "монитор", "кресло", "чайник", "часы", "сумка", "лыжи", "шкаф", "ковер",
+         "новый", "б/у", "отличное", "состояние", "срочно", "торг", "самовывоз", "доставка", "центр", "район"]
+
+
+# ---------------------------------------------------------------- генерация
+
+def _date(rnd: random.Random, now: datetime.datetime, days: int = 365) -> str:
+    return str(now - datetime.timedelta(seconds=rnd.randint(0, days * 86400), microseconds=rnd.randint(1, 999999)))
+
+
+def _flush(conn, sql: str, rows: list):
+    if rows:
+        conn.executemany(sql, rows)
+        rows.clear()
+
+
+def generate(path: str, args) -> dict:
+    """Заполняет созданную init_db базу; возвращает число строк по таблицам"""
+    from ticket_priority import priority_from_theme
+
+    rnd = random.Random(args.seed)
+    now = datetime.datetime.now()
+    users = args.users
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA journal_mode = MEMORY")
+
+    # Рефереры с перекосом: у первых пользователей тысячи приглашенных, у большинства - ни одного
+    referrer_of = {}
+    referrals_count = [0] * (users + 1)
+    for user_id in range(2, users + 1):
+        if rnd.random() < args.referred_share:
+            referrer = int((user_id - 1) * rnd.random() ** 3) + 1
+            referrer_of[user_id] = referrer
+            referrals_count[referrer] += 1
+
+    posts_count = [0] * (users + 1)
+    rows = []
+    post_sql = ("INSERT INTO posts (id, user_id, photo_id, title, price, description, status, created_at, "
+                "channel_message_id, pinned, expires_at, photo_unique_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?)")
+    post_total = int(users * args.posts_per_user)
+    for post_id in range(1, post_total + 1):
+        user_id = rnd.randint(1, users)
+        posts_count[user_id] += 1
+        words = rnd.sample(WORDS, 10)
+        status = rnd.choices(("active", "sold", "expired"), (0.6, 0.25, 0.15))[0]
+        created = _date(rnd, now, 60)
+        rows.append((post_id, user_id, f"photo{post_id}", f"{words[0]} {words[1]}", str(rnd.randint(100, 50000)),
+                     " ".join(words[2:]), status, created, post_id, created, f"u{post_id}"))
+        if len(rows) == BATCH:
+            _flush(conn, post_sql, rows)
+    _flush(conn, post_sql, rows)
+
+    user_sql = ("INSERT INTO users (id, username, privilege, posts_count, referrals_count, referrer_id, "
+                "last_post_time, created_at, banned) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
+    privileges, weights = zip(*PRIVILEGES)
+    for user_id in range(1, users + 1):
+        rows.append((user_id, f"user{user_id}", rnd.choices(privileges, weights)[0], posts_count[user_id],
+                     referrals_count[user_id], referrer_of.get(user_id),
+                     _date(rnd, now, 30) if posts_count[user_id] else None, _date(rnd, now), rnd.random() < 0.01))
+        if len(rows) == BATCH:
+            _flush(conn, user_sql, rows)
+    _flush(conn, user_sql, rows)
+
+    referral_sql = "INSERT INTO referrals (referrer_id, referred_id, created_at) VALUES (?, ?, ?)"
+    for referred, referrer in referrer_of.items():
+        rows.append((referrer, referred, _date(rnd, now)))
+        if len(rows) == BATCH:
+            _flush(conn, referral_sql, rows)
+    _flush(conn, referral_sql, rows)
+
+    ticket_sql = ("INSERT INTO tickets (id, user_id, theme, status, admin_id, priority, created_at, closed_at, "
+                  "taken_at, first_reply_at, resolved_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+    message_sql = "INSERT INTO ticket_messages (ticket_id, user_id, message_text, is_admin, created_at) VALUES (?, ?, ?, ?, ?)"
+    messages = []
+    message_total = 0
+    ticket_total = int(users * args.tickets_per_user)
+    for ticket_id in range(1, ticket_total + 1):
+        user_id = rnd.randint(1, users)
+        theme = rnd.choice(THEMES)
+        status = rnd.choices(("new", "in_progress", "closed"), (0.1, 0.1, 0.8))[0]
+        created = now - datetime.timedelta(seconds=rnd.randint(0, 90 * 86400))
+        taken = created + datetime.timedelta(minutes=rnd.randint(1, 600)) if status != "new" else None
+        closed = taken + datetime.timedelta(hours=rnd.randint(1, 48)) if status == "closed" else None
+        rows.append((ticket_id, user_id, theme, status, ADMIN_ID if taken else None, priority_from_theme(theme),
+                     str(created), closed and str(closed), taken and str(taken), taken and str(taken),
+                     closed and str(closed)))
+        for number in range(rnd.randint(1, 2 * args.messages_per_ticket - 1)):
+            is_admin = number % 2 == 1
+            messages.append((ticket_id, ADMIN_ID if is_admin else user_id, " ".join(rnd.sample(WORDS, 8)),
+                             is_admin, str(created + datetime.timedelta(minutes=number))))
+        if len(rows) == BATCH:
+            _flush(conn, ticket_sql, rows)
+        if len(messages) >= BATCH:
+            message_total += len(messages)
+            _flush(conn, message_sql, messages)
+    _flush(conn, ticket_sql, rows)
+    message_total += len(messages)
+    _flush(conn, message_sql, messages)
+
+    conn.commit()
+    conn.close()
+    return {"users": users, "posts": post_total, "tickets": ticket_total, "ticket_messages": message_total,
+            "referrals": len(referrer_of)}
+
+
+# ---------------------------------------------------------------- замеры
+
+class Sample:
+    """Случайные аргументы вызовов в пределах сгенерированных данных"""
+
+    def __init__(self, counts: dict, seed: int):
+        self.rnd = random.Random(seed)
+        self.counts = counts
+        self._new_id = counts["users"] + 1
+
+    def user(self) -> int:
+        return self.rnd.randint(1, self.counts["users"])
+
+    def ticket(self) -> int:
+        return self.rnd.randint(1, max(self.counts["tickets"], 1))
+
+    def new_user(self) -> int:
+        self._new_id += 1
+        return self._new_id
+
+
+def build_cases(sample: Sample, dispatcher, bot):
+    """[(название, корутина-функция без аргументов)] - что замерять"""
+    from aiogram.types import Update
+
+    from services import AdminService, PostService, TicketService, UserService
+    from simple_referral import simple_referral
+
+    users, posts, tickets, admins = UserService(), PostService(), TicketService(), AdminService()
+
+    def admin_callback(data: str):
+        async def call():
+            update = Update.model_validate({"update_id": 1, "callback_query": {
+                "id": "1", "chat_instance": "1", "data": data,
+                "from": {"id": ADMIN_ID, "is_bot": False, "first_name": "admin"},
+                "message": {"message_id": 1, "date": int(time.time()), "chat": {"id": ADMIN_ID, "type": "private"},
+                            "from": {"id": 1, "is_bot": True, "first_name": "bot"}, "text": "меню"},
+            }}, context={"bot": bot})
+            await dispatcher.feed_update(bot, update)
+        return call
+
+    async def create_post():
+        user_id = sample.user()
+        words = sample.rnd.sample(WORDS, 10)
+        await posts.create_post(user_id, {"photo_ids": [f"bench{user_id}"], "title": " ".join(words[:2]),
+                                          "price": "1000", "description": " ".join(words[2:])})
+
+    return [
+        ("UserService.get_or_create_user", lambda: users.get_or_create_user(user_id := sample.user(), f"user{user_id}")),
+        ("UserService.get_user_profile", lambda: users.get_user_profile(sample.user())),
+        ("UserService.check_vip_eligibility", lambda: users.check_vip_eligibility(sample.user())),
+        ("UserService.is_user_banned", lambda: users.is_user_banned(sample.user())),
+        ("UserService.get_user_by_id", lambda: users.get_user_by_id(sample.user())),
+        ("UserService.search_user_by_username", lambda: users.search_user_by_username(f"user{sample.user()}")),
+        ("UserService.update_privilege", lambda: users.update_privilege(sample.user(), "user")),
+        ("UserService.reset_user_cooldown", lambda: users.reset_user_cooldown(sample.user())),
+        ("PostService.create_post", create_post),
+        ("TicketService.create_ticket", lambda: tickets.create_ticket(sample.user(), "📞 Другое")),
+        ("TicketService.get_user_tickets", lambda: tickets.get_user_tickets(sample.user())),
+        ("TicketService.get_tickets_by_status(new)", lambda: tickets.get_tickets_by_status("new")),
+        ("TicketService.get_tickets_page(new)", lambda: tickets.get_tickets_page(status="new")),
+        ("TicketService.get_tickets_page(user)", lambda: tickets.get_tickets_page(user_id=sample.user())),
+        ("TicketService.get_ticket_by_id", lambda: tickets.get_ticket_by_id(sample.ticket())),
+        ("TicketService.get_ticket_messages", lambda: tickets.get_ticket_messages(sample.ticket())),
+        ("TicketService.get_ticket_messages_page", lambda: tickets.get_ticket_messages_page(sample.ticket())),
+        ("TicketService.get_tickets_count_by_status", lambda: tickets.get_tickets_count_by_status("new")),
+        ("TicketService.get_ticket_summary", lambda: tickets.get_ticket_summary()),
+        ("TicketService.get_ticket_summary(user)", lambda: tickets.get_ticket_summary(sample.user())),
+        ("TicketService.update_ticket_status", lambda: tickets.update_ticket_status(sample.ticket(), "in_progress", ADMIN_ID)),
+        ("TicketService.take_next_ticket", lambda: tickets.take_next_ticket(ADMIN_ID)),
+        ("AdminService.get_statistics", lambda: admins.get_statistics()),
+        ("AdminService.get_detailed_statistics", lambda: admins.get_detailed_statistics()),
+        ("simple_referral.handle_start_command", lambda: simple_referral.handle_start_command(
+            sample.user(), "bench", "bench", None)),
+        ("simple_referral.add_referral", lambda: simple_referral.add_referral(sample.user(), sample.new_user())),
+        ("simple_referral.get_referral_stats", lambda: simple_referral.get_referral_stats(sample.user())),
+        ("simple_referral.get_detailed_referral_stats", lambda: simple_referral.get_detailed_referral_stats(sample.user())),
+        # У пользователя 1 больше всего рефералов - худший случай
+        ("simple_referral.get_detailed_referral_stats(топ)", lambda: simple_referral.get_detailed_referral_stats(1)),
+        ("simple_referral.get_leaderboard", lambda: simple_referral.get_leaderboard()),
+        ("simple_referral.check_and_update_vip_status", lambda: simple_referral.check_and_update_vip_status(sample.user())),
+        ("handler admin_main", admin_callback("admin_main")),
+        ("handler admin_stats", admin_callback("admin_stats")),
+        ("handler admin_sla", admin_callback("admin_sla")),
+    ]
+
+
+async def measure(cases, calls: int) -> dict:
+    from sqlalchemy import event
+
+    from database import engine
+
+    queries = 0
+
+    def count_query(*_):
+        nonlocal queries
+        queries += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count_query)
+    results = {}
+    for name, case in cases:
+        await case()  # прогрев: кэш страниц SQLite, компиляция запросов
+        samples = []
+        queries = 0
+        for _ in range(calls):
+            started = time.perf_counter()
+            await case()
+            samples.append(time.perf_counter() - started)
+        samples.sort()
+        results[name] = {
+            "calls": calls,
+            "p50_ms": statistics.median(samples) * 1e3,
+            "p90_ms": samples[max(int(len(samples) * 0.9) - 1, 0)] * 1e3,
+            "mean_ms": statistics.fmean(samples) * 1e3,
+            "queries": queries / calls,
+        }
+        print(f"  {name:<52} p50 {results[name]['p50_ms']:9.2f} мс  SQL {results[name]['queries']:6.1f}",
+              file=sys.stderr)
+    return results
+
+
+async def worker(args) -> dict:
+    """Один масштаб: база в текущей директории, отчет - JSON в stdout"""
+    from aiogram import Bot, Dispatcher
+
+    from database import engine, init_db
+    from fake_telegram import MockSession
+    from handlers.admin import main as admin_main
+    from privilege_catalogue import privilege_catalogue
+    from ticket_message_buffer import ticket_message_buffer
+
+    fresh = not os.path.exists("baraholka.db")
+    await init_db()
+    generate_seconds = None
+    if fresh:
+        await engine.dispose()
+        started = time.perf_counter()
+        counts = generate("baraholka.db", args)
+        generate_seconds = time.perf_counter() - started
+        print(f"  сгенерировано за {generate_seconds:.1f} с: {counts}", file=sys.stderr)
+    conn = sqlite3.connect("baraholka.db")
+    counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+              for table in ("users", "posts", "tickets", "ticket_messages", "referrals")}
+    conn.close()
+    await privilege_catalogue.load()
+
+    bot = Bot("1:bench", session=MockSession())
+    dispatcher = Dispatcher()
+    dispatcher.include_router(admin_main.router)
+    try:
+        results = await measure(build_cases(Sample(counts, args.seed), dispatcher, bot), args.calls)
+    finally:
+        await ticket_message_buffer.close()
+        await bot.session.close()
+        await engine.dispose()
+    return {"users": args.users, "rows": counts, "db_bytes": os.path.getsize("baraholka.db"),
+            "generate_seconds": generate_seconds, "cases": results}
+
+
+# ---------------------------------------------------------------- отчет
+
+def growth(points) -> float:
+    """Наклон log(время)/log(объем) по крайним масштабам"""
+    (n1, t1), (n2, t2) = points[0], points[-1]
+    if n1 == n2 or t1 <= 0 or t2 <= 0:
+        return 0.0
+    return math.log(t2 / t1) / math.log(n2 / n1)
+
+
+def verdict(exponent: float) -> str:
+    if exponent < 0.2:
+        return "не зависит"
+    if exponent < 0.8:
+        return "сублинейно"
+    if exponent < 1.2:
+        return "⚠️ линейно"
+    return "❌ сверхлинейно"
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BOT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_scales(args) -> dict:
+    scales = sorted(int(value) for value in args.scales.split(","))
+    base_dir = os.path.abspath(args.dir) if args.dir else tempfile.mkdtemp(prefix="bench_scale_")
+    env = dict(os.environ, ADMIN_IDS=str(ADMIN_ID))
+    env.setdefault("BOT_TOKEN", "1:bench")
+    worker_args = ["--calls", str(args.calls), "--seed", str(args.seed), "--posts-per-user", str(args.posts_per_user),
+                   "--tickets-per-user", str(args.tickets_per_user), "--messages-per-ticket",
+                   str(args.messages_per_ticket), "--referred-share", str(args.referred_share)]
+
+    reports = []
+    for users in scales:
+        scale_dir = os.path.join(base_dir, f"users-{users}")
+        os.makedirs(scale_dir, exist_ok=True)
+        database = os.path.join(scale_dir, "baraholka.db")
+        if os.path.exists(database) and not args.reuse:
+            os.remove(database)
+        print(f"Масштаб {users} пользователей ({scale_dir})", file=sys.stderr)
+        process = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", "--users", str(users)]
+                                 + worker_args, cwd=scale_dir, env=env, stdout=subprocess.PIPE, text=True)
+        if process.returncode != 0:
+            raise SystemExit(f"Масштаб {users}: процесс завершился с кодом {process.returncode}")
+        reports.append(json.loads(process.stdout.strip().splitlines()[-1]))
+
+    summary = {}
+    for name in reports[0]["cases"]:
+        points = [(report["users"], report["cases"][name]["p50_ms"]) for report in reports]
+        exponent = growth(points)
+        summary[name] = {"p50_ms": [time_ms for _, time_ms in points], "exponent": exponent,
+                         "verdict": verdict(exponent),
+                         "queries": [report["cases"][name]["queries"] for report in reports]}
+    return {"revision": git_revision(), "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "scales": scales, "calls": args.calls, "seed": args.seed, "summary": summary, "reports": reports}
+
+
+def print_summary(result: dict):
+    scales = result["scales"]
+    width = max(len(name) for name in result["summary"])
+    header = " ".join(f"{users:>11}" for users in scales)
+    print(f"\n{'p50, мс':<{width}} {header}  {'рост':>5}  SQL/вызов")
+    ordered = sorted(result["summary"].items(), key=lambda item: -item[1]["exponent"])
+    for name, row in ordered:
+        times = " ".join(f"{value:11.2f}" for value in row["p50_ms"])
+        queries = "/".join(f"{value:g}" for value in row["queries"])
+        print(f"{name:<{width}} {times}  {row['exponent']:5.2f}  {queries:<12} {row['verdict']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="10000,100000,1000000", help="масштабы - число пользователей через запятую")
+    parser.add_argument("--calls", type=int, default=20, help="вызовов каждого метода на масштаб")
+    parser.add_argument("--posts-per-user", type=float, default=1.0)
+    parser.add_argument("--tickets-per-user", type=float, default=0.1)
+    parser.add_argument("--messages-per-ticket", type=int, default=6, help="сообщений в тикете в среднем")
+    parser.add_argument("--referred-share", type=float, default=0.3, help="доля пользователей, пришедших по ссылке")
+    parser.add_argument("--dir", help="где хранить базы масштабов (по умолчанию - временная директория)")
+    parser.add_argument("--reuse", action="store_true", help="не пересоздавать уже сгенерированные базы")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="сохранить отчет в JSON")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--users", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        print(json.dumps(asyncio.run(worker(args)), ensure_ascii=False))
+        return
+
+    result = run_scales(args)
+    print_summary(result)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
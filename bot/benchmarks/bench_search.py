@@ -0,0 +1,138 @@
+"""
+Бенчмарк полнотекстового поиска по объявлениям.
+
+Генерирует синтетический корпус постов в отдельной SQLite-базе, строит FTS5-индекс
+той же схемы, что и бот, и замеряет время запросов первой и следующих страниц.
+
+Запуск:
+    python benchmarks/bench_search.py --posts 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from database import POSTS_FTS_DDL  # noqa: E402
+from post_search import (CANDIDATES_SQL, CANDIDATE_WINDOW, MAX_QUERY_TERMS, PAGE_SIZE,  # noqa: E402
+                         SearchHit, build_match_query, collect_page, compile_term_patterns, decode_cursor,
+                         finish_page, tokenize)
+
+BRANDS = ["vaporesso", "voopoo", "geekvape", "smok", "elfbar", "lost mary", "pasito", "xros",
+          "aegis", "drag", "argus", "vinci", "pnp", "nexus", "luxe", "charon", "zeus", "hellvape"]
+KINDS = ["под", "мод", "картридж", "испаритель", "бак", "аккумулятор", "жижа", "зарядка", "чехол"]
+ADJECTIVES = ["новый", "б/у", "идеальный", "рабочий", "запечатанный", "оригинальный", "редкий",
+              "топовый", "компактный", "мощный", "легкий", "надежный"]
+FILLER = ["торг", "обмен", "самовывоз", "доставка", "гарантия", "комплект", "коробка", "чек",
+          "срочно", "дешево", "состояние", "отличное", "цвет", "черный", "синий", "красный",
+          "метро", "центр", "вечером", "писать", "личку", "вопросы", "фото", "видео"]
+
+QUERIES = ["vaporesso", "смок мод", "elfbar", "новый под", "aegis зарядка", "геймер", "xros картридж",
+           "запечатанный", "hellvape бак", "дешево срочно", "pasito", "lost mary", "мощный мод",
+           "испар", "vinci", "оригинальный argus", "charon", "red"]
+
+
+def make_post(rnd: random.Random):
+    brand = rnd.choice(BRANDS)
+    title = f"{rnd.choice(ADJECTIVES)} {brand} {rnd.choice(KINDS)}"
+    words = [rnd.choice(FILLER) for _ in range(rnd.randint(8, 30))]
+    words.insert(rnd.randint(0, len(words)), brand)
+    return title, " ".join(words)
+
+
+def build_corpus(path: str, posts: int, seed: int):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("""
+        CREATE TABLE posts (
+            id INTEGER PRIMARY KEY, user_id INTEGER, photo_id VARCHAR, title VARCHAR,
+            price VARCHAR, description TEXT, status VARCHAR, created_at DATETIME,
+            channel_message_id INTEGER
+        )
+    """)
+    for ddl in POSTS_FTS_DDL:
+        conn.execute(ddl)
+
+    rnd = random.Random(seed)
+    batch = []
+    started = time.perf_counter()
+    for post_id in range(1, posts + 1):
+        title, description = make_post(rnd)
+        # ~30% постов уже проданы или истекли и в индекс не попадают
+        status = "active" if rnd.random() < 0.7 else "expired"
+        batch.append((post_id, rnd.randint(1, posts // 10 + 1), f"photo{post_id}", title,
+                      str(rnd.randint(100, 10000)), description, status, "2026-01-01 00:00:00", post_id))
+        if len(batch) == 50000:
+            conn.executemany("INSERT INTO posts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+            batch.clear()
+    if batch:
+        conn.executemany("INSERT INTO posts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+    conn.execute("INSERT INTO posts_fts(posts_fts) VALUES ('optimize')")
+    conn.commit()
+    print(f"Корпус: {posts} постов за {time.perf_counter() - started:.1f} с")
+    return conn
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def search(conn, query: str, cursor=None):
+    """Повторяет PostSearch.search на синхронном sqlite3: выборка кандидатов окнами + ранжирование"""
+    terms = tokenize(query)[:MAX_QUERY_TERMS]
+    match, patterns = build_match_query(terms), compile_term_patterns(terms)
+    window, after = decode_cursor(cursor)
+    page = []
+    while window is not None:
+        rows = conn.execute(CANDIDATES_SQL, {"match": match, "from_id": window[0], "before_id": window[1],
+                                             "window": CANDIDATE_WINDOW}).fetchall()
+        window, after = collect_page(page, window, [SearchHit(*row) for row in rows], patterns,
+                                     after, PAGE_SIZE), None
+    return finish_page(page, PAGE_SIZE)
+
+
+def run_queries(conn, repeats: int):
+    first_page, next_page = [], []
+    for _ in range(repeats):
+        for query in QUERIES:
+            started = time.perf_counter()
+            hits, cursor = search(conn, query)
+            first_page.append((time.perf_counter() - started) * 1000)
+
+            if cursor:
+                started = time.perf_counter()
+                search(conn, query, cursor)
+                next_page.append((time.perf_counter() - started) * 1000)
+
+    for name, samples in (("первая страница", first_page), ("следующая страница", next_page)):
+        if samples:
+            print(f"{name:>20}: p50={statistics.median(samples):.2f} мс  "
+                  f"p99={percentile(samples, 99):.2f} мс  max={max(samples):.2f} мс  n={len(samples)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=1_000_000)
+    parser.add_argument("--db", default="bench_search.db")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reuse", action="store_true", help="не пересоздавать корпус, если база уже есть")
+    args = parser.parse_args()
+
+    if args.reuse and os.path.exists(args.db):
+        conn = sqlite3.connect(args.db)
+    else:
+        conn = build_corpus(args.db, args.posts, args.seed)
+    run_queries(conn, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
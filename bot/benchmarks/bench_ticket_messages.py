@@ -0,0 +1,86 @@
+"""
+Бенчмарк записи сообщений тикетов.
+
+Имитирует несколько одновременных чатов поддержки и сравнивает режимы
+TICKET_MESSAGE_DURABILITY: immediate (commit на каждое сообщение) и batched
+(отложенная запись пачками). Считает коммиты SQLite и время сохранения сообщения.
+
+База создается во временной директории, рабочая baraholka.db не затрагивается.
+
+Запуск:
+    python benchmarks/bench_ticket_messages.py --chats 20 --messages 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Путь к базе в database.py относительный - переходим во временную директорию до подключения
+os.chdir(tempfile.mkdtemp(prefix="bench_ticket_messages_"))
+
+from sqlalchemy import delete, event, func, select  # noqa: E402
+
+from database import AsyncSessionLocal, TicketMessage, engine, init_db  # noqa: E402
+from ticket_message_buffer import ticket_message_buffer  # noqa: E402
+
+commits = 0
+
+
+@event.listens_for(engine.sync_engine, "commit")
+def count_commit(conn):
+    global commits
+    commits += 1
+
+
+async def chat(ticket_id: int, messages: int, pause: float, latencies: list):
+    for number in range(messages):
+        started = time.perf_counter()
+        await ticket_message_buffer.add(ticket_id, 1000 + ticket_id, f"сообщение {number}", is_admin=number % 2 == 1)
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(pause)
+
+
+async def run(mode: str, args) -> None:
+    global commits
+    ticket_message_buffer.durability = mode
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(TicketMessage))
+        await session.commit()
+
+    latencies = []
+    commits = 0
+    started = time.perf_counter()
+    await asyncio.gather(*(chat(ticket_id, args.messages, args.pause / 1000, latencies)
+                           for ticket_id in range(args.chats)))
+    await ticket_message_buffer.close()
+    elapsed = time.perf_counter() - started
+
+    async with AsyncSessionLocal() as session:
+        stored = await session.scalar(select(func.count(TicketMessage.id)))
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{mode:<10} коммитов {commits:6d}  сообщений в БД {stored:6d}  "
+          f"p50 {statistics.median(latencies) * 1e3:6.2f} мс  p99 {p99 * 1e3:6.2f} мс  всего {elapsed:5.2f} с")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=20, help="одновременных чатов")
+    parser.add_argument("--messages", type=int, default=50, help="сообщений в каждом чате")
+    parser.add_argument("--pause", type=float, default=5, help="пауза между сообщениями чата, мс")
+    args = parser.parse_args()
+
+    await init_db()
+    for mode in ("immediate", "batched"):
+        await run(mode, args)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,257 @@
+"""
+Подмена Bot API для бенчмарков: бот работает как обычно, но запросы не уходят в Telegram.
+
+FakeTelegram отвечает на методы, которые использует бот, правдоподобными результатами
+(сообщение с новым message_id, True, getMe), считает вызовы по методам и умеет:
+    - задержку ответа (latency + случайная добавка до jitter) и ответ 429 Too Many Requests
+      с долей rate_limit;
+    - getUpdates: апдейты, переданные в feed(), отдаются боту long polling'ом;
+    - expect(chat_id, текст): future, которая завершится, когда бот отправит или отредактирует
+      в этом чате сообщение с таким текстом - так нагрузочный тест ждет ответа бота.
+
+Подключить бота можно двумя способами:
+    MockSession      - сессия aiogram без сети: Bot(token, session=MockSession(telegram));
+    FakeBotAPIServer - HTTP-сервер aiohttp: бот с TELEGRAM_API_URL=http://127.0.0.1:8081
+                       ходит к нему так же, как к api.telegram.org.
+"""
+import asyncio
+import json
+import random
+import time
+from collections import Counter, deque
+from itertools import islice
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from aiogram.client.session.base import BaseSession
+from aiohttp import web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Барахолка", "username": "baraholka_bench_bot"}
+
+# Методы, которые возвращают отправленное сообщение
+MESSAGE_METHODS = {"sendMessage", "sendPhoto", "sendDocument", "copyMessage", "forwardMessage"}
+# Редактирование: сообщение, а для inline-сообщений - True
+EDIT_METHODS = {"editMessageText", "editMessageCaption", "editMessageReplyMarkup"}
+TRUE_METHODS = {
+    "answerCallbackQuery", "answerInlineQuery", "deleteMessage", "deleteMessages", "pinChatMessage",
+    "unpinChatMessage", "setMyCommands", "deleteMyCommands", "deleteWebhook", "sendChatAction",
+}
+# Методы, на которые не отвечаем 429: без них бот не запустится или не получит апдейты
+NEVER_LIMITED = {"getMe", "getUpdates", "deleteWebhook"}
+
+
+def _chat_id(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        # @username канала
+        return -1001000000000
+
+
+def decode_params(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Параметры в том виде, в котором их шлет aiogram (сложные значения - JSON-строки), в объекты"""
+    params = {}
+    for key, value in raw.items():
+        if isinstance(value, str) and value[:1] in ("{", "["):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+        params[key] = value
+    return params
+
+
+def message_text(message: dict) -> str:
+    return message.get("text") or message.get("caption") or ""
+
+
+class FakeTelegram:
+    """Состояние поддельного API: сообщения, очередь апдейтов, ожидания ответов, счетчики"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, rate_limit: float = 0.0, retry_after: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.calls: Counter = Counter()
+        self.rate_limited: Counter = Counter()
+        self._message_id = 0
+        self._update_id = 0
+        self._updates: deque = deque()
+        self._has_updates = asyncio.Event()
+        # {chat_id: [(условие, future)]}
+        self._waiters: Dict[int, List[Tuple[Callable[[dict], bool], asyncio.Future]]] = {}
+
+    def feed(self, update: dict) -> int:
+        """Ставит апдейт в очередь getUpdates; update_id проставляется здесь"""
+        self._update_id += 1
+        update["update_id"] = self._update_id
+        self._updates.append(update)
+        self._has_updates.set()
+        return self._update_id
+
+    @property
+    def pending_updates(self) -> int:
+        return len(self._updates)
+
+    def expect(self, chat_id: int, text: Optional[str] = None,
+               predicate: Optional[Callable[[dict], bool]] = None) -> asyncio.Future:
+        """
+        Future с первым сообщением бота в чате chat_id, в тексте (подписи) которого есть text
+        и для которого predicate вернул True. Регистрировать до отправки апдейта, иначе ответ
+        можно пропустить: сообщения, которых никто не ждет, не сохраняются.
+        """
+        def matches(message: dict) -> bool:
+            return (text is None or text in message_text(message)) and (predicate is None or predicate(message))
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(chat_id, []).append((matches, future))
+        return future
+
+    def _deliver(self, chat_id: int, message: dict):
+        waiters = self._waiters.get(chat_id)
+        if not waiters:
+            return
+        remaining = []
+        for matches, future in waiters:
+            if future.done():
+                continue
+            if matches(message):
+                future.set_result(message)
+            else:
+                remaining.append((matches, future))
+        if remaining:
+            self._waiters[chat_id] = remaining
+        else:
+            del self._waiters[chat_id]
+
+    def _message(self, params: Dict[str, Any], message_id: int) -> dict:
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": _chat_id(params.get("chat_id")), "type": "private"},
+            "from": BOT_USER,
+        }
+        if "photo" in params:
+            message["photo"] = [{"file_id": f"photo{message_id}", "file_unique_id": f"u{message_id}",
+                                 "width": 1280, "height": 960}]
+        if "document" in params:
+            message["document"] = {"file_id": f"doc{message_id}", "file_unique_id": f"d{message_id}"}
+        if "caption" in params:
+            message["caption"] = params["caption"]
+        if "text" in params or not ("photo" in params or "document" in params):
+            message["text"] = params.get("text") or ""
+        if isinstance(params.get("reply_markup"), dict):
+            message["reply_markup"] = params["reply_markup"]
+        return message
+
+    def result(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Ответ Bot API {"ok": ..., "result": ...} на вызов method (кроме getUpdates)"""
+        self.calls[method] += 1
+        if method == "getMe":
+            return {"ok": True, "result": BOT_USER}
+        if method in MESSAGE_METHODS:
+            self._message_id += 1
+            message = self._message(params, self._message_id)
+            self._deliver(message["chat"]["id"], message)
+            return {"ok": True, "result": message}
+        if method in EDIT_METHODS:
+            if params.get("inline_message_id"):
+                return {"ok": True, "result": True}
+            message = self._message(params, int(params.get("message_id") or 0))
+            message["edit_date"] = message["date"]
+            self._deliver(message["chat"]["id"], message)
+            return {"ok": True, "result": message}
+        if method in TRUE_METHODS:
+            return {"ok": True, "result": True}
+        return {"ok": False, "error_code": 400, "description": f"Bad Request: method {method} is not supported by FakeTelegram"}
+
+    async def get_updates(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """getUpdates: подтверждает апдейты до offset и ждет новых до timeout секунд"""
+        self.calls["getUpdates"] += 1
+        offset = int(params.get("offset") or 0)
+        while self._updates and self._updates[0]["update_id"] < offset:
+            self._updates.popleft()
+        timeout = float(params.get("timeout") or 0)
+        if not self._updates and timeout:
+            self._has_updates.clear()
+            try:
+                await asyncio.wait_for(self._has_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        limit = int(params.get("limit") or 100)
+        return {"ok": True, "result": list(islice(self._updates, limit))}
+
+    async def call(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Вызов метода с задержкой и, с вероятностью rate_limit, ответом 429"""
+        if method == "getUpdates":
+            return await self.get_updates(params)
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + random.random() * self.jitter)
+        if self.rate_limit and method not in NEVER_LIMITED and random.random() < self.rate_limit:
+            self.rate_limited[method] += 1
+            return {"ok": False, "error_code": 429, "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after}}
+        return self.result(method, params)
+
+
+class MockSession(BaseSession):
+    """Сессия aiogram, которая отвечает из FakeTelegram без сети"""
+
+    def __init__(self, telegram: Optional[FakeTelegram] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.telegram = telegram or FakeTelegram()
+
+    async def make_request(self, bot, method, timeout: Optional[int] = None):
+        # Параметры готовятся так же, как для настоящего запроса: значения по умолчанию бота, JSON
+        files = {}
+        raw = {}
+        for key, value in method.model_dump(warnings=False).items():
+            value = self.prepare_value(value, bot=bot, files=files)
+            if value:
+                raw[key] = value
+        content = json.dumps(await self.telegram.call(method.__api_method__, decode_params(raw)))
+        response = self.check_response(bot=bot, method=method, status_code=200, content=content)
+        return response.result
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+class FakeBotAPIServer:
+    """HTTP-сервер с теми же адресами, что у api.telegram.org: /bot<token>/<method>"""
+
+    def __init__(self, telegram: FakeTelegram, host: str = "127.0.0.1", port: int = 8081):
+        self.telegram = telegram
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        raw: Dict[str, Any] = dict(request.query)
+        if request.content_type == "application/json":
+            raw.update(await request.json())
+        elif request.can_read_body:
+            for key, value in (await request.post()).items():
+                # Загруженный файл (sendPhoto с InputFile) - только отметка, что он был
+                raw[key] = value if isinstance(value, str) else "attach://upload"
+        result = await self.telegram.call(request.match_info["method"], decode_params(raw))
+        return web.json_response(result, status=200 if result["ok"] else result["error_code"])
+
+    async def start(self):
+        app = web.Application(client_max_size=50 * 1024 * 1024)
+        app.router.add_route("*", "/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,285 @@
+"""
+Нагрузочный тест: весь бот (bot.main - polling, обработчики, фоновые сервисы, SQLite)
+против поддельного Bot API из benchmarks/fake_telegram.py.
+
+Пользователи приходят с частотой --rate в секунду. Каждый пишет /start; доля --sell
+проходит продажу (фото, название, цена, описание, подтверждение), доля --tickets создает
+тикет и переписывается с админом в чате (--chat-messages сообщений в каждую сторону).
+Админы - ADMIN_IDS бота, каждый ведет один чат за раз. Для каждого шага замеряется время
+от отправки апдейта до ответа бота в чате (сообщение или правка), а в конце печатаются
+p50/p90/p99 по шагам, пропускная способность и число вызовов Bot API, в том числе 429.
+
+Бот запускается в этом же процессе с TELEGRAM_API_URL на поддельный сервер, база - во
+временной директории. С --external-bot поднимается только сервер и генератор, а бот
+запускается отдельно:  TELEGRAM_API_URL=http://127.0.0.1:8081 python bot.py
+(ADMIN_IDS бота передаются через --admin-ids).
+
+Запуск:
+    python benchmarks/load_test.py --users 1000 --rate 50 --sell 0.3 --tickets 0.05
+    python benchmarks/load_test.py --users 500 --latency 40 --jitter 20 --rate-limit 0.01 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from itertools import count
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Пути из аргументов считаются от директории запуска
+START_DIR = os.getcwd()
+
+from callbacks import END_CHAT, REPLY_TICKET, START_CHAT  # noqa: E402
+from fake_telegram import FakeBotAPIServer, FakeTelegram  # noqa: E402
+
+FIRST_USER_ID = 7_000_000_000
+FIRST_ADMIN_ID = 6_000_000_000
+CHANNEL_ID = "-1001000000000"
+
+WORDS = ("велосипед", "диван", "телефон", "куртка", "коляска", "ноутбук", "стол", "лампа", "книги", "палатка",
+         "гитара", "самокат", "монитор", "кресло", "чайник", "часы", "сумка", "лыжи", "шкаф", "ковер",
+         "новый", "б/у", "отличное", "состояние", "срочно", "торг", "самовывоз", "доставка", "центр", "район",
+         "размер", "цвет", "черный", "белый", "зеленый", "комплект", "коробка", "чек", "гарантия", "обмен")
+
+TICKET_CREATED = re.compile(r"Номер: #(\d+)")
+
+
+class StepFailed(Exception):
+    pass
+
+
+class LoadTest:
+    def __init__(self, telegram: FakeTelegram, admin_ids, timeout: float):
+        self.telegram = telegram
+        self.timeout = timeout
+        self.latencies = defaultdict(list)
+        self.failures = Counter()
+        self.updates = 0
+        self.admins: asyncio.Queue = asyncio.Queue()
+        for admin_id in admin_ids:
+            self.admins.put_nowait(admin_id)
+        self._message_ids = count(1)
+        self._callback_ids = count(1)
+
+    @staticmethod
+    def _user(user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"load{user_id % 100000}", "username": f"load{user_id}"}
+
+    def message(self, user_id: int, text: str = None, photo: str = None) -> dict:
+        message = {"message_id": next(self._message_ids), "date": int(time.time()), "from": self._user(user_id),
+                   "chat": {"id": user_id, "type": "private"}}
+        if photo:
+            message["photo"] = [{"file_id": photo, "file_unique_id": photo, "width": 1280, "height": 960}]
+        else:
+            message["text"] = text
+            if text.startswith("/"):
+                message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return {"message": message}
+
+    def callback(self, user_id: int, data: str, bot_message: dict) -> dict:
+        return {"callback_query": {"id": str(next(self._callback_ids)), "from": self._user(user_id),
+                                   "chat_instance": str(user_id), "message": bot_message, "data": data}}
+
+    async def step(self, name: str, chat_id: int, update: dict, text: str = None, predicate=None) -> dict:
+        """Отправляет апдейт и ждет ответа бота в чате chat_id; время ответа - в статистику шага"""
+        future = self.telegram.expect(chat_id, text, predicate)
+        started = time.perf_counter()
+        self.telegram.feed(update)
+        self.updates += 1
+        try:
+            message = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self.failures[name] += 1
+            raise StepFailed(name)
+        self.latencies[name].append(time.perf_counter() - started)
+        return message
+
+    async def sell(self, user_id: int, menu: dict):
+        message = await self.step("sell", user_id, self.callback(user_id, "sell", menu), "Пришлите 1 фотографию")
+        await self.step("sell: фото", user_id, self.message(user_id, photo=f"load-photo-{user_id}"), "Фото добавлено")
+        words = random.sample(WORDS, 14)
+        await self.step("sell: название", user_id, self.message(user_id, f"{words[0]} {words[1]} {user_id}"),
+                        "Введите цену")
+        await self.step("sell: цена", user_id, self.message(user_id, str(random.randint(100, 50000))),
+                        "Введите описание")
+        message = await self.step("sell: описание", user_id, self.message(user_id, " ".join(words[2:])),
+                                  predicate=lambda sent: "photo" in sent)
+        await self.step("sell: публикация", user_id, self.callback(user_id, "confirm", message),
+                        "опубликовано в канале")
+
+    async def ticket_chat(self, user_id: int, menu: dict, messages: int):
+        await self.step("ticket: тема", user_id, self.callback(user_id, "ticket_other", menu), "Опишите ваш вопрос")
+        created = await self.step("ticket: создание", user_id,
+                                  self.message(user_id, f"Не публикуется объявление, пользователь {user_id}"),
+                                  "Тикет создан")
+        ticket_id = int(TICKET_CREATED.search(created["text"]).group(1))
+
+        admin_id = await self.admins.get()
+        try:
+            admin_message = {"message_id": next(self._message_ids), "date": int(time.time()),
+                             "chat": {"id": admin_id, "type": "private"}, "text": f"Тикет #{ticket_id}"}
+            invitation = await self.step("ticket: приглашение", user_id,
+                                         self.callback(admin_id, REPLY_TICKET.pack(ticket_id), admin_message),
+                                         "хочет начать чат")
+            await self.step("ticket: начало чата", user_id,
+                            self.callback(user_id, START_CHAT.pack(ticket_id), invitation), "Чат с администратором начат")
+            chat_message = None
+            for number in range(messages):
+                text = f"вопрос {number} от {user_id}"
+                await self.step("чат: пользователь -> админ", admin_id, self.message(user_id, text), text)
+                text = f"ответ {number} для {user_id}"
+                chat_message = await self.step("чат: админ -> пользователь", user_id, self.message(admin_id, text), text)
+            await self.step("ticket: завершение чата", user_id,
+                            self.callback(user_id, END_CHAT.pack(ticket_id), chat_message or invitation), "Чат завершен")
+        finally:
+            self.admins.put_nowait(admin_id)
+
+    async def user_session(self, user_id: int, args):
+        try:
+            menu = await self.step("/start", user_id, self.message(user_id, "/start"), "Добро пожаловать на барахолку")
+            if random.random() < args.sell:
+                await self.sell(user_id, menu)
+            if random.random() < args.tickets:
+                await self.ticket_chat(user_id, menu, args.chat_messages)
+        except StepFailed:
+            pass
+
+    def report(self, elapsed: float) -> dict:
+        steps = []
+        for name, values in self.latencies.items():
+            values.sort()
+            steps.append({
+                "name": name, "responses": len(values), "failures": self.failures[name],
+                "p50_ms": statistics.median(values) * 1e3,
+                "p90_ms": values[max(int(len(values) * 0.9) - 1, 0)] * 1e3,
+                "p99_ms": values[max(int(len(values) * 0.99) - 1, 0)] * 1e3,
+            })
+        for name, failures in self.failures.items():
+            if name not in self.latencies:
+                steps.append({"name": name, "responses": 0, "failures": failures,
+                              "p50_ms": None, "p90_ms": None, "p99_ms": None})
+        api_calls = sum(calls for method, calls in self.telegram.calls.items() if method != "getUpdates")
+        return {"updates": self.updates, "seconds": elapsed, "updates_per_second": self.updates / elapsed,
+                "api_calls": dict(self.telegram.calls), "api_calls_per_second": api_calls / elapsed,
+                "rate_limited": dict(self.telegram.rate_limited), "steps": steps}
+
+
+def print_report(report: dict):
+    print(f"\nАпдейтов: {report['updates']} за {report['seconds']:.1f} с - {report['updates_per_second']:.1f} апдейтов/с, "
+          f"вызовов Bot API {report['api_calls_per_second']:.1f}/с, 429: {sum(report['rate_limited'].values())}\n")
+    width = max((len(step["name"]) for step in report["steps"]), default=10)
+    print(f"{'шаг':<{width}} {'ответов':>8} {'ошибок':>7} {'p50, мс':>9} {'p90, мс':>9} {'p99, мс':>9}")
+    for step in report["steps"]:
+        if step["responses"]:
+            print(f"{step['name']:<{width}} {step['responses']:8} {step['failures']:7} "
+                  f"{step['p50_ms']:9.1f} {step['p90_ms']:9.1f} {step['p99_ms']:9.1f}")
+        else:
+            print(f"{step['name']:<{width}} {0:8} {step['failures']:7}")
+    print("\nBot API: " + ", ".join(f"{method} {calls}" for method, calls in
+                                    sorted(report["api_calls"].items(), key=lambda item: -item[1])))
+
+
+async def wait_for_polling(telegram: FakeTelegram, bot_task=None):
+    """Ждет первого getUpdates - бот запущен и принимает апдейты"""
+    while not telegram.calls["getUpdates"]:
+        if bot_task is not None and bot_task.done():
+            raise RuntimeError("Бот остановился до начала polling - см. лог выше")
+        await asyncio.sleep(0.05)
+
+
+async def run(args) -> dict:
+    telegram = FakeTelegram(latency=args.latency / 1000, jitter=args.jitter / 1000,
+                            rate_limit=args.rate_limit, retry_after=args.retry_after)
+    server = FakeBotAPIServer(telegram, port=args.port)
+    await server.start()
+
+    bot_task = None
+    admin_ids = [int(item) for item in args.admin_ids.split(",") if item] if args.admin_ids else \
+        [FIRST_ADMIN_ID + index for index in range(args.admins)]
+    try:
+        if args.external_bot:
+            print(f"Поддельный Bot API: {server.url}. Запустите бота с TELEGRAM_API_URL={server.url}")
+        else:
+            # Настройки бота разбираются при импорте config - окружение задается до импорта bot
+            os.chdir(tempfile.mkdtemp(prefix="load_test_"))
+            os.environ["TELEGRAM_API_URL"] = server.url
+            os.environ["ADMIN_IDS"] = ",".join(map(str, admin_ids))
+            os.environ.setdefault("BOT_TOKEN", "1:load-test")
+            os.environ.setdefault("CHANNEL_ID", CHANNEL_ID)
+            os.environ.setdefault("HANDLER_STATS_INTERVAL", "0")
+            import bot
+            from config import config
+
+            if config.TELEGRAM_API_URL != server.url:
+                raise RuntimeError(f"TELEGRAM_API_URL переопределен в {config.env_file}: {config.TELEGRAM_API_URL}")
+            # .env бота может задать своих админов - чаты ведут они
+            admin_ids = list(config.ADMIN_IDS)
+            if not args.verbose:
+                logging.getLogger().setLevel(logging.WARNING)
+            bot_task = asyncio.create_task(bot.main())
+
+        await wait_for_polling(telegram, bot_task)
+        test = LoadTest(telegram, admin_ids, args.timeout)
+        if args.tickets and not admin_ids:
+            print("⚠️  Нет админов - сценарий тикетов пропущен")
+            args.tickets = 0
+
+        started = time.perf_counter()
+        sessions = []
+        for index in range(args.users):
+            sessions.append(asyncio.create_task(test.user_session(FIRST_USER_ID + index, args)))
+            if args.rate:
+                await asyncio.sleep(1 / args.rate)
+        await asyncio.gather(*sessions)
+        report = test.report(time.perf_counter() - started)
+    finally:
+        # Polling останавливается штатно, и bot.main сам закрывает сервисы и сессию бота;
+        # сервер - только после этого, иначе бот не дождался бы ответов при остановке
+        if bot_task is not None:
+            if not await bot.stop() and not bot_task.done():
+                # Бот еще не дошел до polling - останавливать штатно нечего
+                bot_task.cancel()
+            await asyncio.gather(bot_task, return_exceptions=True)
+        await server.stop()
+
+    print_report(report)
+    if args.output:
+        with open(os.path.join(START_DIR, args.output), "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000, help="пользователей")
+    parser.add_argument("--rate", type=float, default=50, help="новых пользователей в секунду (0 - все сразу)")
+    parser.add_argument("--sell", type=float, default=0.3, help="доля пользователей, которые продают")
+    parser.add_argument("--tickets", type=float, default=0.05, help="доля пользователей с чатом по тикету")
+    parser.add_argument("--chat-messages", type=int, default=3, help="сообщений в чате в каждую сторону")
+    parser.add_argument("--admins", type=int, default=3, help="админов (если ADMIN_IDS не задан в .env)")
+    parser.add_argument("--admin-ids", help="ADMIN_IDS бота через запятую (для --external-bot)")
+    parser.add_argument("--latency", type=float, default=0, help="задержка ответа Bot API, мс")
+    parser.add_argument("--jitter", type=float, default=0, help="случайная добавка к задержке, до N мс")
+    parser.add_argument("--rate-limit", type=float, default=0, help="доля запросов с ответом 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after в ответе 429, с")
+    parser.add_argument("--timeout", type=float, default=30, help="сколько ждать ответа бота, с")
+    parser.add_argument("--port", type=int, default=8081, help="порт поддельного Bot API")
+    parser.add_argument("--external-bot", action="store_true", help="бот запущен отдельно")
+    parser.add_argument("--output", help="сохранить результат в JSON")
+    parser.add_argument("--seed", type=int, default=1, help="seed выбора сценариев")
+    parser.add_argument("--verbose", action="store_true", help="не приглушать лог бота")
+    args = parser.parse_args()
+    random.seed(args.seed)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,40 @@ import asyncio
 import logging
 import os
 import sys
-from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.types import BotCommand, BotCommandScopeChat
-from aiogram.exceptions import TelegramConflictError
 
-from config import config
-from database import init_db
-from handlers import all_routers
+# Профилировщик импортируется первым, чтобы замерить все остальные импорты
+from startup_profiler import startup_profiler
+
+with startup_profiler.phase("import aiogram"):
+    from aiogram import Bot, Dispatcher
+    from aiogram.fsm.storage.memory import MemoryStorage
+    from aiogram.types import BotCommand, BotCommandScopeChat
+    from aiogram.exceptions import TelegramConflictError
+
+with startup_profiler.phase("import config/database"):
+    from config import config
+    from database import init_db
+    from telegram_api import create_bot
+
+with startup_profiler.phase("import services"):
+    import handlers
+    from post_lifecycle import post_lifecycle
+    from post_dedup import post_dedup
+    from chat_sessions import chat_sessions
+    from privilege_catalogue import privilege_catalogue
+    from ticket_sla import ticket_sla
+    from ticket_message_buffer import ticket_message_buffer
+    from ticket_archive import ticket_archive
+    from admin_notifier import admin_notifier
+    from handler_profiler import handler_profiler
+    from metrics import metrics_server
+    from services import close_channel_bot
+
+# Сколько запросов set_my_commands для админов отправлять одновременно
+ADMIN_COMMANDS_CONCURRENCY = 5
+
+# Диспетчер работающего main() - через него stop() останавливает polling
+_dispatcher = None
 
 
 # Настройка логирования
@@ -31,54 +57,130 @@ async def set_bot_commands(bot: Bot):
         BotCommand(command="/myid", description="Показать ваш ID"),
         BotCommand(command="/ref", description="Реферальная система"),
         BotCommand(command="/ref_top", description="Топ рефереров"),
+        BotCommand(command="/search", description="Поиск объявлений"),
     ]
 
     # Добавляем команду /admin для админов
     admin_commands = commands + [
         BotCommand(command="/admin", description="Админ-панель"),
         BotCommand(command="/stats", description="Статистика бота"),
+        BotCommand(command="/ticket", description="Найти тикет по номеру"),
+        BotCommand(command="/tsearch", description="Поиск по тикетам"),
     ]
 
     # Устанавливаем команды для всех пользователей
     await bot.set_my_commands(commands)
 
-    # Устанавливаем команды для каждого админа отдельно
-    admin_count = len(config.ADMIN_IDS)
-    success_count = 0
-    for admin_id in config.ADMIN_IDS:
-        try:
-            await bot.set_my_commands(admin_commands, scope=BotCommandScopeChat(chat_id=admin_id))
-            success_count += 1
-        except Exception as e:
-            logging.error(f"❌ Ошибка установки команд для админа {admin_id}: {e}")
+    # Команды админов ставятся параллельно, не больше ADMIN_COMMANDS_CONCURRENCY запросов сразу
+    semaphore = asyncio.Semaphore(ADMIN_COMMANDS_CONCURRENCY)
 
+    async def set_admin_commands(admin_id: int) -> bool:
+        async with semaphore:
+            try:
+                await bot.set_my_commands(admin_commands, scope=BotCommandScopeChat(chat_id=admin_id))
+                return True
+            except Exception as e:
+                logging.error(f"❌ Ошибка установки команд для админа {admin_id}: {e}")
+                return False
+
+    admin_count = len(config.ADMIN_IDS)
+    results = await asyncio.gather(*(set_admin_commands(admin_id) for admin_id in config.ADMIN_IDS))
     if admin_count > 0:
-        logging.info(f"✅ Меню команд установлено для {success_count}/{admin_count} админов")
+        logging.info(f"✅ Меню команд установлено для {sum(results)}/{admin_count} админов")
+
+
+async def set_bot_commands_background(bot: Bot):
+    """Меню команд ставится в фоне: polling не ждет ответов API"""
+    try:
+        await set_bot_commands(bot)
+    except Exception as e:
+        logging.error(f"❌ Ошибка установки меню команд: {e}")
+
+
+async def stop() -> bool:
+    """
+    Штатно останавливает polling, запущенный main() (нагрузочный тест): main() после этого
+    выполняет finally - останавливает сервисы и закрывает сессию бота.
+    False - polling не шел (бот еще запускается или уже остановлен).
+    """
+    if _dispatcher is None:
+        return False
+    try:
+        await _dispatcher.stop_polling()
+    except RuntimeError:
+        return False
+    return True
 
 
 async def main():
+    global _dispatcher
+    # Настройки разобраны при импорте config; здесь - только проверка и отчет
+    errors = config.validate()
+    if errors:
+        for error in errors:
+            logging.error(f"❌ ОШИБКА НАСТРОЕК: {error}")
+        print("📝 Создайте файл .env в папке с ботом и добавьте:")
+        print("   BOT_TOKEN=your_bot_token_here")
+        print("\n💡 Скопируйте .env.example в .env и заполните значения")
+        sys.exit(1)
+    for line in config.summary():
+        logging.info(line)
+
     # Инициализация БД
     try:
-        await init_db()
+        with startup_profiler.phase("init_db"):
+            await init_db()
         logging.info("✅ База данных инициализирована")
     except Exception as e:
         logging.error(f"❌ Ошибка инициализации БД: {e}")
         return
 
+    # Цены и кулдауны привилегий, активные чаты по тикетам и скетчи SLA нужны до приема
+    # сообщений; они не зависят друг от друга и читаются параллельно
+    with startup_profiler.phase("каталог привилегий + чаты + SLA"):
+        await asyncio.gather(privilege_catalogue.load(), chat_sessions.load(), ticket_sla.load())
+
     # Создание бота и диспетчера
     bot = None
+    commands_task = None
     try:
-        bot = Bot(token=config.BOT_TOKEN)
-        storage = MemoryStorage()
-        dp = Dispatcher(storage=storage)
+        with startup_profiler.phase("bot + dispatcher"):
+            bot = create_bot()
+            storage = MemoryStorage()
+            dp = _dispatcher = Dispatcher(storage=storage)
+            dp.update.outer_middleware(startup_profiler.first_update_middleware)
+            handler_profiler.install(dp)
+            metrics_server.watch_fsm(storage)
+
+        # Подключаем ВСЕ роутеры (модули обработчиков импортируются здесь, каждый с замером)
+        for router in handlers.load_routers(startup_profiler):
+            dp.include_router(router)
 
-        # Установка команд бота
-        await set_bot_commands(bot)
+        # Меню команд - в фоне, после старта polling ответы API не нужны
+        commands_task = asyncio.create_task(set_bot_commands_background(bot))
 
-        # Подключаем ВСЕ роутеры
-        for router in all_routers:
-            dp.include_router(router)
+        # Фоновый свипер истекших объявлений
+        post_lifecycle.start_sweeper(bot)
+
+        # Фоновый перенос давно закрытых тикетов в архив
+        ticket_archive.start()
 
+        # Проверка изменений каталога привилегий из других процессов
+        privilege_catalogue.start()
+
+        # Сводка тикетов низкого приоритета для админов
+        admin_notifier.start(bot)
+
+        # Периодическая сводка задержек обработчиков
+        handler_profiler.start()
+
+        # HTTP-эндпоинт /metrics (если задан METRICS_PORT)
+        await metrics_server.start()
+
+        # Индекс дубликатов строится в фоне, не задерживая запуск
+        post_dedup.start()
+
+        startup_profiler.report()
         logging.info("✅ Бот запущен")
 
         # Запуск бота в режиме polling с обработкой конфликтов
@@ -99,11 +201,28 @@ async def main():
     except Exception as e:
         logging.error(f"❌ Ошибка при работе бота: {e}", exc_info=True)
     finally:
+        await post_lifecycle.stop_sweeper()
+        await ticket_archive.stop()
+        await post_dedup.stop()
+        await privilege_catalogue.stop()
+        await handler_profiler.stop()
+        await metrics_server.stop()
+        await ticket_message_buffer.close()
+        _dispatcher = None
+        if commands_task and not commands_task.done():
+            # Меню команд не успело установиться - запросы не должны пережить закрытие сессии
+            commands_task.cancel()
+            await asyncio.gather(commands_task, return_exceptions=True)
         if bot:
+            await admin_notifier.stop(bot)
             try:
                 await bot.session.close()
             except Exception as e:
                 logging.error(f"Ошибка при закрытии сессии: {e}")
+        try:
+            await close_channel_bot()
+        except Exception as e:
+            logging.error(f"Ошибка при закрытии сессии бота публикации: {e}")
         logging.info("🛑 Бот остановлен")
 
 
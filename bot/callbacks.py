@@ -0,0 +1,203 @@
+"""
+callback_data кнопок с параметрами.
+
+Каждое действие объявляется один раз - CallbackAction с коротким кодом и типизированными
+полями - и дальше кнопки строятся через ACTION.pack(...), а обработчики получают уже
+разобранные значения в аргументе callback_data. Формат:
+
+    <версия><код>:<поле>:<поле>     например "1vap:vip:1a" - APPLY_PRICE(vip, 46)
+
+Числа пишутся в base36, так что id тикетов и пользователей занимают 2-7 символов;
+строковое поле, если оно последнее, может содержать ":" (курсоры поиска). Версия схемы
+стоит в начале ключа: кнопки старого формата или прежней версии не совпадут ни с одним
+ключом и получат ответ «кнопка устарела» (ban_handlers) вместо чужого обработчика.
+
+Маршрутизация - CallbackTable: на роутер регистрируется один обработчик, который находит
+нужную функцию по ключу в словаре, а не перебором F.data.startswith(...). Заодно исчезают
+пересечения префиксов (buy_privilege и buy_vip, reset_ и reset_cd_): ключ сравнивается
+целиком. Кнопки без параметров ("help", "admin_main") остаются обычными строками.
+"""
+from collections import namedtuple
+from typing import Callable, Dict, Tuple, Union
+
+from aiogram import Router
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.types import CallbackQuery
+
+# Меняется, если старые кнопки нельзя разбирать по-новому
+CALLBACK_VERSION = "1"
+SEPARATOR = ":"
+# Ограничение Telegram на callback_data в байтах
+CALLBACK_DATA_LIMIT = 64
+
+_BASE36 = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+# {ключ: действие} - все объявленные действия, ключи не должны повторяться
+_actions: Dict[str, "CallbackAction"] = {}
+
+
+def _encode_int(value: int) -> str:
+    if value < 0:
+        return "-" + _encode_int(-value)
+    digits = []
+    while True:
+        value, digit = divmod(value, 36)
+        digits.append(_BASE36[digit])
+        if not value:
+            return "".join(reversed(digits))
+
+
+def _encode(kind: type, value) -> str:
+    if kind is bool:
+        return "1" if value else "0"
+    if kind is int:
+        return _encode_int(int(value))
+    return str(value)
+
+
+def _decode(kind: type, raw: str):
+    if kind is bool:
+        if raw not in ("0", "1"):
+            raise ValueError(f"ожидается 0/1, получено '{raw}'")
+        return raw == "1"
+    if kind is int:
+        return int(raw, 36)
+    return raw
+
+
+class CallbackAction:
+    """Тип кнопки: код и поля (имя=тип, поддерживаются int, str и bool)"""
+
+    def __init__(self, code: str, **fields: type):
+        self.key = CALLBACK_VERSION + code
+        if self.key in _actions:
+            raise ValueError(f"Код callback_data '{code}' уже занят")
+        self.fields: Tuple[Tuple[str, type], ...] = tuple(fields.items())
+        self.data = namedtuple(f"CallbackData_{code}", [name for name, _ in self.fields])
+        _actions[self.key] = self
+
+    def pack(self, *args, **kwargs) -> str:
+        """callback_data кнопки; ValueError, если значения не влезают в лимит Telegram"""
+        values = self.data(*args, **kwargs)
+        parts = [self.key]
+        for (name, kind), value in zip(self.fields, values):
+            encoded = _encode(kind, value)
+            # Разделитель допустим только в последнем поле - его разбор забирает остаток строки
+            if SEPARATOR in encoded and name != self.fields[-1][0]:
+                raise ValueError(f"{self.key}.{name}: значение не может содержать '{SEPARATOR}'")
+            parts.append(encoded)
+        packed = SEPARATOR.join(parts)
+        if len(packed.encode()) > CALLBACK_DATA_LIMIT:
+            raise ValueError(f"callback_data длиннее {CALLBACK_DATA_LIMIT} байт: {packed}")
+        return packed
+
+    def unpack(self, payload: str):
+        """Разбирает поля (часть после ключа); ValueError - битые данные"""
+        if not self.fields:
+            if payload:
+                raise ValueError(f"{self.key}: лишние поля")
+            return self.data()
+        raw = payload.split(SEPARATOR, len(self.fields) - 1)
+        if len(raw) != len(self.fields):
+            raise ValueError(f"{self.key}: ожидается полей {len(self.fields)}, получено {len(raw)}")
+        return self.data(*(_decode(kind, value) for (_, kind), value in zip(self.fields, raw)))
+
+
+def split_key(data: str) -> Tuple[str, str]:
+    """Ключ действия и поля callback_data"""
+    key, _, payload = data.partition(SEPARATOR)
+    return key, payload
+
+
+class CallbackTable:
+    """
+    Обработчики действий одного роутера: ключ -> функция.
+
+    callbacks = CallbackTable(router)
+
+    @callbacks(EDIT_PRIVILEGE)
+    async def edit_privilege(callback: CallbackQuery, callback_data):
+        callback_data.privilege ...
+
+    Обработчики получают те же аргументы, что и обычные (state, bot и т.д.), плюс callback_data.
+    """
+
+    def __init__(self, router: Router):
+        self._handlers: Dict[str, Tuple[CallbackAction, CallableObject]] = {}
+        router.callback_query.register(self._dispatch, self._match)
+
+    def __call__(self, action: CallbackAction) -> Callable:
+        def decorator(handler: Callable) -> Callable:
+            if action.key in self._handlers:
+                raise ValueError(f"Для '{action.key}' уже есть обработчик в этом роутере")
+            self._handlers[action.key] = (action, CallableObject(handler))
+            return handler
+
+        return decorator
+
+    async def _match(self, callback: CallbackQuery) -> Union[bool, dict]:
+        key, payload = split_key(callback.data or "")
+        entry = self._handlers.get(key)
+        if entry is None:
+            return False
+        action, handler = entry
+        try:
+            callback_data = action.unpack(payload)
+        except ValueError:
+            return False
+        return {"callback_data": callback_data, "callback_handler": handler}
+
+    @staticmethod
+    async def _dispatch(callback: CallbackQuery, callback_handler: CallableObject, **data):
+        return await callback_handler.call(callback, **data)
+
+
+# Покупка привилегии
+BUY_PRIVILEGE = CallbackAction("b", privilege=str)
+
+# Тикеты пользователя
+VIEW_TICKET = CallbackAction("t", ticket_id=int)
+MY_TICKETS_PAGE = CallbackAction("tp", backward=bool, cursor=str)
+TICKET_HISTORY = CallbackAction("th", ticket_id=int, cursor=str)
+TICKET_EXPORT = CallbackAction("tx", ticket_id=int)
+CLOSE_TICKET = CallbackAction("tc", ticket_id=int)
+START_CHAT = CallbackAction("cs", ticket_id=int)
+DECLINE_CHAT = CallbackAction("cd", ticket_id=int)
+END_CHAT = CallbackAction("ce", ticket_id=int)
+CANCEL_CHAT = CallbackAction("cc", ticket_id=int)
+
+# Тикеты в админке
+ADMIN_VIEW_TICKET = CallbackAction("at", ticket_id=int)
+ADMIN_TICKETS_PAGE = CallbackAction("atp", backward=bool, list_key=str, cursor=str)
+ADMIN_TICKET_HISTORY = CallbackAction("ath", ticket_id=int, cursor=str)
+ADMIN_TAKE_TICKET = CallbackAction("ak", ticket_id=int)
+ADMIN_CLOSE_TICKET = CallbackAction("ac", ticket_id=int)
+REOPEN_TICKET = CallbackAction("ao", ticket_id=int)
+REPLY_TICKET = CallbackAction("ar", ticket_id=int)
+ADMIN_REPLY_CHAT = CallbackAction("acr", ticket_id=int)
+ADMIN_END_CHAT = CallbackAction("ace", ticket_id=int)
+ADMIN_CANCEL_CHAT = CallbackAction("acc", ticket_id=int)
+TICKET_SEARCH_NEXT = CallbackAction("as", cursor=str)
+
+# Объявления и поиск
+POST_BUMP = CallbackAction("pb", post_id=int)
+POST_SOLD = CallbackAction("ps", post_id=int)
+SEARCH_NEXT = CallbackAction("sn", cursor=str)
+
+# Настройка привилегий
+EDIT_PRIVILEGE = CallbackAction("ve", privilege=str)
+SET_PRICE = CallbackAction("vp", privilege=str)
+SET_COOLDOWN = CallbackAction("vc", privilege=str)
+APPLY_PRICE = CallbackAction("vap", privilege=str, price=int)
+APPLY_COOLDOWN = CallbackAction("vac", privilege=str, cooldown=int)
+CUSTOM_PRICE = CallbackAction("vxp", privilege=str)
+CUSTOM_COOLDOWN = CallbackAction("vxc", privilege=str)
+
+# Управление пользователями
+USER_SELECT = CallbackAction("us", user_id=int)
+USER_BAN = CallbackAction("ub", user_id=int)
+USER_UNBAN = CallbackAction("uu", user_id=int)
+USER_RESET = CallbackAction("ur", user_id=int)
+USER_RESET_COOLDOWN = CallbackAction("uc", user_id=int)
+USER_CHANGE_PRIVILEGE = CallbackAction("up", user_id=int)
+USER_GRANT_PRIVILEGE = CallbackAction("ug", user_id=int, privilege=str)
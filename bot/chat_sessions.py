@@ -0,0 +1,96 @@
+"""
+Реестр активных чатов по тикетам.
+
+Чат - это тикет в работе с назначенным админом. Реестр держит чаты в памяти сразу
+по трем ключам (тикет, админ, пользователь), так что пересылка сообщения в чате
+обходится поиском в словаре вместо чтения тикета из БД на каждое сообщение.
+Реестр ведут обработчики начала и завершения чата и TicketService при смене статуса
+тикета; при запуске бота он восстанавливается из тикетов в работе.
+"""
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from sqlalchemy import select
+
+from database import AsyncSessionLocal, Ticket
+
+
+@dataclass(frozen=True)
+class ChatSession:
+    ticket_id: int
+    user_id: int
+    admin_id: int
+
+
+class ChatSessionRegistry:
+    """Активные чаты: {ticket_id}, {admin_id}, {user_id} -> ChatSession"""
+
+    def __init__(self):
+        self._by_ticket: Dict[int, ChatSession] = {}
+        self._by_admin: Dict[int, ChatSession] = {}
+        self._by_user: Dict[int, ChatSession] = {}
+
+    def __len__(self):
+        return len(self._by_ticket)
+
+    def open(self, ticket_id: int, user_id: int, admin_id: int) -> ChatSession:
+        """
+        Регистрирует чат по тикету. У админа и у пользователя активен один чат:
+        новый чат вытесняет предыдущий чат того же админа или пользователя.
+        """
+        self.close(ticket_id)
+        for previous in (self._by_admin.get(admin_id), self._by_user.get(user_id)):
+            if previous:
+                self.close(previous.ticket_id)
+
+        chat = ChatSession(ticket_id, user_id, admin_id)
+        self._by_ticket[ticket_id] = chat
+        self._by_admin[admin_id] = chat
+        self._by_user[user_id] = chat
+        return chat
+
+    def close(self, ticket_id: int) -> Optional[ChatSession]:
+        """Убирает чат по тикету (чат завершен, тикет закрыт или удален)"""
+        chat = self._by_ticket.pop(ticket_id, None)
+        if chat is None:
+            return None
+        if self._by_admin.get(chat.admin_id) is chat:
+            del self._by_admin[chat.admin_id]
+        if self._by_user.get(chat.user_id) is chat:
+            del self._by_user[chat.user_id]
+        return chat
+
+    def get(self, ticket_id: int) -> Optional[ChatSession]:
+        return self._by_ticket.get(ticket_id)
+
+    def by_admin(self, admin_id: int) -> Optional[ChatSession]:
+        return self._by_admin.get(admin_id)
+
+    def by_user(self, user_id: int) -> Optional[ChatSession]:
+        return self._by_user.get(user_id)
+
+    async def load(self):
+        """Восстанавливает реестр из тикетов в работе с назначенным админом"""
+        try:
+            stmt = (
+                select(Ticket.id, Ticket.user_id, Ticket.admin_id)
+                .where(Ticket.status == "in_progress", Ticket.admin_id.isnot(None))
+                .order_by(Ticket.created_at.asc(), Ticket.id.asc())
+            )
+            async with AsyncSessionLocal() as session:
+                rows = (await session.execute(stmt)).all()
+
+            self._by_ticket.clear()
+            self._by_admin.clear()
+            self._by_user.clear()
+            # Более новый тикет вытесняет старый, как и при открытии чата
+            for ticket_id, user_id, admin_id in rows:
+                self.open(ticket_id, user_id, admin_id)
+            logging.info(f"Реестр чатов восстановлен: чатов={len(self)}")
+        except Exception as e:
+            logging.error(f"Ошибка восстановления реестра чатов: {e}", exc_info=True)
+
+
+# Глобальный экземпляр
+chat_sessions = ChatSessionRegistry()
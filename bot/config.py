@@ -1,178 +1,234 @@
 # config.py
+"""
+Настройки бота.
+
+Окружение разбирается один раз при импорте в неизменяемый объект Settings: переменные
+процесса, поверх них - значения из .env рядом с config.py (файл, как и раньше, перекрывает
+окружение). Импорт ничего не настраивает и не завершает процесс: логирование настраивает
+bot.py, а ошибки настроек (в том числе отсутствие BOT_TOKEN) проверяются при запуске
+через config.validate(). Поэтому сервисы, бенчмарки и проверки импортируются без токена.
+"""
 import os
-import logging
+import re
+from dataclasses import dataclass, field
 from pathlib import Path
-from dotenv import load_dotenv
+from types import MappingProxyType
+from typing import List, Mapping, Optional, Tuple
+
+from dotenv import dotenv_values
 
 # Определяем путь к директории, где находится config.py
 BASE_DIR = Path(__file__).parent.resolve()
 ENV_FILE = BASE_DIR / '.env'
 
-# Настройка логирования для config
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s"
-)
-logger = logging.getLogger(__name__)
-
-# Загружаем .env файл с явным указанием пути
-if ENV_FILE.exists():
-    result = load_dotenv(ENV_FILE, override=True, encoding='utf-8')
-    logger.info(f"✅ Загружен .env файл из {ENV_FILE}, результат: {result}")
-    # Отладочная информация
-    import os
-    test_token = os.getenv("BOT_TOKEN")
-    if test_token:
-        logger.info(f"✅ BOT_TOKEN успешно загружен (длина: {len(test_token)})")
-    else:
-        logger.warning(f"⚠️  BOT_TOKEN не найден после загрузки .env")
-        # Пробуем прочитать напрямую из файла
-        try:
-            with open(ENV_FILE, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.startswith('BOT_TOKEN='):
-                        token = line.split('=', 1)[1].strip()
-                        os.environ['BOT_TOKEN'] = token
-                        logger.info(f"✅ BOT_TOKEN установлен напрямую из файла")
-                        break
-        except Exception as e:
-            logger.error(f"❌ Ошибка чтения .env файла: {e}")
-else:
-    # Пробуем загрузить из текущей директории (для обратной совместимости)
-    logger.warning(f"⚠️  .env файл не найден по пути {ENV_FILE}, пробую загрузить из текущей директории")
-    load_dotenv(override=True, encoding='utf-8')
-
-
-class Config:
-    BOT_TOKEN = os.getenv("BOT_TOKEN")
-    
-    # Проверка наличия токена
-    if not BOT_TOKEN:
-        import sys
-        print("❌ ОШИБКА: BOT_TOKEN не найден в переменных окружения!")
-        print("📝 Создайте файл .env в папке с ботом и добавьте:")
-        print("   BOT_TOKEN=your_bot_token_here")
-        print("\n💡 Скопируйте .env.example в .env и заполните значения")
-        sys.exit(1)
-
-    # Исправляем парсинг ADMIN_IDS с улучшенным логированием
-    ADMIN_IDS = []
-    admin_ids_str = os.getenv("ADMIN_IDS", "")
-    
-    # Умный парсер: читаем напрямую из файла и ищем все возможные варианты записи админов
-    if ENV_FILE.exists():
-        try:
-            import re
-            with open(ENV_FILE, 'r', encoding='utf-8') as f:
-                file_content = f.read()
-                lines = file_content.split('\n')
-                
-                # Ищем строку с ADMIN_IDS
-                admin_line_idx = None
-                for idx, line in enumerate(lines):
-                    if line.strip().startswith('ADMIN_IDS='):
-                        admin_line_idx = idx
-                        break
-                
-                if admin_line_idx is not None:
-                    # Извлекаем значение из строки ADMIN_IDS=
-                    admin_line = lines[admin_line_idx].strip()
-                    if '=' in admin_line:
-                        value_part = admin_line.split('=', 1)[1].strip()
-                        # Убираем кавычки если есть
-                        if (value_part.startswith('"') and value_part.endswith('"')) or \
-                           (value_part.startswith("'") and value_part.endswith("'")):
-                            value_part = value_part[1:-1].strip()
-                        
-                        # Собираем все числовые ID из этой строки и следующих строк
-                        all_admin_ids = []
-                        
-                        # Парсим текущую строку
-                        current_ids = re.findall(r'\d+', value_part)
-                        all_admin_ids.extend(current_ids)
-                        
-                        # Проверяем следующие 3 строки на наличие числовых ID
-                        for next_idx in range(admin_line_idx + 1, min(admin_line_idx + 4, len(lines))):
-                            next_line = lines[next_idx].strip()
-                            # Если пустая строка - пропускаем, но продолжаем
-                            if not next_line:
-                                continue
-                            # Если комментарий - останавливаемся
-                            if next_line.startswith('#'):
-                                break
-                            # Если новая переменная (начинается с буквы и содержит =) - останавливаемся
-                            if re.match(r'^[A-Za-z_][A-Za-z0-9_]*\s*=', next_line):
-                                break
-                            
-                            # Ищем числовые ID в этой строке
-                            found_ids = re.findall(r'\d{8,}', next_line)  # ID Telegram обычно 8+ цифр
-                            if found_ids:
-                                all_admin_ids.extend(found_ids)
-                        
-                        # Если нашли больше ID, чем через dotenv - используем их
-                        if len(all_admin_ids) > len(admin_ids_str.split(',')):
-                            admin_ids_str = ','.join(all_admin_ids)
-                        elif len(all_admin_ids) > 0:
-                            # Объединяем найденные ID
-                            existing_ids = [x.strip() for x in admin_ids_str.split(',') if x.strip().isdigit()]
-                            all_unique_ids = list(set(existing_ids + all_admin_ids))
-                            if len(all_unique_ids) > len(existing_ids):
-                                admin_ids_str = ','.join(all_unique_ids)
-        except Exception as e:
-            logger.warning(f"⚠️  Не удалось прочитать админов из файла: {e}", exc_info=True)
-    
-    if admin_ids_str:
-        try:
-            # Сначала очищаем строку от лишних пробелов и кавычек
-            admin_ids_str = admin_ids_str.strip()
-            # Убираем кавычки, если они есть (одинарные или двойные)
-            if (admin_ids_str.startswith('"') and admin_ids_str.endswith('"')) or \
-               (admin_ids_str.startswith("'") and admin_ids_str.endswith("'")):
-                admin_ids_str = admin_ids_str[1:-1].strip()
-            
-            # Поддерживаем разные разделители: запятая, точка с запятой, пробел, перенос строки
-            # Используем регулярное выражение для более гибкого парсинга
-            import re
-            
-            # Разбиваем по любому из разделителей (запятая, точка с запятой, пробел, таб, перенос строки)
-            # и фильтруем пустые строки
-            admin_ids_list = re.split(r'[,;\s\n\r\t]+', admin_ids_str)
-            admin_ids_list = [x.strip() for x in admin_ids_list if x.strip()]
-            
-            if not admin_ids_list:
-                # Если разделителей нет, пробуем как одно число
-                admin_ids_list = [admin_ids_str.strip()]
-            
-            ADMIN_IDS = []
-            for admin_id_str in admin_ids_list:
-                try:
-                    admin_id = int(admin_id_str)
-                    ADMIN_IDS.append(admin_id)
-                except ValueError:
-                    logger.warning(f"⚠️  Пропущен невалидный ID админа: '{admin_id_str}' (не является числом)")
-            
-            if ADMIN_IDS:
-                logger.info(f"✅ Загружено админов: {len(ADMIN_IDS)} ({', '.join(map(str, ADMIN_IDS))})")
-        except Exception as e:
-            logger.error(f"❌ Ошибка парсинга ADMIN_IDS: {e}", exc_info=True)
-    else:
-        logger.warning("⚠️  ADMIN_IDS не указан в переменных окружения!")
-
-    CHANNEL_ID = os.getenv("CHANNEL_ID")
-
-    # Привилегии и кулдауны
-    PRIVILEGES = {
-        "user": {"cooldown": 60, "price": 0, "label": "User"},
-        "vip": {"cooldown": 40, "price": 50, "label": "VIP"},
-        "premium": {"cooldown": 30, "price": 120, "label": "PREMIUM"},
-        "god": {"cooldown": 20, "price": 500, "label": "GOD"},
-        "ultra_seller": {"cooldown": 10, "price": 1500, "label": "ULTRA SELLER"}
-    }
-    
+# Привилегии и кулдауны по умолчанию; рабочие значения хранятся в БД (privilege_catalogue)
+DEFAULT_PRIVILEGES = MappingProxyType({
+    "user": MappingProxyType({"cooldown": 60, "price": 0, "label": "User"}),
+    "vip": MappingProxyType({"cooldown": 40, "price": 50, "label": "VIP"}),
+    "premium": MappingProxyType({"cooldown": 30, "price": 120, "label": "PREMIUM"}),
+    "god": MappingProxyType({"cooldown": 20, "price": 500, "label": "GOD"}),
+    "ultra_seller": MappingProxyType({"cooldown": 10, "price": 1500, "label": "ULTRA SELLER"})
+})
+
+_ADMIN_ID_SEPARATORS = re.compile(r"[,;\s]+")
+
+
+@dataclass(frozen=True)
+class Settings:
+    BOT_TOKEN: Optional[str] = None
+    ADMIN_IDS: Tuple[int, ...] = ()
+    CHANNEL_ID: Optional[str] = None
+    # TELEGRAM_API_URL: другой сервер Bot API вместо api.telegram.org - локальный telegram-bot-api
+    # или поддельный из benchmarks/fake_telegram.py для нагрузочного теста (пусто = api.telegram.org)
+    TELEGRAM_API_URL: Optional[str] = None
+
+    # PRIVILEGE_REFRESH_SECONDS: как часто проверять, не изменил ли каталог привилегий другой процесс (0 = не проверять)
+    PRIVILEGE_REFRESH_SECONDS: int = 30
+    PRIVILEGES: Mapping[str, Mapping] = field(default_factory=lambda: DEFAULT_PRIVILEGES)
+
     # Настройки автоочистки сообщений
     # AUTO_DELETE_DELAY: автоматическое удаление всех сообщений через N секунд (0 = отключено)
     # По умолчанию отключено, временные уведомления удаляются через 3-5 секунд
-    AUTO_DELETE_DELAY = int(os.getenv("AUTO_DELETE_DELAY", "0"))  # 0 = отключено
+    AUTO_DELETE_DELAY: int = 0
+
+    # Жизненный цикл объявлений
+    # POST_LIFETIME_DAYS: через сколько дней активное объявление считается неактуальным
+    # POST_EXPIRE_ACTION: что делать с сообщением в канале - "edit" (пометить) или "delete" (удалить)
+    # PIN_DURATION_HOURS: сколько часов держится закреп ULTRA SELLER
+    POST_LIFETIME_DAYS: int = 7
+    POST_EXPIRE_ACTION: str = "edit"
+    PIN_DURATION_HOURS: int = 6
+    POST_SWEEP_INTERVAL: int = 300  # секунды между проходами
+    POST_SWEEP_BATCH: int = 50  # постов за один батч
+
+    # Поиск дубликатов объявлений
+    # DEDUP_MIN_SIMILARITY: с какой доли общих слов (оценка Жаккара по MinHash) текст считается повтором
+    DEDUP_ENABLED: bool = True
+    DEDUP_MIN_SIMILARITY: float = 0.75
+
+    # Запись сообщений тикетов
+    # TICKET_MESSAGE_DURABILITY: "batched" - пачками раз в TICKET_MESSAGE_FLUSH_MS мс или по TICKET_MESSAGE_BATCH строк,
+    # "immediate" - каждое сообщение коммитится сразу
+    TICKET_MESSAGE_DURABILITY: str = "batched"
+    TICKET_MESSAGE_FLUSH_MS: int = 50
+    TICKET_MESSAGE_BATCH: int = 100
+
+    # Архив закрытых тикетов
+    # TICKET_ARCHIVE_DAYS: через сколько дней после закрытия тикет уходит в архивный файл (0 = не архивировать)
+    # TICKET_ARCHIVE_DIR: каталог файлов архива tickets-YYYY-MM.jsonl.gz
+    TICKET_ARCHIVE_DAYS: int = 30
+    TICKET_ARCHIVE_DIR: str = "archive"
+    TICKET_ARCHIVE_INTERVAL: int = 3600  # секунды между проходами
+
+    # Уведомления админам
+    # ADMIN_NOTIFY_CONCURRENCY: сколько сообщений отправляется одновременно, ADMIN_NOTIFY_RATE - не больше N в секунду
+    # ADMIN_NOTIFY_SUPPRESS_SECONDS: на сколько исключать из рассылки админа, заблокировавшего бота
+    # ADMIN_DIGEST_INTERVAL: раз в сколько секунд отправлять сводку тикетов низкого приоритета (0 = сразу)
+    ADMIN_NOTIFY_CONCURRENCY: int = 8
+    ADMIN_NOTIFY_RATE: float = 25
+    ADMIN_NOTIFY_SUPPRESS_SECONDS: int = 3600
+    ADMIN_DIGEST_INTERVAL: int = 600
+
+    # Профилирование обработчиков
+    # HANDLER_STATS_INTERVAL: раз в сколько секунд писать в лог задержки обработчиков (0 = только при остановке)
+    # UPDATE_RECORD_FILE: файл, куда записывать сырые апдейты для benchmarks/bench_dispatch.py (пусто = не писать)
+    # SLOW_QUERY_MS: SQL-запросы дольше стольких миллисекунд пишутся в лог с планом (0 = не писать)
+    # SLOW_QUERY_LOG_PARAMS: писать значения параметров медленных запросов (тексты тикетов, имена) - только для отладки
+    HANDLER_STATS_INTERVAL: int = 3600
+    UPDATE_RECORD_FILE: Optional[str] = None
+    SLOW_QUERY_MS: float = 100
+    SLOW_QUERY_LOG_PARAMS: bool = False
+
+    # Метрики Prometheus (metrics.py): METRICS_PORT = 0 - HTTP-сервер /metrics не запускается
+    METRICS_HOST: str = "127.0.0.1"
+    METRICS_PORT: int = 0
+
+    # Откуда прочитаны настройки и что в них не так (см. validate)
+    env_file: Optional[str] = None
+    problems: Tuple[str, ...] = field(default=(), repr=False)
+
+    def validate(self) -> List[str]:
+        """Ошибки, с которыми бот не запустится (импорт модулей они не блокируют)"""
+        errors = list(self.problems)
+        if not self.BOT_TOKEN:
+            errors.insert(0, "BOT_TOKEN не найден в переменных окружения")
+        return errors
+
+    def summary(self) -> List[str]:
+        """Строки для лога запуска"""
+        lines = [f"✅ Загружен .env файл из {self.env_file}" if self.env_file
+                 else f"⚠️  .env файл не найден по пути {ENV_FILE}, используются переменные окружения"]
+        if self.ADMIN_IDS:
+            lines.append(f"✅ Загружено админов: {len(self.ADMIN_IDS)} ({', '.join(map(str, self.ADMIN_IDS))})")
+        else:
+            lines.append("⚠️  ADMIN_IDS не указан в переменных окружения!")
+        if self.TELEGRAM_API_URL:
+            lines.append(f"⚠️  Bot API: {self.TELEGRAM_API_URL} вместо api.telegram.org")
+        return lines
+
+
+def _read_env(env_file: Path) -> dict:
+    """
+    Значения из .env. Строки без "=" сразу после ADMIN_IDS - продолжение списка админов,
+    записанного в несколько строк: python-dotenv отдает их ключами без значения.
+    """
+    values = dotenv_values(env_file, encoding="utf-8")
+    admin_lines: List[str] = []
+    continuation = False
+    for key, value in values.items():
+        if key == "ADMIN_IDS":
+            admin_lines.append(value or "")
+            continuation = True
+        elif continuation and value is None and key.strip().isdigit():
+            admin_lines.append(key)
+        else:
+            continuation = False
+    env = {key: value for key, value in values.items() if value is not None}
+    if admin_lines:
+        env["ADMIN_IDS"] = ",".join(admin_lines)
+    return env
+
+
+def _parse_admin_ids(value: str, problems: List[str]) -> Tuple[int, ...]:
+    value = (value or "").strip().strip("'\"")
+    admin_ids = []
+    for item in _ADMIN_ID_SEPARATORS.split(value):
+        if not item:
+            continue
+        if item.isdigit():
+            if int(item) not in admin_ids:
+                admin_ids.append(int(item))
+        else:
+            problems.append(f"ADMIN_IDS: '{item}' не является числом")
+    return tuple(admin_ids)
+
+
+def load_settings(environ: Mapping[str, str] = None, env_file: Optional[Path] = ENV_FILE) -> Settings:
+    """Разбирает окружение (и .env, если есть) в Settings; ошибки значений копятся в problems"""
+    env = dict(os.environ if environ is None else environ)
+    env_file_loaded = None
+    if env_file is not None and not env_file.exists():
+        # Для обратной совместимости - .env в текущей директории
+        env_file = Path.cwd() / '.env'
+    if env_file is not None and env_file.exists():
+        env.update(_read_env(env_file))
+        env_file_loaded = str(env_file)
+
+    problems: List[str] = []
+    defaults = Settings()
+
+    def number(name: str, cast=int):
+        raw = env.get(name)
+        if raw is None or raw.strip() == "":
+            return getattr(defaults, name)
+        try:
+            return cast(raw.strip())
+        except ValueError:
+            problems.append(f"{name}: ожидается число, получено '{raw}'")
+            return getattr(defaults, name)
+
+    def choice(name: str, allowed: Tuple[str, ...]):
+        value = (env.get(name) or "").strip().lower()
+        if not value:
+            return getattr(defaults, name)
+        if value not in allowed:
+            problems.append(f"{name}: допустимо {'/'.join(allowed)}, получено '{value}'")
+            return getattr(defaults, name)
+        return value
+
+    return Settings(
+        BOT_TOKEN=(env.get("BOT_TOKEN") or "").strip() or None,
+        ADMIN_IDS=_parse_admin_ids(env.get("ADMIN_IDS", ""), problems),
+        CHANNEL_ID=env.get("CHANNEL_ID") or None,
+        TELEGRAM_API_URL=(env.get("TELEGRAM_API_URL") or "").strip().rstrip("/") or None,
+        PRIVILEGE_REFRESH_SECONDS=number("PRIVILEGE_REFRESH_SECONDS"),
+        AUTO_DELETE_DELAY=number("AUTO_DELETE_DELAY"),
+        POST_LIFETIME_DAYS=number("POST_LIFETIME_DAYS"),
+        POST_EXPIRE_ACTION=choice("POST_EXPIRE_ACTION", ("edit", "delete")),
+        PIN_DURATION_HOURS=number("PIN_DURATION_HOURS"),
+        POST_SWEEP_INTERVAL=number("POST_SWEEP_INTERVAL"),
+        POST_SWEEP_BATCH=number("POST_SWEEP_BATCH"),
+        DEDUP_ENABLED=env.get("DEDUP_ENABLED", "true").strip().lower() == "true",
+        DEDUP_MIN_SIMILARITY=number("DEDUP_MIN_SIMILARITY", float),
+        TICKET_MESSAGE_DURABILITY=choice("TICKET_MESSAGE_DURABILITY", ("batched", "immediate")),
+        TICKET_MESSAGE_FLUSH_MS=number("TICKET_MESSAGE_FLUSH_MS"),
+        TICKET_MESSAGE_BATCH=number("TICKET_MESSAGE_BATCH"),
+        TICKET_ARCHIVE_DAYS=number("TICKET_ARCHIVE_DAYS"),
+        TICKET_ARCHIVE_DIR=env.get("TICKET_ARCHIVE_DIR") or defaults.TICKET_ARCHIVE_DIR,
+        TICKET_ARCHIVE_INTERVAL=number("TICKET_ARCHIVE_INTERVAL"),
+        ADMIN_NOTIFY_CONCURRENCY=number("ADMIN_NOTIFY_CONCURRENCY"),
+        ADMIN_NOTIFY_RATE=number("ADMIN_NOTIFY_RATE", float),
+        ADMIN_NOTIFY_SUPPRESS_SECONDS=number("ADMIN_NOTIFY_SUPPRESS_SECONDS"),
+        ADMIN_DIGEST_INTERVAL=number("ADMIN_DIGEST_INTERVAL"),
+        HANDLER_STATS_INTERVAL=number("HANDLER_STATS_INTERVAL"),
+        UPDATE_RECORD_FILE=env.get("UPDATE_RECORD_FILE") or None,
+        SLOW_QUERY_MS=number("SLOW_QUERY_MS", float),
+        SLOW_QUERY_LOG_PARAMS=env.get("SLOW_QUERY_LOG_PARAMS", "false").strip().lower() == "true",
+        METRICS_HOST=(env.get("METRICS_HOST") or "").strip() or defaults.METRICS_HOST,
+        METRICS_PORT=number("METRICS_PORT"),
+        env_file=env_file_loaded,
+        problems=tuple(problems),
+    )
 
 
-config = Config()
+config = load_settings()
@@ -1,9 +1,13 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Float
+from sqlalchemy import (Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Float, Index, LargeBinary, MetaData,
+                        inspect, text)
+from sqlalchemy.schema import CreateTable
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, relationship
 import datetime
 
+from ticket_priority import MEDIUM, priority_from_theme
+
 Base = declarative_base()
 engine = create_async_engine("sqlite+aiosqlite:///baraholka.db")
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
@@ -66,14 +70,28 @@ class Post(Base):
     title = Column(String)
     price = Column(String)  # цена/торг
     description = Column(Text)
-    status = Column(String, default="active")
+    status = Column(String, default="active")  # active/sold/expired
     created_at = Column(DateTime, default=datetime.datetime.now)
+    channel_message_id = Column(Integer, nullable=True)  # ID сообщения в канале
+    pinned = Column(Boolean, default=False)  # Закреплено ли сообщение в канале
+    expires_at = Column(DateTime, nullable=True)  # Когда объявление станет неактуальным
+    bumped_at = Column(DateTime, nullable=True)  # Время последнего поднятия
+    photo_unique_id = Column(String, nullable=True)  # file_unique_id фото для поиска дубликатов
+    text_minhash = Column(LargeBinary, nullable=True)  # MinHash-сигнатура заголовка и описания
 
     # Связи
     user = relationship("User", back_populates="posts")
 
+    # Свипер и списки "Мои объявления" выбирают только активные посты
+    __table_args__ = (
+        Index("ix_posts_status_expires_at", "status", "expires_at"),
+        Index("ix_posts_user_status", "user_id", "status"),
+    )
+
     def __init__(self, user_id=None, photo_id=None, title=None, price=None,
-                 description=None, status="active", created_at=None):
+                 description=None, status="active", created_at=None,
+                 channel_message_id=None, pinned=False, expires_at=None, bumped_at=None,
+                 photo_unique_id=None, text_minhash=None):
         self.user_id = user_id
         self.photo_id = photo_id
         self.title = title
@@ -81,6 +99,12 @@ class Post(Base):
         self.description = description
         self.status = status
         self.created_at = created_at or datetime.datetime.now()
+        self.channel_message_id = channel_message_id
+        self.pinned = pinned
+        self.expires_at = expires_at
+        self.bumped_at = bumped_at
+        self.photo_unique_id = photo_unique_id
+        self.text_minhash = text_minhash
 
 
 class Ticket(Base):
@@ -91,18 +115,44 @@ class Ticket(Base):
     theme = Column(String)  # тема тикета согласно разделу 3 ТЗ
     status = Column(String, default="new")  # new/in_progress/closed
     admin_id = Column(Integer, nullable=True)
+    priority = Column(Integer, default=MEDIUM)  # 0 - высокий, 1 - средний, 2 - низкий (ticket_priority)
     created_at = Column(DateTime, default=datetime.datetime.now)
+    closed_at = Column(DateTime, nullable=True)  # с этого момента отсчитывается срок до архивации
+    # Отметки для SLA (см. ticket_sla): первое взятие в работу, первый ответ админа и первое
+    # закрытие после взятия (closed_at после повторного открытия и закрытия сдвигается,
+    # resolved_at - нет; тикет, закрытый без взятия в работу, resolved_at не получает)
+    taken_at = Column(DateTime, nullable=True)
+    first_reply_at = Column(DateTime, nullable=True)
+    resolved_at = Column(DateTime, nullable=True)
 
     # Связи
     user = relationship("User", back_populates="tickets")
     messages = relationship("TicketMessage", back_populates="ticket")
 
-    def __init__(self, user_id=None, theme=None, status="new", admin_id=None, created_at=None):
+    # Списки тикетов листаются keyset-пагинацией по (created_at, id),
+    # очередь "следующий тикет" берется по (status, priority, created_at).
+    # AUTOINCREMENT: id не выдаются повторно, даже если удалена или архивирована строка с
+    # наибольшим id - иначе номер архивного тикета достался бы новому (см. ticket_archive)
+    __table_args__ = (
+        Index("ix_tickets_status_created_at", "status", "created_at"),
+        Index("ix_tickets_user_created_at", "user_id", "created_at"),
+        Index("ix_tickets_status_priority_created_at", "status", "priority", "created_at"),
+        {"sqlite_autoincrement": True},
+    )
+
+    def __init__(self, user_id=None, theme=None, status="new", admin_id=None, priority=None, created_at=None,
+                 closed_at=None, taken_at=None, first_reply_at=None, resolved_at=None, id=None):
+        self.id = id
         self.user_id = user_id
         self.theme = theme
         self.status = status
         self.admin_id = admin_id
+        self.priority = priority if priority is not None else priority_from_theme(theme)
         self.created_at = created_at or datetime.datetime.now()
+        self.closed_at = closed_at
+        self.taken_at = taken_at
+        self.first_reply_at = first_reply_at
+        self.resolved_at = resolved_at
 
 
 class TicketMessage(Base):
@@ -118,6 +168,11 @@ class TicketMessage(Base):
     # Связи
     ticket = relationship("Ticket", back_populates="messages")
 
+    # История тикета листается от новых сообщений к старым по (created_at, id)
+    __table_args__ = (
+        Index("ix_ticket_messages_ticket_created_at", "ticket_id", "created_at"),
+    )
+
     def __init__(self, ticket_id=None, user_id=None, message_text=None,
                  is_admin=False, created_at=None):
         self.ticket_id = ticket_id
@@ -127,6 +182,262 @@ class TicketMessage(Base):
         self.created_at = created_at or datetime.datetime.now()
 
 
+class ArchivedTicket(Base):
+    """Оглавление архива: где лежит закрытый тикет, перенесенный из tickets (см. ticket_archive)"""
+    __tablename__ = "archived_tickets"
+
+    ticket_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, index=True)
+    theme = Column(String)
+    closed_at = Column(DateTime)
+    archive_month = Column(String)  # YYYY-MM - файл архива
+    messages_count = Column(Integer, default=0)
+
+    def __init__(self, ticket_id=None, user_id=None, theme=None, closed_at=None, archive_month=None,
+                 messages_count=0):
+        self.ticket_id = ticket_id
+        self.user_id = user_id
+        self.theme = theme
+        self.closed_at = closed_at
+        self.archive_month = archive_month
+        self.messages_count = messages_count
+
+
+class PrivilegeSetting(Base):
+    """Каталог привилегий: цена и кулдаун, редактируемые из админки (см. privilege_catalogue)"""
+    __tablename__ = "privileges"
+
+    key = Column(String, primary_key=True)  # user/vip/premium/god/ultra_seller
+    label = Column(String)
+    price = Column(Integer, default=0)
+    cooldown = Column(Integer, default=0)  # минуты между публикациями
+    position = Column(Integer, default=0)  # порядок в меню
+    version = Column(Integer, default=0)  # номер последнего изменения каталога
+
+    def __init__(self, key=None, label=None, price=0, cooldown=0, position=0, version=0):
+        self.key = key
+        self.label = label
+        self.price = price
+        self.cooldown = cooldown
+        self.position = position
+        self.version = version
+
+
+# Колонки, добавленные после первого релиза: create_all не меняет существующие таблицы,
+# поэтому на старых базах их нужно докинуть через ALTER TABLE
+MIGRATION_COLUMNS = {
+    "posts": {
+        "channel_message_id": "INTEGER",
+        "pinned": "BOOLEAN DEFAULT 0",
+        "expires_at": "DATETIME",
+        "bumped_at": "DATETIME",
+        "photo_unique_id": "VARCHAR",
+        "text_minhash": "BLOB",
+    },
+    "tickets": {
+        "priority": "INTEGER",
+        "closed_at": "DATETIME",
+        "taken_at": "DATETIME",
+        "first_reply_at": "DATETIME",
+        "resolved_at": "DATETIME",
+    },
+}
+
+
+# Полнотекстовый индекс по объявлениям (SQLite FTS5, external content).
+# Индексируются только активные посты: проданные и истекшие выпадают из индекса триггерами,
+# так что поиск не тратит время на неактуальные объявления.
+POSTS_FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+        title, description,
+        content='posts', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3 4'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_fts_ai AFTER INSERT ON posts
+    WHEN new.status = 'active' BEGIN
+        INSERT INTO posts_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_fts_ad AFTER DELETE ON posts
+    WHEN old.status = 'active' BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_fts_au AFTER UPDATE OF title, description, status ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, description)
+            SELECT 'delete', old.id, old.title, old.description WHERE old.status = 'active';
+        INSERT INTO posts_fts(rowid, title, description)
+            SELECT new.id, new.title, new.description WHERE new.status = 'active';
+    END
+    """,
+]
+
+
+def create_posts_fts(sync_conn):
+    """Создает FTS-индекс объявлений и при первом создании наполняет его активными постами"""
+    exists = sync_conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'posts_fts'")
+    ).first()
+    for ddl in POSTS_FTS_DDL:
+        sync_conn.execute(text(ddl))
+    if not exists:
+        sync_conn.execute(text(
+            "INSERT INTO posts_fts(rowid, title, description) "
+            "SELECT id, title, description FROM posts WHERE status = 'active'"
+        ))
+
+
+# Полнотекстовый индекс переписки по тикетам для поиска админами (см. ticket_search).
+# Темы и сообщения - отдельные external content-таблицы; триггеры обновляют индекс
+# при каждой вставке (в том числе пачкой из буфера сообщений) и при удалении/архивации.
+TICKETS_FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS ticket_messages_fts USING fts5(
+        message_text,
+        content='ticket_messages', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3 4'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ticket_messages_fts_ai AFTER INSERT ON ticket_messages BEGIN
+        INSERT INTO ticket_messages_fts(rowid, message_text) VALUES (new.id, new.message_text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ticket_messages_fts_ad AFTER DELETE ON ticket_messages BEGIN
+        INSERT INTO ticket_messages_fts(ticket_messages_fts, rowid, message_text)
+            VALUES ('delete', old.id, old.message_text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ticket_messages_fts_au AFTER UPDATE OF message_text ON ticket_messages BEGIN
+        INSERT INTO ticket_messages_fts(ticket_messages_fts, rowid, message_text)
+            VALUES ('delete', old.id, old.message_text);
+        INSERT INTO ticket_messages_fts(rowid, message_text) VALUES (new.id, new.message_text);
+    END
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts USING fts5(
+        theme,
+        content='tickets', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3 4'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tickets_fts_ai AFTER INSERT ON tickets BEGIN
+        INSERT INTO tickets_fts(rowid, theme) VALUES (new.id, new.theme);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tickets_fts_ad AFTER DELETE ON tickets BEGIN
+        INSERT INTO tickets_fts(tickets_fts, rowid, theme) VALUES ('delete', old.id, old.theme);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tickets_fts_au AFTER UPDATE OF theme ON tickets BEGIN
+        INSERT INTO tickets_fts(tickets_fts, rowid, theme) VALUES ('delete', old.id, old.theme);
+        INSERT INTO tickets_fts(rowid, theme) VALUES (new.id, new.theme);
+    END
+    """,
+]
+
+
+def create_tickets_fts(sync_conn):
+    """Создает FTS-индексы тикетов и при первом создании строит их по уже накопленной переписке"""
+    existing = {
+        row[0] for row in sync_conn.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'table' "
+            "AND name IN ('ticket_messages_fts', 'tickets_fts')"
+        ))
+    }
+    for ddl in TICKETS_FTS_DDL:
+        sync_conn.execute(text(ddl))
+    for name in ("ticket_messages_fts", "tickets_fts"):
+        if name not in existing:
+            sync_conn.execute(text(f"INSERT INTO {name}({name}) VALUES ('rebuild')"))
+
+
+def _backfill_ticket_priority(sync_conn):
+    """Проставляет приоритет тикетам, созданным до появления колонки priority"""
+    rows = sync_conn.execute(text("SELECT id, theme FROM tickets WHERE priority IS NULL")).all()
+    if rows:
+        sync_conn.execute(
+            text("UPDATE tickets SET priority = :priority WHERE id = :id"),
+            [{"id": ticket_id, "priority": priority_from_theme(theme)} for ticket_id, theme in rows]
+        )
+
+
+def _rebuild_tickets_autoincrement(sync_conn):
+    """
+    Пересоздает tickets, созданную без AUTOINCREMENT (ALTER TABLE его не добавляет).
+    id сохраняются, поэтому FTS-индекс тем и ссылки сообщений остаются верными; индексы
+    и триггеры удаляются вместе со старой таблицей и создаются заново дальше в init_db.
+    """
+    ddl = sync_conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'tickets'")).scalar()
+    if ddl is None or "AUTOINCREMENT" in ddl.upper():
+        return
+    # Во временных метаданных нужна и users - на нее ссылается внешний ключ user_id
+    metadata = MetaData()
+    User.__table__.to_metadata(metadata)
+    new_table = Ticket.__table__.to_metadata(metadata, name="tickets_new")
+    sync_conn.execute(CreateTable(new_table))
+    existing = {column["name"] for column in inspect(sync_conn).get_columns("tickets")}
+    columns = ", ".join(column.name for column in new_table.columns if column.name in existing)
+    sync_conn.execute(text(f"INSERT INTO tickets_new ({columns}) SELECT {columns} FROM tickets"))
+    sync_conn.execute(text("DROP TABLE tickets"))
+    sync_conn.execute(text("ALTER TABLE tickets_new RENAME TO tickets"))
+
+
+def _reserve_archived_ticket_ids(sync_conn):
+    """Счетчик id тикетов не ниже номеров из архива: восстановленный тикет не столкнется с новым"""
+    archived_max = sync_conn.execute(text("SELECT MAX(ticket_id) FROM archived_tickets")).scalar()
+    if archived_max is None:
+        return
+    updated = sync_conn.execute(
+        text("UPDATE sqlite_sequence SET seq = MAX(seq, :seq) WHERE name = 'tickets'"), {"seq": archived_max}
+    ).rowcount
+    if not updated:
+        sync_conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('tickets', :seq)"), {"seq": archived_max})
+
+
+def _apply_migrations(sync_conn):
+    """Добавляет недостающие колонки и индексы в уже существующие таблицы"""
+    inspector = inspect(sync_conn)
+    for table_name, columns in MIGRATION_COLUMNS.items():
+        existing = {column["name"] for column in inspector.get_columns(table_name)}
+        for column_name, ddl in columns.items():
+            if column_name not in existing:
+                sync_conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {ddl}"))
+
+    _backfill_ticket_priority(sync_conn)
+    _rebuild_tickets_autoincrement(sync_conn)
+    _reserve_archived_ticket_ids(sync_conn)
+    # Тикеты, закрытые до появления resolved_at: первое закрытие неизвестно, берется последнее
+    sync_conn.execute(text(
+        "UPDATE tickets SET resolved_at = closed_at "
+        "WHERE resolved_at IS NULL AND status = 'closed' AND closed_at >= taken_at"
+    ))
+    # resolved_at, поставленный закрытием до взятия в работу (прежняя версия ставила его и
+    # тикетам, которые закрыл сам пользователь): берется закрытие после взятия, если оно есть
+    sync_conn.execute(text(
+        "UPDATE tickets SET resolved_at = CASE "
+        "WHEN status = 'closed' AND closed_at >= taken_at THEN closed_at END "
+        "WHERE resolved_at IS NOT NULL AND (taken_at IS NULL OR resolved_at < taken_at)"
+    ))
+
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+
 async def init_db():
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_apply_migrations)
+        await conn.run_sync(create_posts_fts)
+        await conn.run_sync(create_tickets_fts)
\ No newline at end of file
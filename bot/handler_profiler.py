@@ -0,0 +1,212 @@
+"""
+Профилировщик обработчиков: сколько времени и SQL-запросов стоит каждый апдейт.
+
+Два middleware aiogram:
+    update_middleware  - outer-middleware апдейтов: полное время апдейта (фильтры всей цепочки
+                         роутеров, middleware и обработчик) и число SQL-запросов за апдейт;
+    handler_middleware - inner-middleware всех событий: время самого обработчика.
+
+По каждому обработчику ведется квантильный скетч задержки (QuantileSketch из ticket_sla)
+и счетчик запросов. Разница между временем апдейта и временем обработчика - цена
+маршрутизации (строка "dispatch:<тип>"), апдейты без обработчика - "unhandled:<тип>".
+Число и время SQL-запросов считает query_profiler: трейс апдейта лежит в его contextvar
+current_trace - у каждого апдейта свой контекст.
+
+Те же замеры уходят в метрики (metrics.py): baraholka_updates_total и baraholka_handler_seconds.
+
+Сводка (вместе со сводкой SQL) пишется в лог раз в HANDLER_STATS_INTERVAL секунд и при
+остановке бота.
+Если задан UPDATE_RECORD_FILE, сырые апдейты пишутся туда по одному JSON в строке -
+для benchmarks/bench_dispatch.py (в файл попадают тексты сообщений пользователей).
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, TextIO, Tuple
+
+from config import config
+from metrics import handler_seconds, updates_total
+from query_profiler import QueryTrace, current_trace, query_profiler
+from ticket_sla import QUANTILES, QuantileSketch
+
+# Задержки короче 10 мкс считаются нулевыми
+MIN_LATENCY_SECONDS = 1e-5
+
+
+class UpdateTrace(QueryTrace):
+    """Что известно о текущем апдейте: обработчик (он же label для SQL), его время, запросы"""
+    __slots__ = ("handler_seconds",)
+
+    def __init__(self):
+        super().__init__()
+        self.handler_seconds = 0.0
+
+    @property
+    def handler(self) -> Optional[str]:
+        return self.label
+
+
+class HandlerStats:
+    __slots__ = ("latency", "queries", "max_queries", "query_seconds", "histogram")
+
+    def __init__(self, name: str):
+        self.latency = QuantileSketch(min_value=MIN_LATENCY_SECONDS)
+        self.queries = 0
+        self.max_queries = 0
+        self.query_seconds = 0.0
+        # Набор меток метрики создается один раз на обработчик
+        self.histogram = handler_seconds.labels(name)
+
+    def add(self, seconds: float, queries: int, query_seconds: float = 0.0):
+        self.latency.add(seconds)
+        self.histogram.observe(seconds)
+        self.queries += queries
+        self.max_queries = max(self.max_queries, queries)
+        self.query_seconds += query_seconds
+
+
+def handler_name(data: dict) -> str:
+    """Имя обработчика: модуль и функция (для CallbackTable - функция из таблицы)"""
+    handler = data.get("callback_handler") or data.get("handler")
+    callback = getattr(handler, "callback", None)
+    if callback is None:
+        return "unknown"
+    module = getattr(callback, "__module__", "") or ""
+    if module.startswith("handlers."):
+        module = module[len("handlers."):]
+    return f"{module}.{getattr(callback, '__qualname__', repr(callback))}"
+
+
+class HandlerProfiler:
+    def __init__(self):
+        self._stats: Dict[str, HandlerStats] = {}
+        self._record_file: Optional[TextIO] = None
+        self._task: Optional[asyncio.Task] = None
+        # {(тип апдейта, обработан): набор меток updates_total} - создается при первом апдейте типа
+        self._update_counters: Dict[Tuple[str, bool], object] = {}
+
+    def _stats_for(self, name: str) -> HandlerStats:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = HandlerStats(name)
+        return stats
+
+    def install(self, dispatcher):
+        """Подключает middleware к диспетчеру и счетчик запросов к движку БД"""
+        dispatcher.update.outer_middleware(self.update_middleware)
+        for name, observer in dispatcher.observers.items():
+            if name not in ("update", "error"):
+                observer.middleware(self.handler_middleware)
+        query_profiler.install()
+        if config.UPDATE_RECORD_FILE and self._record_file is None:
+            self._record_file = open(config.UPDATE_RECORD_FILE, "a", encoding="utf-8")
+            logging.info(f"Апдейты записываются в {config.UPDATE_RECORD_FILE}")
+
+    async def update_middleware(self, handler, event, data):
+        if self._record_file is not None:
+            self._record_file.write(event.model_dump_json(exclude_none=True) + "\n")
+            self._record_file.flush()
+
+        trace = UpdateTrace()
+        token = current_trace.set(trace)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_trace.reset(token)
+            event_type = event.event_type
+            key = (event_type, trace.handler is not None)
+            counter = self._update_counters.get(key)
+            if counter is None:
+                counter = self._update_counters[key] = updates_total.labels(event_type, str(key[1]).lower())
+            counter.inc()
+            if trace.handler is None:
+                self._stats_for(f"unhandled:{event_type}").add(elapsed, trace.queries, trace.query_seconds)
+            else:
+                self._stats_for(f"dispatch:{event_type}").add(max(elapsed - trace.handler_seconds, 0.0), 0)
+                self._stats_for(f"update:{event_type}").add(elapsed, trace.queries, trace.query_seconds)
+
+    async def handler_middleware(self, handler, event, data):
+        trace = current_trace.get()
+        name = handler_name(data)
+        queries_before = query_seconds_before = 0
+        if trace is not None:
+            # Медленные запросы в логе подписываются обработчиком
+            trace.label = name
+            queries_before, query_seconds_before = trace.queries, trace.query_seconds
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            elapsed = time.perf_counter() - started
+            if trace is not None:
+                trace.handler_seconds += elapsed
+                self._stats_for(name).add(elapsed, trace.queries - queries_before,
+                                          trace.query_seconds - query_seconds_before)
+            else:
+                self._stats_for(name).add(elapsed, 0)
+
+    def summary(self) -> List[Tuple[str, int, List[Optional[float]], float, int, float]]:
+        """
+        [(имя, вызовов, [p50, p90, p99] в секундах, запросов в среднем, запросов максимум,
+        секунд в SQL в среднем)], сначала самые частые
+        """
+        rows = [
+            (name, stats.latency.count, [stats.latency.quantile(q) for q in QUANTILES],
+             stats.queries / stats.latency.count, stats.max_queries, stats.query_seconds / stats.latency.count)
+            for name, stats in self._stats.items()
+            if stats.latency.count
+        ]
+        rows.sort(key=lambda row: -row[1])
+        return rows
+
+    def reset(self):
+        self._stats.clear()
+        query_profiler.reset()
+
+    def report(self):
+        rows = self.summary()
+        if not rows:
+            return
+        width = max(len(row[0]) for row in rows)
+        logging.info("⏱ Обработчики:")
+        logging.info(f"⏱   {'':<{width}} {'вызовов':>8} {'p50, мс':>10} {'p90, мс':>10} {'p99, мс':>10}"
+                     f"  SQL ср/макс  SQL, мс")
+        for name, count, quantiles, avg_queries, max_queries, query_seconds in rows:
+            p50, p90, p99 = (value * 1e3 for value in quantiles)
+            logging.info(f"⏱   {name:<{width}} {count:8} {p50:10.2f} {p90:10.2f} {p99:10.2f}"
+                         f"  {avg_queries:5.1f}/{max_queries:<5} {query_seconds * 1e3:7.2f}")
+        query_profiler.report()
+
+    async def _report_loop(self):
+        while True:
+            await asyncio.sleep(config.HANDLER_STATS_INTERVAL)
+            try:
+                self.report()
+            except Exception as e:
+                logging.error(f"Ошибка отчета профилировщика обработчиков: {e}")
+
+    def start(self):
+        """Запускает периодическую сводку в лог (HANDLER_STATS_INTERVAL = 0 - только при остановке)"""
+        if config.HANDLER_STATS_INTERVAL <= 0:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._report_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.report()
+        if self._record_file is not None:
+            self._record_file.close()
+            self._record_file = None
+
+
+# Глобальный экземпляр
+handler_profiler = HandlerProfiler()
@@ -1,20 +1,47 @@
-from .main_handlers import router as main_router
-from .post_handlers import router as post_router
-from .ticket_handlers import router as ticket_router
-from .ban_handlers import router as ban_router  # ✅ ДОБАВИТЬ ИМПОРТ БАН-ХЭНДЛЕРОВ
-from .admin import routers as admin_routers
+"""
+Роутеры бота.
 
-# Объединяем все роутеры
+Модули обработчиков импортируются не при импорте пакета, а в load_routers() - bot.py
+вызывает его под профилировщиком запуска и видит цену каждого модуля отдельно.
+Старое имя handlers.all_routers работает и загружает роутеры при первом обращении.
+"""
+import importlib
+from typing import List
+
+# Модули с роутерами в порядке подключения
 # ВАЖНО: Порядок имеет значение!
-# 1. main_router - обрабатывает команды (/start, /myid и т.д.)
-# 2. post_router, ticket_router, admin_routers - обрабатывают специфичные callback
-# 3. ban_router - проверяет баны для всех остальных событий (должен быть последним)
-all_routers = [
-    main_router,      # Команды обрабатываются первыми
-    post_router,      # Обработка продажи
-    ticket_router,    # Обработка тикетов и помощи
-    *admin_routers,   # Админ-панель
-    ban_router,       # Проверка банов - ПОСЛЕДНИМ, чтобы не перехватывать обработанные callback
+# 1. main_handlers - обрабатывает команды (/start, /myid и т.д.)
+# 2. post, ticket, search, admin - обрабатывают специфичные callback
+# 3. ban_handlers - проверяет баны для всех остальных событий (должен быть последним)
+ROUTER_MODULES = [
+    "handlers.main_handlers",     # Команды обрабатываются первыми
+    "handlers.post_handlers",     # Обработка продажи
+    "handlers.ticket_handlers",   # Обработка тикетов и помощи
+    "handlers.search_handlers",   # Поиск объявлений (/search и inline)
+    "handlers.admin.main",        # Админ-панель
+    "handlers.admin.users",
+    "handlers.admin.tickets",
+    "handlers.admin.privileges",
+    "handlers.admin.settings",
+    "handlers.ban_handlers",      # Проверка банов - ПОСЛЕДНИМ, чтобы не перехватывать обработанные callback
 ]
 
-__all__ = ['all_routers']
\ No newline at end of file
+_routers: List = []
+
+
+def load_routers(profiler=None) -> List:
+    """Импортирует модули обработчиков (с замером, если передан профилировщик) и возвращает их роутеры"""
+    if not _routers:
+        for name in ROUTER_MODULES:
+            module = profiler.import_module(name) if profiler else importlib.import_module(name)
+            _routers.append(module.router)
+    return list(_routers)
+
+
+def __getattr__(name):
+    if name == "all_routers":
+        return load_routers()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ['all_routers', 'load_routers', 'ROUTER_MODULES']
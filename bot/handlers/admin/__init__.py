@@ -1,16 +1,22 @@
-from .main import router as admin_main_router
-from .users import router as admin_users_router
-from .tickets import router as admin_tickets_router
-from .privileges import router as admin_privileges_router
-from .settings import router as admin_settings_router
+"""
+Админ-роутеры. Модули подключаются через handlers.load_routers (см. handlers.ROUTER_MODULES);
+handlers.admin.routers оставлен для совместимости и импортирует их при первом обращении.
+"""
+import importlib
 
-# Объединяем все админ-роутеры
-routers = [
-    admin_main_router,
-    admin_users_router,
-    admin_tickets_router,
-    admin_privileges_router,
-    admin_settings_router
+ADMIN_ROUTER_MODULES = [
+    "handlers.admin.main",
+    "handlers.admin.users",
+    "handlers.admin.tickets",
+    "handlers.admin.privileges",
+    "handlers.admin.settings",
 ]
 
-__all__ = ['routers']
\ No newline at end of file
+
+def __getattr__(name):
+    if name == "routers":
+        return [importlib.import_module(module).router for module in ADMIN_ROUTER_MODULES]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ['routers']
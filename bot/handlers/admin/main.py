@@ -1,11 +1,13 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
+import html
 import logging
 
 from config import config
 from services import AdminService
 from keyboards import admin_menu
+from ticket_sla import ticket_sla, format_duration, METRICS, METRIC_TITLES
 
 router = Router()
 admin_service = AdminService()
@@ -43,11 +45,10 @@ async def admin_main_panel(callback: CallbackQuery):
         
         # Быстрая статистика
         stats = await admin_service.get_statistics()
-        new_tickets = await ticket_service.get_tickets_by_status("new")
-        in_progress_tickets = await ticket_service.get_tickets_by_status("in_progress")
-        
-        new_tickets_count = len(new_tickets) if new_tickets else 0
-        in_progress_count = len(in_progress_tickets) if in_progress_tickets else 0
+        ticket_summary = await ticket_service.get_ticket_summary()
+
+        new_tickets_count = ticket_summary['by_status']['new']
+        in_progress_count = ticket_summary['by_status']['in_progress']
         
         text = "⚙️ <b>Панель администратора</b>\n\n"
         text += "📊 <b>Краткая статистика:</b>\n"
@@ -94,8 +95,7 @@ async def admin_stats(callback: CallbackQuery):
                 privilege_stats[privilege] = result.scalar()
             
             # Статистика по тикетам
-            new_tickets = await ticket_service.get_tickets_by_status("new")
-            in_progress_tickets = await ticket_service.get_tickets_by_status("in_progress")
+            ticket_summary = await ticket_service.get_ticket_summary()
             
             # Статистика за последние 24 часа
             yesterday = datetime.now() - timedelta(days=1)
@@ -140,8 +140,8 @@ async def admin_stats(callback: CallbackQuery):
         text += "━━━━━━━━━━━━━━━━━━━━\n"
         text += "<b>🎫 Тикеты:</b>\n"
         text += f"Всего: <b>{stats['tickets_count']}</b>\n"
-        text += f"🆕 Новые: <b>{len(new_tickets) if new_tickets else 0}</b>\n"
-        text += f"🔄 В работе: <b>{len(in_progress_tickets) if in_progress_tickets else 0}</b>\n"
+        text += f"🆕 Новые: <b>{ticket_summary['by_status']['new']}</b>\n"
+        text += f"🔄 В работе: <b>{ticket_summary['by_status']['in_progress']}</b>\n"
         text += f"Новых за 24ч: <b>{new_tickets_24h.scalar()}</b>\n\n"
         
         text += "━━━━━━━━━━━━━━━━━━━━\n"
@@ -158,4 +158,44 @@ async def admin_stats(callback: CallbackQuery):
         await callback.message.edit_text(text, reply_markup=admin_menu(), parse_mode="HTML")
     except Exception as e:
         logging.error(f"Ошибка статистики: {e}", exc_info=True)
-        await callback.answer("❌ Ошибка загрузки статистики", show_alert=True)
\ No newline at end of file
+        await callback.answer("❌ Ошибка загрузки статистики", show_alert=True)
+
+
+# Сколько тем и админов показывать в каждой метрике SLA
+SLA_MAX_GROUPS = 5
+
+
+def format_sla_row(label: str, count: int, quantiles) -> str:
+    p50, p90, p99 = (format_duration(value) for value in quantiles)
+    return f"{label}: p50 <b>{p50}</b> · p90 {p90} · p99 {p99} <i>({count})</i>\n"
+
+
+@router.callback_query(F.data == "admin_sla")
+async def admin_sla(callback: CallbackQuery):
+    """Перцентили времени реакции поддержки: общие, по темам и по админам"""
+    try:
+        if not await admin_service.is_admin(callback.from_user.id):
+            await callback.answer("❌ Доступ запрещен")
+            return
+
+        text = "⏱ <b>SLA тикетов</b>\n\n"
+        for metric in METRICS:
+            text += "━━━━━━━━━━━━━━━━━━━━\n"
+            text += f"<b>{METRIC_TITLES[metric]}</b>\n"
+            overall = ticket_sla.summary(metric, "all")
+            if not overall:
+                text += "<i>Нет данных</i>\n\n"
+                continue
+            _, count, quantiles = overall[0]
+            text += format_sla_row("Все", count, quantiles)
+            for theme, count, quantiles in ticket_sla.summary(metric, "theme")[:SLA_MAX_GROUPS]:
+                text += format_sla_row(html.escape(str(theme), quote=False), count, quantiles)
+            for admin_id, count, quantiles in ticket_sla.summary(metric, "admin")[:SLA_MAX_GROUPS]:
+                text += format_sla_row(f"👤 {admin_id}", count, quantiles)
+            text += "\n"
+
+        await callback.answer()
+        await callback.message.edit_text(text.rstrip("\n"), reply_markup=admin_menu(), parse_mode="HTML")
+    except Exception as e:
+        logging.error(f"Ошибка SLA тикетов: {e}", exc_info=True)
+        await callback.answer("❌ Ошибка загрузки SLA", show_alert=True)
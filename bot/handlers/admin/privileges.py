@@ -4,12 +4,15 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 import logging
 
-from config import config
+from callbacks import (CallbackTable, EDIT_PRIVILEGE, SET_PRICE, SET_COOLDOWN, APPLY_PRICE, APPLY_COOLDOWN,
+                       CUSTOM_PRICE, CUSTOM_COOLDOWN)
+from privilege_catalogue import privilege_catalogue
 from services import AdminService
 from keyboards import (admin_menu, privileges_management_keyboard,
                        privilege_edit_keyboard, cooldown_keyboard, price_keyboard)
 
 router = Router()
+callbacks = CallbackTable(router)
 admin_service = AdminService()
 
 
@@ -37,21 +40,21 @@ async def admin_privileges(callback: CallbackQuery):
         await callback.answer("❌ Ошибка", show_alert=True)
 
 
-@router.callback_query(F.data.startswith("edit_privilege_"))
-async def edit_privilege(callback: CallbackQuery):
+@callbacks(EDIT_PRIVILEGE)
+async def edit_privilege(callback: CallbackQuery, callback_data):
     """Редактирование конкретной привилегии"""
     try:
         if not await admin_service.is_admin(callback.from_user.id):
             await callback.answer("❌ Доступ запрещен")
             return
 
-        privilege_type = callback.data.replace("edit_privilege_", "")
+        privilege_type = callback_data.privilege
 
-        if privilege_type not in config.PRIVILEGES:
+        if privilege_type not in privilege_catalogue.privileges:
             await callback.answer("❌ Привилегия не найдена")
             return
 
-        privilege_info = config.PRIVILEGES[privilege_type]
+        privilege_info = privilege_catalogue.privileges[privilege_type]
 
         text = f"<b>⚙️ Редактирование {privilege_info['label']}</b>\n\n"
         text += f"💰 Текущая цена: {privilege_info['price']} руб\n"
@@ -65,17 +68,17 @@ async def edit_privilege(callback: CallbackQuery):
         await callback.answer("❌ Ошибка", show_alert=True)
 
 
-@router.callback_query(F.data.startswith("set_price_"))
-async def set_price_menu(callback: CallbackQuery, state: FSMContext):
+@callbacks(SET_PRICE)
+async def set_price_menu(callback: CallbackQuery, state: FSMContext, callback_data):
     """Меню установки цены"""
     try:
         if not await admin_service.is_admin(callback.from_user.id):
             await callback.answer("❌ Доступ запрещен")
             return
 
-        privilege_type = callback.data.replace("set_price_", "")
+        privilege_type = callback_data.privilege
 
-        privilege_info = config.PRIVILEGES[privilege_type]
+        privilege_info = privilege_catalogue.privileges[privilege_type]
 
         text = f"<b>💰 Установка цены для {privilege_info['label']}</b>\n\n"
         text += f"Текущая цена: {privilege_info['price']} руб\n\n"
@@ -88,17 +91,17 @@ async def set_price_menu(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Ошибка", show_alert=True)
 
 
-@router.callback_query(F.data.startswith("set_cooldown_"))
-async def set_cooldown_menu(callback: CallbackQuery, state: FSMContext):
+@callbacks(SET_COOLDOWN)
+async def set_cooldown_menu(callback: CallbackQuery, state: FSMContext, callback_data):
     """Меню установки кулдауна"""
     try:
         if not await admin_service.is_admin(callback.from_user.id):
             await callback.answer("❌ Доступ запрещен")
             return
 
-        privilege_type = callback.data.replace("set_cooldown_", "")
+        privilege_type = callback_data.privilege
 
-        privilege_info = config.PRIVILEGES[privilege_type]
+        privilege_info = privilege_catalogue.privileges[privilege_type]
 
         text = f"<b>⏰ Установка кулдауна для {privilege_info['label']}</b>\n\n"
         text += f"Текущий кулдаун: {privilege_info['cooldown']} мин\n\n"
@@ -111,74 +114,74 @@ async def set_cooldown_menu(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Ошибка", show_alert=True)
 
 
-@router.callback_query(F.data.startswith("apply_price_"))
-async def apply_price(callback: CallbackQuery):
+@callbacks(APPLY_PRICE)
+async def apply_price(callback: CallbackQuery, callback_data):
     """Применение выбранной цены"""
     try:
         if not await admin_service.is_admin(callback.from_user.id):
             await callback.answer("❌ Доступ запрещен")
             return
 
-        data = callback.data.replace("apply_price_", "").split("_")
-        privilege_type = data[0]
-        price = int(data[1])
+        privilege_type = callback_data.privilege
+        price = callback_data.price
 
-        # ✅ ОБНОВЛЯЕМ ЦЕНУ В КОНФИГЕ
-        config.PRIVILEGES[privilege_type]["price"] = price
-
-        privilege_info = config.PRIVILEGES[privilege_type]
+        # Сохраняем в каталог привилегий (БД), снимок в памяти обновится сразу
+        privilege_info = await privilege_catalogue.update(privilege_type, price=price)
+        if not privilege_info:
+            await callback.answer("❌ Привилегия не найдена", show_alert=True)
+            return
 
         await callback.answer(f"✅ Цена установлена: {price} руб")
 
         # Возвращаемся к редактированию привилегии
-        await edit_privilege(callback)
+        await edit_privilege(callback, EDIT_PRIVILEGE.data(privilege_type))
 
     except Exception as e:
         logging.error(f"Ошибка применения цены: {e}")
         await callback.answer("❌ Ошибка", show_alert=True)
 
 
-@router.callback_query(F.data.startswith("apply_cooldown_"))
-async def apply_cooldown(callback: CallbackQuery):
+@callbacks(APPLY_COOLDOWN)
+async def apply_cooldown(callback: CallbackQuery, callback_data):
     """Применение выбранного кулдауна"""
     try:
         if not await admin_service.is_admin(callback.from_user.id):
             await callback.answer("❌ Доступ запрещен")
             return
 
-        data = callback.data.replace("apply_cooldown_", "").split("_")
-        privilege_type = data[0]
-        cooldown = int(data[1])
-
-        # ✅ ОБНОВЛЯЕМ КУЛДАУН В КОНФИГЕ
-        config.PRIVILEGES[privilege_type]["cooldown"] = cooldown
+        privilege_type = callback_data.privilege
+        cooldown = callback_data.cooldown
 
-        privilege_info = config.PRIVILEGES[privilege_type]
+        # Сохраняем в каталог привилегий (БД), снимок в памяти обновится сразу
+        privilege_info = await privilege_catalogue.update(privilege_type, cooldown=cooldown)
+        if not privilege_info:
+            await callback.answer("❌ Привилегия не найдена", show_alert=True)
+            return
 
         await callback.answer(f"✅ Кулдаун установлен: {cooldown} мин")
 
         # Возвращаемся к редактированию привилегии
-        await edit_privilege(callback)
+        await edit_privilege(callback, EDIT_PRIVILEGE.data(privilege_type))
 
     except Exception as e:
         logging.error(f"Ошибка применения кулдауна: {e}")
         await callback.answer("❌ Ошибка", show_alert=True)
 
 
-@router.callback_query(F.data.startswith("custom_price_"))
-async def custom_price_input(callback: CallbackQuery, state: FSMContext):
+@callbacks(CUSTOM_PRICE)
+async def custom_price_input(callback: CallbackQuery, state: FSMContext, callback_data):
     """Запрос кастомной цены"""
     try:
         if not await admin_service.is_admin(callback.from_user.id):
             await callback.answer("❌ Доступ запрещен")
             return
 
-        privilege_type = callback.data.replace("custom_price_", "")
+        privilege_type = callback_data.privilege
 
         await state.set_state(PrivilegeStates.waiting_custom_price)
         await state.update_data(privilege_type=privilege_type)
 
-        privilege_info = config.PRIVILEGES[privilege_type]
+        privilege_info = privilege_catalogue.privileges[privilege_type]
 
         text = f"<b>💰 Введите свою цену для {privilege_info['label']}</b>\n\n"
         text += f"Текущая цена: {privilege_info['price']} руб\n\n"
@@ -193,20 +196,20 @@ async def custom_price_input(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Ошибка", show_alert=True)
 
 
-@router.callback_query(F.data.startswith("custom_cooldown_"))
-async def custom_cooldown_input(callback: CallbackQuery, state: FSMContext):
+@callbacks(CUSTOM_COOLDOWN)
+async def custom_cooldown_input(callback: CallbackQuery, state: FSMContext, callback_data):
     """Запрос кастомного кулдауна"""
     try:
         if not await admin_service.is_admin(callback.from_user.id):
             await callback.answer("❌ Доступ запрещен")
             return
 
-        privilege_type = callback.data.replace("custom_cooldown_", "")
+        privilege_type = callback_data.privilege
 
         await state.set_state(PrivilegeStates.waiting_custom_cooldown)
         await state.update_data(privilege_type=privilege_type)
 
-        privilege_info = config.PRIVILEGES[privilege_type]
+        privilege_info = privilege_catalogue.privileges[privilege_type]
 
         text = f"<b>⏰ Введите свой кулдаун для {privilege_info['label']}</b>\n\n"
         text += f"Текущий кулдаун: {privilege_info['cooldown']} мин\n\n"
@@ -259,10 +262,12 @@ async def process_custom_price(message: Message, state: FSMContext):
             )
             return
 
-        # ✅ ОБНОВЛЯЕМ ЦЕНУ В КОНФИГЕ
-        config.PRIVILEGES[privilege_type]["price"] = price
-
-        privilege_info = config.PRIVILEGES[privilege_type]
+        # Сохраняем в каталог привилегий (БД), снимок в памяти обновится сразу
+        privilege_info = await privilege_catalogue.update(privilege_type, price=price)
+        if not privilege_info:
+            await message.answer("❌ Привилегия не найдена")
+            await state.clear()
+            return
 
         await message_cleaner.send_temp_message(
             message.bot,
@@ -320,10 +325,12 @@ async def process_custom_cooldown(message: Message, state: FSMContext):
             )
             return
 
-        # ✅ ОБНОВЛЯЕМ КУЛДАУН В КОНФИГЕ
-        config.PRIVILEGES[privilege_type]["cooldown"] = cooldown
-
-        privilege_info = config.PRIVILEGES[privilege_type]
+        # Сохраняем в каталог привилегий (БД), снимок в памяти обновится сразу
+        privilege_info = await privilege_catalogue.update(privilege_type, cooldown=cooldown)
+        if not privilege_info:
+            await message.answer("❌ Привилегия не найдена")
+            await state.clear()
+            return
 
         from message_cleaner import message_cleaner
         await message_cleaner.send_temp_message(
@@ -346,7 +353,7 @@ async def process_custom_cooldown(message: Message, state: FSMContext):
 
 async def edit_privilege_from_message(message: Message, privilege_type: str):
     """Вспомогательная функция для возврата к редактированию привилегии"""
-    privilege_info = config.PRIVILEGES[privilege_type]
+    privilege_info = privilege_catalogue.privileges[privilege_type]
 
     text = f"<b>⚙️ Редактирование {privilege_info['label']}</b>\n\n"
     text += f"💰 Текущая цена: {privilege_info['price']} руб\n"
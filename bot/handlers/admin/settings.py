@@ -3,6 +3,7 @@ from aiogram.types import Message, CallbackQuery
 import logging
 
 from config import config
+from privilege_catalogue import privilege_catalogue
 from services import AdminService
 from keyboards import admin_menu
 from aiogram.filters import Command
@@ -24,7 +25,7 @@ async def admin_settings(callback: CallbackQuery):
             f"📊 <b>Текущие настройки:</b>\n"
             f"• ID канала: {config.CHANNEL_ID or 'Не настроен'}\n"
             f"• Админы: {len(config.ADMIN_IDS)} пользователей\n"
-            f"• Привилегии: {len(config.PRIVILEGES)} уровней\n\n"
+            f"• Привилегии: {len(privilege_catalogue.privileges)} уровней\n\n"
             "⚙️ <b>Доступные функции:</b>\n"
             "• Настройка канала для публикаций\n"
             "• Управление списком админов\n"
@@ -1,63 +1,31 @@
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
-from aiogram.filters import Command
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
+import html
 import logging
 
 from config import config
-from services import AdminService, TicketService, UserService
+from callbacks import (CallbackTable, ADMIN_TICKETS_PAGE, ADMIN_VIEW_TICKET, ADMIN_TICKET_HISTORY, TICKET_SEARCH_NEXT,
+                       REOPEN_TICKET, ADMIN_TAKE_TICKET, ADMIN_CLOSE_TICKET, REPLY_TICKET, ADMIN_REPLY_CHAT,
+                       ADMIN_END_CHAT, ADMIN_CANCEL_CHAT)
+from services import AdminService, TicketService, UserService, encode_ticket_cursor
 from keyboards import (ticket_status_keyboard, admin_tickets_list_keyboard,
                        ticket_actions_keyboard, active_chat_keyboard, admin_chat_invitation_keyboard,
-                       main_menu, start_chat_keyboard, ticket_priority_keyboard)
+                       main_menu, start_chat_keyboard, ticket_priority_keyboard, ticket_search_keyboard)
 from states import AdminStates
+from ticket_priority import PRIORITY_TITLES, PRIORITY_VALUES, priority_name
+from chat_sessions import chat_sessions
+from ticket_history import render_history_page
+from ticket_archive import ticket_archive
+from ticket_search import ticket_search
 
 router = Router()
+callbacks = CallbackTable(router)
 admin_service = AdminService()
 ticket_service = TicketService()
 user_service = UserService()
 
-# ✅ СЛОВАРЬ ПРИОРИТЕТОВ ТИКЕТОВ
-TICKET_PRIORITIES = {
-    "ticket_ads": "high",  # 📢 Купить рекламу - ВЫСОКИЙ
-    "ticket_bot_help": "low",  # ❓ Вопросы о боте - НИЗКИЙ
-    "ticket_other": "medium",  # 📞 Другое - СРЕДНИЙ
-}
-
-
-# ✅ ФУНКЦИЯ ДЛЯ ОПРЕДЕЛЕНИЯ ПРИОРИТЕТА
-def get_ticket_priority(theme):
-    """Определяет приоритет тикета по теме"""
-    theme_lower = theme.lower()
-    if "покупка привилегии" in theme_lower or "реклам" in theme_lower or "купить" in theme_lower:
-        return "high"
-    elif "вопрос" in theme_lower or "бот" in theme_lower or "помощь" in theme_lower:
-        return "low"
-    else:
-        return "medium"
-
-
-# ✅ ФУНКЦИЯ ДЛЯ СОРТИРОВКИ ТИКЕТОВ ПО ПРИОРИТЕТУ
-async def get_tickets_by_priority(status="new"):
-    """Получает тикеты отсортированные по приоритету"""
-    tickets = await ticket_service.get_tickets_by_status(status)
-
-    # Сортируем по приоритету: high -> medium -> low
-    priority_order = {"high": 0, "medium": 1, "low": 2}
-    tickets_sorted = sorted(tickets, key=lambda x: priority_order.get(get_ticket_priority(x.theme), 3))
-
-    return tickets_sorted
-
-
-# ✅ ФУНКЦИЯ ДЛЯ ПОЛУЧЕНИЯ ИКОНКИ ПРИОРИТЕТА
-def get_priority_icon(priority):
-    """Возвращает иконку для приоритета"""
-    icons = {
-        "high": "🔴",
-        "medium": "🟡",
-        "low": "🟢"
-    }
-    return icons.get(priority, "⚪")
-
 
 # ✅ ФУНКЦИЯ ДЛЯ ФОРМАТИРОВАНИЯ ОТОБРАЖЕНИЯ ПОЛЬЗОВАТЕЛЯ
 def format_user_display(username: str, user_id: int) -> str:
@@ -76,11 +44,10 @@ async def admin_tickets(callback: CallbackQuery):
             return
 
         # Получаем статистику тикетов
-        new_tickets = await ticket_service.get_tickets_by_status("new")
-        in_progress_tickets = await ticket_service.get_tickets_by_status("in_progress")
-        
-        new_count = len(new_tickets) if new_tickets else 0
-        in_progress_count = len(in_progress_tickets) if in_progress_tickets else 0
+        ticket_summary = await ticket_service.get_ticket_summary()
+
+        new_count = ticket_summary['by_status']['new']
+        in_progress_count = ticket_summary['by_status']['in_progress']
 
         text = "🎫 <b>Управление тикетами</b>\n\n"
         text += f"🆕 <b>Новые тикеты:</b> {new_count}\n"
@@ -94,119 +61,329 @@ async def admin_tickets(callback: CallbackQuery):
         await callback.answer("❌ Ошибка загрузки тикетов", show_alert=True)
 
 
-@router.callback_query(F.data.startswith("tickets_"))
+# Списки тикетов: {ключ списка: (статус, приоритет или None, заголовок)}.
+# Ключ списка передается в callback_data листания
+TICKET_LISTS = {
+    "new": ("new", None, "🆕 Новые тикеты"),
+    "in_progress": ("in_progress", None, "🔄 Тикеты в работе"),
+    "high": ("new", PRIORITY_VALUES["high"], "🔴 Новые тикеты: высокий приоритет"),
+    "medium": ("new", PRIORITY_VALUES["medium"], "🟡 Новые тикеты: средний приоритет"),
+    "low": ("new", PRIORITY_VALUES["low"], "🟢 Новые тикеты: низкий приоритет"),
+}
+
+
+async def show_admin_tickets_page(callback: CallbackQuery, list_key: str, cursor: str = None, backward: bool = False):
+    """Страница списка тикетов list_key (см. TICKET_LISTS)"""
+    status, priority, title = TICKET_LISTS[list_key]
+    tickets, prev_cursor, next_cursor = await ticket_service.get_tickets_page(
+        status=status, priority=priority, cursor=cursor, backward=backward)
+    first_page = cursor is None
+    if not tickets and cursor:
+        # Тикеты на границе страницы успели закрыть - начинаем с первой страницы
+        tickets, prev_cursor, next_cursor = await ticket_service.get_tickets_page(status=status, priority=priority)
+        first_page = True
+
+    if not tickets:
+        text = f"🎫 <b>{title}</b>\n\n"
+        text += f"Нет тикетов в разделе '{title}'"
+        keyboard = ticket_status_keyboard() if priority is None else ticket_priority_keyboard()
+    else:
+        # COUNT по статусу - отдельный запрос; при листании число не пересчитываем
+        if first_page:
+            total = await ticket_service.get_tickets_count_by_status(status, priority)
+            text = f"🎫 <b>{title}</b> ({total}):\n\n"
+        else:
+            text = f"🎫 <b>{title}</b>:\n\n"
+        text += "🔴 <b>Высокий приоритет</b> - покупки, реклама\n"
+        text += "🟡 <b>Средний приоритет</b> - другие вопросы\n"
+        text += "🟢 <b>Низкий приоритет</b> - вопросы о боте\n\n"
+        text += "💡 Новые тикеты сверху"
+
+        keyboard = admin_tickets_list_keyboard(tickets, list_key, prev_cursor, next_cursor)
+
+    await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+
+
+@router.callback_query(F.data.in_({"tickets_new", "tickets_in_progress"}))
 async def admin_tickets_by_status(callback: CallbackQuery):
-    """Показывает тикеты по статусу с приоритетами"""
+    """Показывает первую страницу тикетов по статусу"""
     try:
         if not await admin_service.is_admin(callback.from_user.id):
             await callback.answer("❌ Доступ запрещен")
             return
 
-        status_map = {
-            "tickets_new": "new",
-            "tickets_in_progress": "in_progress"
-        }
+        await show_admin_tickets_page(callback, callback.data.replace("tickets_", "", 1))
+    except Exception as e:
+        logging.error(f"Ошибка загрузки тикетов по статусу: {e}")
+        await callback.answer("❌ Ошибка", show_alert=True)
+
 
-        status = status_map.get(callback.data)
-        if not status:
-            await callback.answer("❌ Неверный статус")
+@router.callback_query(F.data.in_({"priority_high", "priority_medium", "priority_low"}))
+async def admin_tickets_by_priority_list(callback: CallbackQuery):
+    """Показывает первую страницу новых тикетов выбранного приоритета"""
+    try:
+        if not await admin_service.is_admin(callback.from_user.id):
+            await callback.answer("❌ Доступ запрещен")
             return
 
-        # ✅ ПОЛУЧАЕМ ОТСОРТИРОВАННЫЕ ТИКЕТЫ
-        tickets = await get_tickets_by_priority(status)
-        status_text = {
-            "new": "🆕 Новые тикеты",
-            "in_progress": "🔄 Тикеты в работе"
-        }
-
-        if not tickets:
-            text = f"🎫 <b>{status_text[status]}</b>\n\n"
-            text += f"Нет тикетов со статусом '{status_text[status]}'"
-            keyboard = ticket_status_keyboard()
-        else:
-            text = f"🎫 <b>{status_text[status]}</b> ({len(tickets)}):\n\n"
-            text += "🔴 <b>Высокий приоритет</b> - покупки, реклама\n"
-            text += "🟡 <b>Средний приоритет</b> - другие вопросы\n"
-            text += "🟢 <b>Низкий приоритет</b> - вопросы о боте\n\n"
-            text += "💡 Тикеты отсортированы по приоритету"
+        await show_admin_tickets_page(callback, callback.data.replace("priority_", "", 1))
+    except Exception as e:
+        logging.error(f"Ошибка загрузки тикетов по приоритету: {e}")
+        await callback.answer("❌ Ошибка", show_alert=True)
 
-            keyboard = admin_tickets_list_keyboard(tickets)
 
-        await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+@callbacks(ADMIN_TICKETS_PAGE)
+async def admin_tickets_page(callback: CallbackQuery, callback_data):
+    """Листание списка тикетов"""
+    try:
+        if not await admin_service.is_admin(callback.from_user.id):
+            await callback.answer("❌ Доступ запрещен")
+            return
+
+        if callback_data.list_key not in TICKET_LISTS:
+            await callback.answer("❌ Неверный формат данных", show_alert=True)
+            return
+
+        await callback.answer()
+        await show_admin_tickets_page(callback, callback_data.list_key, callback_data.cursor,
+                                      backward=callback_data.backward)
     except Exception as e:
-        logging.error(f"Ошибка загрузки тикетов по статусу: {e}")
+        logging.error(f"Ошибка листания тикетов: {e}")
         await callback.answer("❌ Ошибка", show_alert=True)
 
 
-@router.callback_query(F.data.startswith("admin_view_ticket_"))
-async def admin_view_ticket(callback: CallbackQuery):
+@callbacks(ADMIN_VIEW_TICKET)
+async def admin_view_ticket(callback: CallbackQuery, callback_data):
     try:
         if not await admin_service.is_admin(callback.from_user.id):
             await callback.answer("❌ Доступ запрещен")
             return
 
-        # Безопасный парсинг ticket_id
-        parts = callback.data.split("_")
-        if len(parts) < 4:
-            await callback.answer("❌ Неверный формат данных", show_alert=True)
+        ticket = await ticket_service.get_ticket_by_id(callback_data.ticket_id)
+
+        if not ticket:
+            await callback.answer("❌ Тикет не найден", show_alert=True)
             return
-        ticket_id = int(parts[3])
-        ticket = await ticket_service.get_ticket_by_id(ticket_id)
+
+        await show_admin_ticket(callback, ticket)
+    except Exception as e:
+        logging.error(f"Ошибка админ просмотра тикета: {e}")
+        await callback.answer("❌ Ошибка", show_alert=True)
+
+
+# Подписи отправителей в истории тикета для админа: {is_admin: подпись}
+ADMIN_HISTORY_LABELS = {False: "👤 Пользователь", True: "🛠 Администратор"}
+
+
+async def show_admin_ticket(callback: CallbackQuery, ticket, cursor: str = None):
+    """Карточка тикета со страницей истории сообщений и действиями админа"""
+    messages, has_older = await ticket_service.get_ticket_messages_page(ticket.id, before=cursor)
+
+    # Безопасное получение username
+    user_profile = await user_service.get_user_profile(ticket.user_id)
+    username = user_profile.get('username', 'без username') if user_profile else "без username"
+
+    # ✅ ПРИОРИТЕТ ПОСЧИТАН ПРИ СОЗДАНИИ ТИКЕТА
+    priority = priority_name(ticket.priority)
+    priority_text = PRIORITY_TITLES.get(priority, "⚪ НЕОПРЕДЕЛЕН")
+
+    # Форматируем отображение пользователя
+    user_display = format_user_display(username, ticket.user_id)
+
+    header = f"🎫 <b>Тикет #{ticket.id}</b>\n\n"
+    header += f"📌 <b>Приоритет:</b> {priority_text}\n"
+    header += f"📝 <b>Тема:</b> {html.escape(ticket.theme or '', quote=False)}\n"
+    header += f"📊 <b>Статус:</b> {ticket.status}\n"
+    header += f"👤 <b>Пользователь:</b> {html.escape(user_display, quote=False)}\n"
+    if ticket.admin_id:
+        header += f"🛠 <b>Администратор:</b> ID: {ticket.admin_id}\n"
+    header += f"📅 <b>Создан:</b> {ticket.created_at.strftime('%d.%m.%Y %H:%M')}\n\n"
+
+    # Страница собирается в пределах лимита Telegram, длинные сообщения обрезаются
+    text, oldest_shown = render_history_page(header, messages, ADMIN_HISTORY_LABELS, has_older)
+    keyboard = ticket_actions_keyboard(
+        ticket.id, is_admin=True,
+        older_cursor=encode_ticket_cursor(oldest_shown) if oldest_shown else None,
+        newest=cursor is None,
+        closed=ticket.status == "closed"
+    )
+    await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+
+
+@callbacks(ADMIN_TICKET_HISTORY)
+async def admin_ticket_history_page(callback: CallbackQuery, callback_data):
+    """Более ранние сообщения тикета"""
+    try:
+        if not await admin_service.is_admin(callback.from_user.id):
+            await callback.answer("❌ Доступ запрещен")
+            return
+
+        ticket = await ticket_service.get_ticket_by_id(callback_data.ticket_id)
 
         if not ticket:
             await callback.answer("❌ Тикет не найден", show_alert=True)
             return
 
-        messages = await ticket_service.get_ticket_messages(ticket_id)
+        await callback.answer()
+        await show_admin_ticket(callback, ticket, cursor=callback_data.cursor)
+    except Exception as e:
+        logging.error(f"Ошибка листания истории тикета: {e}")
+        await callback.answer("❌ Ошибка", show_alert=True)
 
-        # Безопасное получение username
-        user_profile = await user_service.get_user_profile(ticket.user_id)
-        username = user_profile.get('username', 'без username') if user_profile else "без username"
-
-        # ✅ ОПРЕДЕЛЯЕМ ПРИОРИТЕТ ТИКЕТА
-        priority = get_ticket_priority(ticket.theme)
-        priority_icon = get_priority_icon(priority)
-        priority_text = {
-            "high": "🔴 ВЫСОКИЙ",
-            "medium": "🟡 СРЕДНИЙ",
-            "low": "🟢 НИЗКИЙ"
-        }.get(priority, "⚪ НЕОПРЕДЕЛЕН")
-
-        # Форматируем отображение пользователя
-        user_display = format_user_display(username, ticket.user_id)
-        
-        text = f"🎫 <b>Тикет #{ticket.id}</b>\n\n"
-        text += f"📌 <b>Приоритет:</b> {priority_icon} {priority_text}\n"
-        text += f"📝 <b>Тема:</b> {ticket.theme}\n"
-        text += f"📊 <b>Статус:</b> {ticket.status}\n"
-        text += f"👤 <b>Пользователь:</b> {user_display}\n"
-        if ticket.admin_id:
-            text += f"🛠 <b>Администратор:</b> ID: {ticket.admin_id}\n"
-        text += f"📅 <b>Создан:</b> {ticket.created_at.strftime('%d.%m.%Y %H:%M')}\n\n"
-        text += "💬 <b>История сообщений:</b>\n\n"
-
-        for msg in messages:
-            sender = "👤 Пользователь" if not msg.is_admin else "🛠 Администратор"
-            text += f"{sender} ({msg.created_at.strftime('%H:%M')}):\n{msg.message_text}\n\n"
-
-        # Безопасное обрезание текста
-        if len(text) > 4000:
-            text = text[:3997] + "..."
-
-        await callback.message.edit_text(text, reply_markup=ticket_actions_keyboard(ticket_id, is_admin=True), parse_mode="HTML")
+
+@router.message(Command("ticket"))
+async def find_ticket(message: Message):
+    """Поиск тикета по номеру, в том числе в архиве: /ticket 123"""
+    try:
+        if not await admin_service.is_admin(message.from_user.id):
+            await message.answer("❌ Доступ запрещен")
+            return
+
+        parts = message.text.split()
+        if len(parts) < 2 or not parts[1].lstrip("#").isdigit():
+            await message.answer("🔎 Используйте: /ticket [номер]\n\nПример: /ticket 123")
+            return
+        ticket_id = int(parts[1].lstrip("#"))
+
+        ticket = await ticket_service.get_ticket_by_id(ticket_id)
+        if ticket:
+            keyboard = InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="🎫 Открыть тикет", callback_data=ADMIN_VIEW_TICKET.pack(ticket_id))]
+            ])
+            await message.answer(f"🎫 Тикет #{ticket_id} ({ticket.status}): {html.escape(ticket.theme or '', quote=False)}",
+                                 reply_markup=keyboard, parse_mode="HTML")
+            return
+
+        archived = await ticket_archive.get_archived(ticket_id)
+        if not archived:
+            await message.answer(f"❌ Тикет #{ticket_id} не найден")
+            return
+
+        text = f"🗄 <b>Тикет #{ticket_id} в архиве</b>\n\n"
+        text += f"📝 <b>Тема:</b> {html.escape(archived.theme or '', quote=False)}\n"
+        text += f"👤 <b>Пользователь:</b> ID: {archived.user_id}\n"
+        text += f"📅 <b>Закрыт:</b> {archived.closed_at.strftime('%d.%m.%Y %H:%M')}\n"
+        text += f"💬 <b>Сообщений:</b> {archived.messages_count}"
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="♻️ Восстановить и открыть заново", callback_data=REOPEN_TICKET.pack(ticket_id))]
+        ])
+        await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
     except Exception as e:
-        logging.error(f"Ошибка админ просмотра тикета: {e}")
+        logging.error(f"Ошибка поиска тикета: {e}")
+        await message.answer("❌ Ошибка поиска тикета")
+
+
+async def send_ticket_search_page(message: Message, query: str, cursor: str = None, edit: bool = False):
+    hits, next_cursor = await ticket_search.search(query, cursor)
+
+    if not hits and next_cursor:
+        # Просмотрен лимит окон поиска без совпадений - искать можно дальше
+        text = (f"🔎 По запросу «{html.escape(query)}» среди тикетов от #{next_cursor} и новее "
+                f"ничего не найдено, поиск можно продолжить")
+        keyboard = ticket_search_keyboard(hits, next_cursor)
+    elif not hits:
+        text = f"🔎 В тикетах по запросу «{html.escape(query)}» ничего не найдено"
+        keyboard = None
+    else:
+        text = f"🔎 <b>Поиск по тикетам:</b> {html.escape(query)}\n\n"
+        for hit in hits:
+            text += f"🎫 <b>#{hit.id}</b> {hit.theme_html}\n"
+            if hit.snippet_html:
+                text += f"💬 {hit.snippet_html}"
+                if hit.matches > 1:
+                    text += f" <i>(совпадений: {hit.matches})</i>"
+                text += "\n"
+            text += "\n"
+        keyboard = ticket_search_keyboard(hits, next_cursor)
+
+    if edit:
+        await message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+    else:
+        await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
+
+
+@router.message(Command("tsearch"))
+async def cmd_ticket_search(message: Message, command: CommandObject, state: FSMContext):
+    """Поиск по теме и переписке тикетов: /tsearch запрос"""
+    try:
+        if not await admin_service.is_admin(message.from_user.id):
+            await message.answer("❌ Доступ запрещен")
+            return
+
+        query = (command.args or "").strip()
+        if not query:
+            await message.answer(
+                "🔎 <b>Поиск по тикетам</b>\n\n"
+                "Используйте: <code>/tsearch запрос</code>\n"
+                "Пример: <code>/tsearch возврат оплаты</code>\n\n"
+                "Находятся тикеты, где есть все слова запроса - в теме или в любых сообщениях.",
+                parse_mode="HTML"
+            )
+            return
+
+        # Запрос храним в FSM-данных: в callback_data помещается только курсор
+        await state.update_data(ticket_search_query=query)
+        await send_ticket_search_page(message, query)
+    except Exception as e:
+        logging.error(f"Ошибка поиска по тикетам: {e}")
+        await message.answer("❌ Ошибка поиска")
+
+
+@callbacks(TICKET_SEARCH_NEXT)
+async def ticket_search_next_page(callback: CallbackQuery, state: FSMContext, callback_data):
+    """Следующая страница поиска по тикетам"""
+    try:
+        if not await admin_service.is_admin(callback.from_user.id):
+            await callback.answer("❌ Доступ запрещен")
+            return
+
+        data = await state.get_data()
+        query = data.get('ticket_search_query')
+        if not query:
+            await callback.answer("❌ Поиск устарел, повторите /tsearch", show_alert=True)
+            return
+
+        await callback.answer()
+        await send_ticket_search_page(callback.message, query, callback_data.cursor, edit=True)
+    except Exception as e:
+        logging.error(f"Ошибка пагинации поиска по тикетам: {e}")
         await callback.answer("❌ Ошибка", show_alert=True)
 
 
-@router.callback_query(F.data.startswith("admin_take_"))
-async def admin_take_ticket(callback: CallbackQuery):
+@callbacks(REOPEN_TICKET)
+async def reopen_ticket(callback: CallbackQuery, callback_data):
+    """Повторное открытие закрытого тикета (при необходимости - восстановление из архива)"""
     try:
         if not await admin_service.is_admin(callback.from_user.id):
             await callback.answer("❌ Доступ запрещен")
             return
 
-        ticket_id = int(callback.data.split("_")[2])
+        ticket_id = callback_data.ticket_id
+        ticket = await ticket_service.get_ticket_by_id(ticket_id)
+        if ticket:
+            await ticket_service.update_ticket_status(ticket_id, "in_progress", callback.from_user.id)
+        else:
+            ticket = await ticket_archive.restore(ticket_id, callback.from_user.id)
+            if not ticket:
+                await callback.answer("❌ Тикет не найден", show_alert=True)
+                return
+
+        await callback.answer(f"♻️ Тикет #{ticket_id} снова в работе")
+        logging.info(f"Тикет открыт заново: #{ticket_id}, AdminID={callback.from_user.id}")
+        await show_admin_ticket(callback, await ticket_service.get_ticket_by_id(ticket_id))
+    except Exception as e:
+        logging.error(f"Ошибка повторного открытия тикета: {e}")
+        await callback.answer("❌ Ошибка", show_alert=True)
+
+
+@callbacks(ADMIN_TAKE_TICKET)
+async def admin_take_ticket(callback: CallbackQuery, callback_data):
+    try:
+        if not await admin_service.is_admin(callback.from_user.id):
+            await callback.answer("❌ Доступ запрещен")
+            return
+
+        ticket_id = callback_data.ticket_id
         ticket = await ticket_service.get_ticket_by_id(ticket_id)
         
         if not ticket:
@@ -220,19 +397,10 @@ async def admin_take_ticket(callback: CallbackQuery):
             await callback.answer("✅ Тикет взят в работу")
             logging.info(f"Тикет взят в работу: #{ticket_id}, AdminID={callback.from_user.id}")
 
-            # Уведомляем пользователя
-            try:
-                await callback.bot.send_message(
-                    ticket.user_id,
-                    f"🎫 Ваш тикет #{ticket_id} взят в работу администратором.\n"
-                    f"Тема: {ticket.theme}\n\n"
-                    f"Администратор скоро свяжется с вами."
-                )
-            except Exception as e:
-                logging.error(f"Не удалось уведомить пользователя {ticket.user_id}: {e}")
+            await notify_ticket_taken(callback.bot, ticket)
 
             # Обновляем сообщение с тикетом
-            await admin_view_ticket(callback)
+            await show_admin_ticket(callback, await ticket_service.get_ticket_by_id(ticket_id))
         else:
             await callback.answer("❌ Ошибка", show_alert=True)
     except Exception as e:
@@ -240,29 +408,65 @@ async def admin_take_ticket(callback: CallbackQuery):
         await callback.answer("❌ Ошибка", show_alert=True)
 
 
-@router.callback_query(F.data.startswith("admin_close_"))
-async def admin_close_ticket(callback: CallbackQuery):
+@router.callback_query(F.data == "admin_next_ticket")
+async def admin_next_ticket(callback: CallbackQuery):
+    """Берет в работу следующий тикет из очереди: самый важный, затем самый старый"""
     try:
         if not await admin_service.is_admin(callback.from_user.id):
             await callback.answer("❌ Доступ запрещен")
             return
 
-        ticket_id = int(callback.data.split("_")[2])
+        ticket = await ticket_service.take_next_ticket(callback.from_user.id)
+        if not ticket:
+            await callback.answer("✅ Новых тикетов нет", show_alert=True)
+            return
+
+        await callback.answer(f"✅ Тикет #{ticket.id} взят в работу")
+        logging.info(f"Тикет взят в работу из очереди: #{ticket.id}, AdminID={callback.from_user.id}")
+
+        await notify_ticket_taken(callback.bot, ticket)
+        await show_admin_ticket(callback, ticket)
+    except Exception as e:
+        logging.error(f"Ошибка взятия следующего тикета: {e}")
+        await callback.answer("❌ Ошибка", show_alert=True)
+
+
+async def notify_ticket_taken(bot, ticket):
+    """Уведомляет пользователя, что его тикет взят в работу"""
+    try:
+        await bot.send_message(
+            ticket.user_id,
+            f"🎫 Ваш тикет #{ticket.id} взят в работу администратором.\n"
+            f"Тема: {ticket.theme}\n\n"
+            f"Администратор скоро свяжется с вами."
+        )
+    except Exception as e:
+        logging.error(f"Не удалось уведомить пользователя {ticket.user_id}: {e}")
+
+
+@callbacks(ADMIN_CLOSE_TICKET)
+async def admin_close_ticket(callback: CallbackQuery, callback_data):
+    try:
+        if not await admin_service.is_admin(callback.from_user.id):
+            await callback.answer("❌ Доступ запрещен")
+            return
+
+        ticket_id = callback_data.ticket_id
         ticket = await ticket_service.get_ticket_by_id(ticket_id)
 
         if not ticket:
             await callback.answer("❌ Тикет не найден", show_alert=True)
             return
 
-        # УДАЛЕНИЕ тикета вместо закрытия
-        success = await ticket_service.delete_ticket(ticket_id)
+        # Закрытый тикет остается в истории и со временем уходит в архив (ticket_archive)
+        success = await ticket_service.update_ticket_status(ticket_id, "closed")
 
         if success:
-            # Уведомляем пользователя об удалении тикета
+            # Уведомляем пользователя о закрытии тикета
             try:
                 await callback.bot.send_message(
                     ticket.user_id,
-                    f"🎫 Ваш тикет #{ticket_id} был завершен и удален.\n"
+                    f"🎫 Ваш тикет #{ticket_id} был завершен.\n"
                     f"Тема: {ticket.theme}\n\n"
                     f"Если у вас остались вопросы, создайте новый тикет.",
                     reply_markup=main_menu(ticket.user_id, config.ADMIN_IDS)
@@ -270,28 +474,28 @@ async def admin_close_ticket(callback: CallbackQuery):
             except Exception as e:
                 logging.error(f"Не удалось уведомить пользователя {ticket.user_id}: {e}")
 
-            await callback.answer("✅ Тикет удален")
-            logging.info(f"Тикет удален админом: #{ticket_id}, AdminID={callback.from_user.id}")
+            await callback.answer("✅ Тикет закрыт")
+            logging.info(f"Тикет закрыт админом: #{ticket_id}, AdminID={callback.from_user.id}")
 
             # Возвращаемся к списку тикетов
             await admin_tickets(callback)
         else:
-            await callback.answer("❌ Ошибка удаления тикета", show_alert=True)
+            await callback.answer("❌ Ошибка закрытия тикета", show_alert=True)
 
     except Exception as e:
-        logging.error(f"Ошибка удаления тикета админом: {e}")
+        logging.error(f"Ошибка закрытия тикета админом: {e}")
         await callback.answer("❌ Ошибка", show_alert=True)
 
 
-@router.callback_query(F.data.startswith("reply_ticket_"))
-async def start_ticket_reply(callback: CallbackQuery, state: FSMContext):
+@callbacks(REPLY_TICKET)
+async def start_ticket_reply(callback: CallbackQuery, state: FSMContext, callback_data):
     """Начало ответа на тикет (для админов)"""
     try:
         if not await admin_service.is_admin(callback.from_user.id):
             await callback.answer("❌ Доступ запрещен")
             return
 
-        ticket_id = int(callback.data.split("_")[2])
+        ticket_id = callback_data.ticket_id
         ticket = await ticket_service.get_ticket_by_id(ticket_id)
 
         if not ticket:
@@ -337,6 +541,7 @@ async def start_ticket_reply(callback: CallbackQuery, state: FSMContext):
             )
 
             # Переводим админа в состояние активного чата
+            chat_sessions.open(ticket_id, ticket.user_id, callback.from_user.id)
             await state.set_state(AdminStates.admin_chat_active)
 
         except Exception as e:
@@ -348,15 +553,15 @@ async def start_ticket_reply(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Ошибка", show_alert=True)
 
 
-@router.callback_query(F.data.startswith("admin_reply_chat_"))
-async def admin_start_chat(callback: CallbackQuery, state: FSMContext):
+@callbacks(ADMIN_REPLY_CHAT)
+async def admin_start_chat(callback: CallbackQuery, state: FSMContext, callback_data):
     """Админ начинает чат"""
     try:
         if not await admin_service.is_admin(callback.from_user.id):
             await callback.answer("❌ Доступ запрещен")
             return
 
-        ticket_id = int(callback.data.split("_")[3])
+        ticket_id = callback_data.ticket_id
         ticket = await ticket_service.get_ticket_by_id(ticket_id)
 
         if not ticket:
@@ -390,6 +595,7 @@ async def admin_start_chat(callback: CallbackQuery, state: FSMContext):
             parse_mode="HTML"
         )
 
+        chat_sessions.open(ticket_id, ticket.user_id, callback.from_user.id)
         await state.set_state(AdminStates.admin_chat_active)
     except Exception as e:
         logging.error(f"Ошибка начала чата админом: {e}")
@@ -400,49 +606,9 @@ async def admin_start_chat(callback: CallbackQuery, state: FSMContext):
 async def process_admin_chat_message(message: Message, state: FSMContext):
     """Обработка сообщений админа в активном чате"""
     try:
-        data = await state.get_data()
-        ticket_id = data.get('active_chat_ticket_id')
-        user_id = data.get('active_chat_user_id')
-
-        # Если данные отсутствуют в state, пытаемся восстановить из БД
-        if not ticket_id or not user_id:
-            # Ищем активный тикет, назначенный этому админу
-            in_progress_tickets = await ticket_service.get_tickets_by_status("in_progress")
-            admin_ticket = None
-            for ticket in in_progress_tickets:
-                if ticket.admin_id == message.from_user.id:
-                    admin_ticket = ticket
-                    break
-            
-            if admin_ticket:
-                ticket_id = admin_ticket.id
-                user_id = admin_ticket.user_id
-                await state.update_data(
-                    active_chat_ticket_id=ticket_id,
-                    active_chat_user_id=user_id,
-                    active_chat_admin_id=message.from_user.id
-                )
-                logging.info(f"Восстановлены данные чата из БД: TicketID={ticket_id}, UserID={user_id}")
-            else:
-                from message_cleaner import message_cleaner
-                from keyboards import admin_menu
-                await message_cleaner.send_temp_message(
-                    message.bot,
-                    message.from_user.id,
-                    "❌ Чат был закрыт. Вы вернулись в админ-панель.",
-                    delete_after=5
-                )
-                await message.bot.send_message(
-                    message.from_user.id,
-                    "⚙️ Админ-панель",
-                    reply_markup=admin_menu()
-                )
-                await state.clear()
-                return
-
-        # Проверяем, что тикет все еще активен
-        ticket = await ticket_service.get_ticket_by_id(ticket_id)
-        if not ticket or ticket.status != "in_progress" or ticket.admin_id != message.from_user.id:
+        # Активный чат админа берется из реестра, без запросов к БД
+        chat = chat_sessions.by_admin(message.from_user.id)
+        if not chat:
             from message_cleaner import message_cleaner
             from keyboards import admin_menu
             await message_cleaner.send_temp_message(
@@ -459,6 +625,9 @@ async def process_admin_chat_message(message: Message, state: FSMContext):
             await state.clear()
             return
 
+        ticket_id = chat.ticket_id
+        user_id = chat.user_id
+
         # Отправляем сообщение пользователю
         try:
             sent_message = await message.bot.send_message(
@@ -507,20 +676,23 @@ async def process_admin_chat_message(message: Message, state: FSMContext):
         )
 
 
-@router.callback_query(F.data.startswith("end_chat_"))
-async def admin_end_chat(callback: CallbackQuery, state: FSMContext):
+@callbacks(ADMIN_END_CHAT)
+async def admin_end_chat(callback: CallbackQuery, state: FSMContext, callback_data):
     """Завершение чата админом"""
     try:
         if not await admin_service.is_admin(callback.from_user.id):
             await callback.answer("❌ Доступ запрещен")
             return
 
-        ticket_id = int(callback.data.split("_")[2])
-        ticket = await ticket_service.get_ticket_by_id(ticket_id)
+        ticket_id = callback_data.ticket_id
+        chat = chat_sessions.close(ticket_id)
 
-        # Получаем user_id из тикета или state
+        # Получаем user_id из реестра чатов, state или тикета
         data = await state.get_data()
-        user_id = data.get('active_chat_user_id') or (ticket.user_id if ticket else None)
+        user_id = chat.user_id if chat else data.get('active_chat_user_id')
+        if not user_id:
+            ticket = await ticket_service.get_ticket_by_id(ticket_id)
+            user_id = ticket.user_id if ticket else None
 
         # Уведомляем пользователя о завершении чата и возвращаем в главное меню
         if user_id:
@@ -546,9 +718,10 @@ async def admin_end_chat(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Ошибка")
 
 
-@router.callback_query(F.data.startswith("admin_cancel_chat_"))
-async def admin_cancel_chat(callback: CallbackQuery, state: FSMContext):
+@callbacks(ADMIN_CANCEL_CHAT)
+async def admin_cancel_chat(callback: CallbackQuery, state: FSMContext, callback_data):
     """Отмена чата админом до начала"""
+    chat_sessions.close(callback_data.ticket_id)
     await state.clear()
     await callback.message.answer("❌ Чат отменен")
     await callback.answer()
@@ -563,16 +736,13 @@ async def tickets_by_priority(callback: CallbackQuery):
             return
 
         # ✅ ГРУППИРУЕМ ТИКЕТЫ ПО ПРИОРИТЕТАМ
-        new_tickets = await ticket_service.get_tickets_by_status("new")
-
-        high_priority = [t for t in new_tickets if get_ticket_priority(t.theme) == "high"]
-        medium_priority = [t for t in new_tickets if get_ticket_priority(t.theme) == "medium"]
-        low_priority = [t for t in new_tickets if get_ticket_priority(t.theme) == "low"]
+        ticket_summary = await ticket_service.get_ticket_summary()
+        new_by_priority = ticket_summary['by_priority']['new']
 
         text = "🎫 <b>Тикеты по приоритетам</b>\n\n"
-        text += f"🔴 <b>Высокий приоритет</b>: {len(high_priority)} тикетов\n"
-        text += f"🟡 <b>Средний приоритет</b>: {len(medium_priority)} тикетов\n"
-        text += f"🟢 <b>Низкий приоритет</b>: {len(low_priority)} тикетов\n\n"
+        text += f"🔴 <b>Высокий приоритет</b>: {new_by_priority['high']} тикетов\n"
+        text += f"🟡 <b>Средний приоритет</b>: {new_by_priority['medium']} тикетов\n"
+        text += f"🟢 <b>Низкий приоритет</b>: {new_by_priority['low']} тикетов\n\n"
         text += "💡 <i>Тикеты автоматически сортируются по важности</i>"
 
         await callback.message.edit_text(text, reply_markup=ticket_priority_keyboard(), parse_mode="HTML")
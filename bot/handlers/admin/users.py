@@ -5,7 +5,9 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 import logging
 
-from config import config
+from callbacks import (CallbackTable, USER_BAN, USER_UNBAN, USER_RESET, USER_RESET_COOLDOWN, USER_CHANGE_PRIVILEGE,
+                       USER_GRANT_PRIVILEGE, USER_SELECT)
+from privilege_catalogue import privilege_catalogue
 from services import AdminService, UserService
 from database import AsyncSessionLocal, User
 from keyboards import (admin_menu, user_management_keyboard, user_search_keyboard,
@@ -13,6 +15,7 @@ from keyboards import (admin_menu, user_management_keyboard, user_search_keyboar
 from sqlalchemy import select
 
 router = Router()
+callbacks = CallbackTable(router)
 admin_service = AdminService()
 user_service = UserService()
 
@@ -244,36 +247,55 @@ async def find_and_show_user(message: Message, user_id: int = None, user: User =
 
 
 # ✅ ПРОВЕРКА ВЫБРАННОГО ПОЛЬЗОВАТЕЛЯ
-async def check_selected_user(callback: CallbackQuery) -> tuple:
-    """Проверяет, выбран ли пользователь для управления"""
+async def check_selected_user(callback: CallbackQuery, user_id: int) -> tuple:
+    """
+    Проверяет, что пользователь из кнопки (callback_data.user_id) существует.
+    Кнопка сама несет id, поэтому старое сообщение управляет своим пользователем,
+    а не последним найденным; он же становится выбранным.
+    """
     admin_id = callback.from_user.id
-    if admin_id not in selected_users:
-        await callback.answer("❌ Сначала выберите пользователя через поиск", show_alert=True)
-        return None, None
-
-    user_id = selected_users[admin_id]
-
-    # Проверяем, что пользователь все еще существует
     async with AsyncSessionLocal() as session:
         user = await session.get(User, user_id)
-        if not user:
+    if not user:
+        if selected_users.get(admin_id) == user_id:
             del selected_users[admin_id]
-            await callback.answer("❌ Пользователь не найден. Выберите заново.", show_alert=True)
-            return None, None
+        await callback.answer("❌ Пользователь не найден. Выберите заново.", show_alert=True)
+        return None, None
 
+    selected_users[admin_id] = user_id
     return user_id, user
 
 
+@callbacks(USER_SELECT)
+async def select_user(callback: CallbackQuery, callback_data):
+    """Выбор пользователя из результатов поиска"""
+    try:
+        if not await admin_service.is_admin(callback.from_user.id):
+            await callback.answer("❌ Доступ запрещен")
+            return
+
+        user_id, user = await check_selected_user(callback, callback_data.user_id)
+        if not user_id:
+            return
+
+        await update_user_info(callback, user_id)
+        await callback.answer()
+
+    except Exception as e:
+        logging.error(f"Ошибка выбора пользователя: {e}")
+        await callback.answer("❌ Ошибка", show_alert=True)
+
+
 # ✅ БЛОКИРОВКА/РАЗБЛОКИРОВКА
-@router.callback_query(F.data.startswith("ban_"))
-async def ban_user(callback: CallbackQuery):
+@callbacks(USER_BAN)
+async def ban_user(callback: CallbackQuery, callback_data):
     """Блокировка пользователя"""
     try:
         if not await admin_service.is_admin(callback.from_user.id):
             await callback.answer("❌ Доступ запрещен")
             return
 
-        user_id, user = await check_selected_user(callback)
+        user_id, user = await check_selected_user(callback, callback_data.user_id)
         if not user_id:
             return
 
@@ -292,15 +314,15 @@ async def ban_user(callback: CallbackQuery):
         await callback.answer("❌ Ошибка блокировки", show_alert=True)
 
 
-@router.callback_query(F.data.startswith("unban_"))
-async def unban_user(callback: CallbackQuery):
+@callbacks(USER_UNBAN)
+async def unban_user(callback: CallbackQuery, callback_data):
     """Разблокировка пользователя"""
     try:
         if not await admin_service.is_admin(callback.from_user.id):
             await callback.answer("❌ Доступ запрещен")
             return
 
-        user_id, user = await check_selected_user(callback)
+        user_id, user = await check_selected_user(callback, callback_data.user_id)
         if not user_id:
             return
 
@@ -320,15 +342,15 @@ async def unban_user(callback: CallbackQuery):
 
 
 # ✅ ОБНУЛЕНИЕ АККАУНТА
-@router.callback_query(F.data.startswith("reset_"))
-async def reset_user_account(callback: CallbackQuery):
+@callbacks(USER_RESET)
+async def reset_user_account(callback: CallbackQuery, callback_data):
     """Обнуление аккаунта пользователя"""
     try:
         if not await admin_service.is_admin(callback.from_user.id):
             await callback.answer("❌ Доступ запрещен")
             return
 
-        user_id, user = await check_selected_user(callback)
+        user_id, user = await check_selected_user(callback, callback_data.user_id)
         if not user_id:
             return
 
@@ -353,15 +375,15 @@ async def reset_user_account(callback: CallbackQuery):
 
 
 # ✅ СБРОС КУЛДАУНА
-@router.callback_query(F.data.startswith("reset_cd_"))
-async def reset_user_cooldown(callback: CallbackQuery):
+@callbacks(USER_RESET_COOLDOWN)
+async def reset_user_cooldown(callback: CallbackQuery, callback_data):
     """Сброс кулдауна пользователя"""
     try:
         if not await admin_service.is_admin(callback.from_user.id):
             await callback.answer("❌ Доступ запрещен")
             return
 
-        user_id, user = await check_selected_user(callback)
+        user_id, user = await check_selected_user(callback, callback_data.user_id)
         if not user_id:
             return
 
@@ -388,15 +410,15 @@ async def reset_user_cooldown(callback: CallbackQuery):
 
 
 # ✅ ВЫДАЧА ПРИВИЛЕГИЙ
-@router.callback_query(F.data.startswith("change_priv_"))
-async def change_privilege_menu(callback: CallbackQuery):
+@callbacks(USER_CHANGE_PRIVILEGE)
+async def change_privilege_menu(callback: CallbackQuery, callback_data):
     """Меню изменения привилегии"""
     try:
         if not await admin_service.is_admin(callback.from_user.id):
             await callback.answer("❌ Доступ запрещен")
             return
 
-        user_id, user = await check_selected_user(callback)
+        user_id, user = await check_selected_user(callback, callback_data.user_id)
         if not user_id:
             return
 
@@ -404,7 +426,7 @@ async def change_privilege_menu(callback: CallbackQuery):
         text += "Выберите новую привилегию:"
 
         await callback.message.edit_text(text,
-                                         reply_markup=privilege_selection_keyboard("grant", user_id),
+                                         reply_markup=privilege_selection_keyboard(user_id),
                                          parse_mode="HTML")
 
     except Exception as e:
@@ -412,22 +434,21 @@ async def change_privilege_menu(callback: CallbackQuery):
         await callback.answer("❌ Ошибка", show_alert=True)
 
 
-@router.callback_query(F.data.startswith("grant_"))
-async def grant_privilege(callback: CallbackQuery):
+@callbacks(USER_GRANT_PRIVILEGE)
+async def grant_privilege(callback: CallbackQuery, callback_data):
     """Выдача привилегии пользователю"""
     try:
         if not await admin_service.is_admin(callback.from_user.id):
             await callback.answer("❌ Доступ запрещен")
             return
 
-        user_id, user = await check_selected_user(callback)
+        user_id, user = await check_selected_user(callback, callback_data.user_id)
         if not user_id:
             return
 
-        data = callback.data.split("_")
-        privilege_type = data[1]
+        privilege_type = callback_data.privilege
 
-        if privilege_type not in config.PRIVILEGES:
+        if privilege_type not in privilege_catalogue.privileges:
             await callback.answer("❌ Неверный тип привилегии")
             return
 
@@ -438,7 +459,7 @@ async def grant_privilege(callback: CallbackQuery):
                 user.privilege = privilege_type
                 await session.commit()
 
-                privilege_info = config.PRIVILEGES[privilege_type]
+                privilege_info = privilege_catalogue.privileges[privilege_type]
                 await callback.answer(f"✅ Пользователю выдана привилегия: {privilege_info['label']}")
 
                 # Обновляем информацию о пользователе
@@ -38,3 +38,14 @@ async def check_ban_global(message: Message):
 # УБИРАЕМ глобальный обработчик callback_query, так как он перехватывает все callback
 # Вместо этого проверку бана для callback будем делать через middleware или в начале каждого обработчика
 # Для сообщений оставляем проверку, так как она не мешает командам
+
+
+@router.callback_query()
+async def stale_callback(callback: CallbackQuery):
+    """
+    Кнопка, которую не разобрал ни один роутер: старый формат callback_data или прежняя
+    версия схемы (см. callbacks.py). Роутер подключается последним, так что сюда попадают
+    только необработанные callback - без ответа у пользователя крутились бы «часики».
+    """
+    logging.info(f"Необработанный callback от {callback.from_user.id}: {callback.data!r}")
+    await callback.answer("⚠️ Кнопка устарела, откройте меню заново", show_alert=True)
@@ -6,12 +6,18 @@ import logging
 import time
 
 from config import config
+from callbacks import CallbackTable, POST_BUMP, POST_SOLD
 from services import UserService, PostService
-from keyboards import main_menu, cancel_keyboard, confirm_keyboard
+from keyboards import main_menu, cancel_keyboard, confirm_keyboard, my_posts_keyboard
 from states import SellItem
 from database import AsyncSessionLocal, User
+from post_lifecycle import post_lifecycle
+from post_templates import render_post_caption
+from post_dedup import post_dedup
+from admin_notifier import admin_notifier
 
 router = Router()
+callbacks = CallbackTable(router)
 user_service = UserService()
 post_service = PostService()
 
@@ -83,7 +89,9 @@ async def process_photos(message: Message, state: FSMContext):
         data = await state.get_data()
         form_message_ids = data.get('form_message_ids', [])
         form_message_ids.append(message.message_id)  # Добавляем сообщение с фото
-        await state.update_data(photo_ids=[photo_id], form_message_ids=form_message_ids)
+        # file_unique_id одинаков для одного файла у всех пользователей - по нему ищутся дубликаты
+        await state.update_data(photo_ids=[photo_id], photo_unique_id=photo.file_unique_id,
+                                form_message_ids=form_message_ids)
 
         # Отправляем сообщение с инструкцией и сохраняем его message_id
         from message_cleaner import message_cleaner
@@ -267,56 +275,8 @@ async def process_description(message: Message, state: FSMContext):
     
     user_profile = await user_service.get_user_profile(message.from_user.id)
 
-    # Безопасное получение username
-    username = user_profile.get('username', 'без username') if user_profile else 'без username'
-
-    # Определяем эмодзи для привилегии
-    privilege_emoji = {
-        "user": "👤",
-        "vip": "💎",
-        "premium": "⭐",
-        "god": "👑",
-        "ultra_seller": "🔥"
-    }
     user_privilege = user_profile.get('privilege', 'user') if user_profile else 'user'
-    privilege_emoji_icon = privilege_emoji.get(user_privilege, "⭐")
-    privilege_label = user_profile.get('privilege', 'USER').upper() if user_profile else 'USER'
-
-    # Форматируем цену для превью
-    price_display = data['price']
-    price_line = ""
-
-    # Если цена - "торг" или "бесплатно", показываем просто текст без "Цена:"
-    if price_display.lower() == "торг":
-        price_line = "🤝 <b>Торг</b>"
-    elif price_display.lower() == "бесплатно":
-        price_line = "🎁 <b>Бесплатно</b>"
-    elif price_display.isdigit():
-        # Если цена - цифры, показываем с "Цена:"
-        price_line = f"💰 <b>Цена:</b> <code>{price_display}</code> ₽"
-    else:
-        # На всякий случай, если что-то другое
-        price_line = f"💰 <b>Цена:</b> {price_display}"
-
-    preview_text = f"""
-━━━━━━━━━━━━━━━━━━━━
-<b>📦 {data['title']}</b>
-━━━━━━━━━━━━━━━━━━━━
-
-{price_line}
-
-━━━━━━━━━━━━━━━━━━━━
-<b>📝 Описание:</b>
-━━━━━━━━━━━━━━━━━━━━
-
-{data['description']}
-
-━━━━━━━━━━━━━━━━━━━━
-{privilege_emoji_icon} <b>Статус продавца:</b> {privilege_label}
-━━━━━━━━━━━━━━━━━━━━
-
-💬 <b>Написать продавцу:</b> Нажмите кнопку ниже ⬇️
-"""
+    preview_text = render_post_caption(data, user_privilege)
 
     # Показываем превью поста
     await message.answer_photo(
@@ -329,6 +289,21 @@ async def process_description(message: Message, state: FSMContext):
     await state.set_state(SellItem.confirm)
 
 
+async def notify_admins_about_duplicate(callback: CallbackQuery, post_id: int, duplicate):
+    """Сообщает админам о посте, похожем на чужое активное объявление"""
+    reason = "то же фото" if duplicate.reason == "photo" else f"похожий текст ({duplicate.similarity:.0%} общих слов)"
+    logging.warning(
+        f"Похожее объявление: PostID={post_id}, UserID={callback.from_user.id}, "
+        f"Оригинал={duplicate.post_id}, UserID оригинала={duplicate.user_id}, Причина={duplicate.reason}")
+    await admin_notifier.notify(
+        callback.bot,
+        f"⚠️ Похожее объявление #{post_id}\n"
+        f"Продавец: @{callback.from_user.username or 'без username'} (ID: {callback.from_user.id})\n"
+        f"Совпадает с #{duplicate.post_id} продавца ID: {duplicate.user_id}\n"
+        f"Причина: {reason}"
+    )
+
+
 @router.callback_query(F.data == "confirm")
 async def confirm_post(callback: CallbackQuery, state: FSMContext):
     """Обработчик подтверждения поста - работает всегда"""
@@ -340,6 +315,27 @@ async def confirm_post(callback: CallbackQuery, state: FSMContext):
             await state.clear()
             return
 
+        # Повтор своего активного объявления отклоняем (для этого есть поднятие),
+        # совпадение с чужим публикуем, но сообщаем админам
+        duplicate = None
+        if config.DEDUP_ENABLED and callback.from_user.id not in config.ADMIN_IDS:
+            duplicate = await post_dedup.check(callback.from_user.id, data)
+            if duplicate and duplicate.user_id == callback.from_user.id:
+                logging.info(
+                    f"Отклонен повтор объявления: UserID={callback.from_user.id}, "
+                    f"PostID={duplicate.post_id}, Причина={duplicate.reason}")
+                await callback.answer(
+                    "♻️ Такое объявление у вас уже опубликовано.\n"
+                    "Поднимите его в разделе «📦 Мои объявления».",
+                    show_alert=True
+                )
+                await state.clear()
+                try:
+                    await callback.message.edit_reply_markup(reply_markup=None)
+                except Exception:
+                    pass
+                return
+
         user_profile = await user_service.get_user_profile(callback.from_user.id)
 
         # Безопасное получение username
@@ -347,6 +343,7 @@ async def confirm_post(callback: CallbackQuery, state: FSMContext):
 
         post_data = {
             'photo_ids': data['photo_ids'],
+            'photo_unique_id': data.get('photo_unique_id'),
             'title': data['title'],
             'price': data['price'],
             'description': data['description'],
@@ -354,12 +351,18 @@ async def confirm_post(callback: CallbackQuery, state: FSMContext):
             'user_id': callback.from_user.id
         }
 
-        post_id = await post_service.publish_to_channel(
+        user_privilege = user_profile['privilege'] if user_profile else 'user'
+        channel_message_id = await post_service.publish_to_channel(post_data, user_privilege)
+
+        post = await post_service.create_post(
+            callback.from_user.id,
             post_data,
-            user_profile['privilege'] if user_profile else 'user'
+            channel_message_id=channel_message_id,
+            pinned=user_privilege == "ultra_seller"
         )
 
-        await post_service.create_post(callback.from_user.id, post_data)
+        if duplicate:
+            await notify_admins_about_duplicate(callback, post.id, duplicate)
 
         # Важное логирование
         logging.info(
@@ -408,4 +411,72 @@ async def cancel_handler(callback: CallbackQuery, state: FSMContext):
 
     except Exception as e:
         logging.error(f"Ошибка в обработчике отмены: {e}")
-        await callback.answer("❌ Ошибка отмены", show_alert=True)
\ No newline at end of file
+        await callback.answer("❌ Ошибка отмены", show_alert=True)
+
+@router.callback_query(F.data == "my_posts")
+async def show_my_posts(callback: CallbackQuery):
+    """Список активных объявлений продавца"""
+    try:
+        posts = await post_lifecycle.get_user_active_posts(callback.from_user.id)
+
+        if not posts:
+            await callback.message.edit_text(
+                "📭 У вас нет активных объявлений.",
+                reply_markup=main_menu(callback.from_user.id, config.ADMIN_IDS)
+            )
+            return
+
+        text = (
+            f"📦 <b>Ваши активные объявления</b> ({len(posts)})\n\n"
+            f"🔼 - поднять объявление (с учетом кулдауна)\n"
+            f"✅ - отметить как проданное\n\n"
+            f"<i>Объявления автоматически снимаются через {config.POST_LIFETIME_DAYS} дн.</i>"
+        )
+        await callback.message.edit_text(text, reply_markup=my_posts_keyboard(posts), parse_mode="HTML")
+    except Exception as e:
+        logging.error(f"Ошибка показа объявлений пользователя {callback.from_user.id}: {e}")
+        await callback.answer("❌ Ошибка загрузки объявлений", show_alert=True)
+
+
+@callbacks(POST_SOLD)
+async def mark_post_sold(callback: CallbackQuery, callback_data):
+    """Продавец отмечает объявление проданным"""
+    try:
+        post_id = callback_data.post_id
+        success = await post_lifecycle.mark_sold(callback.bot, post_id, callback.from_user.id)
+
+        if not success:
+            await callback.answer("❌ Объявление не найдено", show_alert=True)
+            return
+
+        await callback.answer("✅ Объявление отмечено как проданное")
+        await show_my_posts(callback)
+    except Exception as e:
+        logging.error(f"Ошибка отметки продажи: {e}")
+        await callback.answer("❌ Ошибка", show_alert=True)
+
+
+@callbacks(POST_BUMP)
+async def bump_post(callback: CallbackQuery, callback_data):
+    """Продавец поднимает объявление в канале"""
+    try:
+        if callback.from_user.id not in config.ADMIN_IDS:
+            if await user_service.is_user_banned(callback.from_user.id):
+                await callback.answer("🚫 Вы заблокированы и не можете использовать бота.", show_alert=True)
+                return
+
+        post_id = callback_data.post_id
+        success, cooldown = await post_lifecycle.bump_post(callback.bot, post_id, callback.from_user.id)
+
+        if cooldown > 0:
+            await callback.answer(f"⏰ Кулдаун: {cooldown} мин до следующего поднятия", show_alert=True)
+            return
+        if not success:
+            await callback.answer("❌ Объявление не найдено", show_alert=True)
+            return
+
+        await callback.answer("🔼 Объявление поднято")
+        await show_my_posts(callback)
+    except Exception as e:
+        logging.error(f"Ошибка поднятия объявления: {e}")
+        await callback.answer("❌ Ошибка поднятия объявления", show_alert=True)
@@ -0,0 +1,149 @@
+# handlers/search_handlers.py
+"""
+Поиск по активным объявлениям: команда /search и inline-режим (@бот запрос).
+"""
+from aiogram import Router
+from aiogram.types import Message, CallbackQuery, InlineQuery, InlineQueryResultCachedPhoto
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
+import html
+import logging
+
+from config import config
+from callbacks import CallbackTable, SEARCH_NEXT
+from keyboards import search_results_keyboard
+from post_search import post_search, normalize_query
+
+router = Router()
+callbacks = CallbackTable(router)
+
+# Подсказки Telegram, сколько секунд кэшировать inline-выдачу на своей стороне
+INLINE_CACHE_TIME = 300
+INLINE_LATEST_CACHE_TIME = 30
+INLINE_PAGE_SIZE = 20
+
+
+def channel_post_link(channel_message_id: int):
+    """Ссылка на пост в канале (для каналов вида -100XXXXXXXXXX)"""
+    channel_id = str(config.CHANNEL_ID or "")
+    if not channel_message_id or not channel_id.startswith("-100"):
+        return None
+    return f"https://t.me/c/{channel_id[4:]}/{channel_message_id}"
+
+
+def format_price(price: str) -> str:
+    return f"{price} ₽" if price and price.isdigit() else (price or "")
+
+
+def format_search_results(query: str, hits) -> str:
+    text = f"🔎 <b>Поиск:</b> {html.escape(query)}\n\n"
+    for hit in hits:
+        title = html.escape(hit.title or "")
+        link = channel_post_link(hit.channel_message_id)
+        if link:
+            title = f'<a href="{link}">{title}</a>'
+        text += f"📦 {title} — {html.escape(format_price(hit.price))}\n"
+    return text
+
+
+async def send_search_page(message: Message, query: str, cursor: str = None, edit: bool = False):
+    hits, next_cursor = await post_search.search(query, cursor)
+
+    if not hits:
+        text = f"🔎 По запросу «{html.escape(query)}» ничего не найдено"
+        keyboard = None
+    else:
+        text = format_search_results(query, hits)
+        keyboard = search_results_keyboard(next_cursor)
+
+    if edit:
+        await message.edit_text(text, reply_markup=keyboard, parse_mode="HTML", disable_web_page_preview=True)
+    else:
+        await message.answer(text, reply_markup=keyboard, parse_mode="HTML", disable_web_page_preview=True)
+
+
+@router.message(Command("search"))
+async def cmd_search(message: Message, command: CommandObject, state: FSMContext):
+    """Поиск объявлений: /search запрос"""
+    try:
+        query = (command.args or "").strip()
+        if not query:
+            await message.answer(
+                "🔎 <b>Поиск объявлений</b>\n\n"
+                "Используйте: <code>/search запрос</code>\n"
+                "Пример: <code>/search vaporesso xros</code>",
+                parse_mode="HTML"
+            )
+            return
+
+        # Запрос храним в FSM-данных: в callback_data помещается только курсор
+        await state.update_data(search_query=query)
+        await send_search_page(message, query)
+    except Exception as e:
+        logging.error(f"Ошибка поиска для пользователя {message.from_user.id}: {e}")
+        await message.answer("❌ Ошибка поиска")
+
+
+@callbacks(SEARCH_NEXT)
+async def search_next_page(callback: CallbackQuery, state: FSMContext, callback_data):
+    """Следующая страница результатов поиска"""
+    try:
+        data = await state.get_data()
+        query = data.get('search_query')
+        if not query:
+            await callback.answer("❌ Поиск устарел, повторите /search", show_alert=True)
+            return
+
+        await callback.answer()
+        await send_search_page(callback.message, query, callback_data.cursor, edit=True)
+    except Exception as e:
+        logging.error(f"Ошибка пагинации поиска: {e}")
+        await callback.answer("❌ Ошибка", show_alert=True)
+
+
+def build_inline_results(hits):
+    """Inline-результаты с фото объявлений (photo_id уже лежит на серверах Telegram)"""
+    results = []
+    for hit in hits:
+        link = channel_post_link(hit.channel_message_id)
+        caption = f"📦 <b>{html.escape(hit.title or '')}</b>\n💰 {html.escape(format_price(hit.price))}"
+        if link:
+            caption += f"\n\n🔗 {link}"
+        results.append(InlineQueryResultCachedPhoto(
+            id=str(hit.id),
+            photo_file_id=hit.photo_id,
+            title=hit.title or "",
+            description=format_price(hit.price),
+            caption=caption,
+            parse_mode="HTML"
+        ))
+    return results
+
+
+@router.inline_query()
+async def inline_search(inline_query: InlineQuery):
+    """Inline-поиск: @бот запрос. Пустой запрос показывает свежие объявления"""
+    try:
+        query = normalize_query(inline_query.query)
+        offset = inline_query.offset or ""
+        cache_key = (query, offset)
+
+        cached = post_search.inline_cache.get(cache_key)
+        if cached is None:
+            if query:
+                hits, next_cursor = await post_search.search(query, offset or None, INLINE_PAGE_SIZE)
+            else:
+                hits, next_cursor = await post_search.latest(offset or None, INLINE_PAGE_SIZE)
+            cached = (build_inline_results(hits), next_cursor or "")
+            post_search.inline_cache.set(cache_key, cached)
+
+        results, next_offset = cached
+        # Выдача одинакова для всех пользователей - Telegram может кэшировать ее у себя
+        await inline_query.answer(
+            results,
+            cache_time=INLINE_CACHE_TIME if query else INLINE_LATEST_CACHE_TIME,
+            is_personal=False,
+            next_offset=next_offset
+        )
+    except Exception as e:
+        logging.error(f"Ошибка inline-поиска: {e}")
@@ -1,20 +1,29 @@
 # handlers/ticket_handlers.py
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, InlineKeyboardButton
+from aiogram.types import Message, CallbackQuery, FSInputFile
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
+import html
 import logging
 import asyncio
+import os
 
 from config import config
-from services import UserService, TicketService, AdminService
+from callbacks import (CallbackTable, BUY_PRIVILEGE, MY_TICKETS_PAGE, VIEW_TICKET, TICKET_HISTORY, TICKET_EXPORT,
+                       CLOSE_TICKET, START_CHAT, DECLINE_CHAT, END_CHAT, CANCEL_CHAT)
+from privilege_catalogue import privilege_catalogue
+from services import UserService, TicketService, AdminService, encode_ticket_cursor
 from keyboards import (help_menu, cancel_keyboard, main_menu, ticket_themes_keyboard,
                       my_tickets_keyboard, ticket_actions_keyboard, privileges_menu,
                       start_chat_keyboard, active_chat_keyboard)
 from states import TicketStates
+from chat_sessions import chat_sessions
+from admin_notifier import admin_notifier
+from ticket_history import render_history_page, write_transcript
 from database import AsyncSessionLocal
 
 router = Router()
+callbacks = CallbackTable(router)
 user_service = UserService()
 ticket_service = TicketService()
 admin_service = AdminService()
@@ -26,17 +35,15 @@ async def show_help(callback: CallbackQuery):
         # Сначала убедимся, что пользователь существует
         await user_service.get_or_create_user(callback.from_user.id, callback.from_user.username)
 
-        ticket_count = await ticket_service.get_tickets_count_by_status()
+        # Только тикеты этого пользователя, а не все тикеты в системе
+        ticket_summary = await ticket_service.get_ticket_summary(callback.from_user.id)
 
         text = "🎯 Выберите раздел помощи:"
-        if ticket_count > 0:
-            text += f"\n\n📋 У вас {ticket_count} активных тикетов"
+        if ticket_summary['active'] > 0:
+            text += f"\n\n📋 У вас {ticket_summary['active']} активных тикетов"
 
-        keyboard = help_menu()
-        if ticket_count > 0:
-            keyboard.inline_keyboard.insert(0, [InlineKeyboardButton(text="📋 Мои тикеты", callback_data="my_tickets")])
-
-        await callback.message.edit_text(text, reply_markup=keyboard)
+        # Клавиатура из кэша общая для всех - вариант с «Мои тикеты» выбирается аргументом, а не вставкой
+        await callback.message.edit_text(text, reply_markup=help_menu(ticket_summary['total'] > 0))
     except Exception as e:
         logging.error(f"Ошибка показа помощи для пользователя {callback.from_user.id}: {e}")
         await callback.answer("❌ Ошибка загрузки меню", show_alert=True)
@@ -47,7 +54,7 @@ async def show_privileges_menu(callback: CallbackQuery):
     """Показывает меню выбора привилегий для покупки"""
     try:
         text = "<b>💎 Выберите привилегию для покупки:</b>\n\n"
-        for privilege, info in config.PRIVILEGES.items():
+        for privilege, info in privilege_catalogue.privileges.items():
             if privilege != "user":
                 text += f"<b>{info['label']}</b>\n"
                 text += f"⏰ Кулдаун: {info['cooldown']} мин\n"
@@ -78,17 +85,17 @@ async def show_ads_info(callback: CallbackQuery):
         await callback.answer()
 
 
-@router.callback_query(F.data.startswith("buy_"))
-async def create_privilege_ticket(callback: CallbackQuery):
+@callbacks(BUY_PRIVILEGE)
+async def create_privilege_ticket(callback: CallbackQuery, callback_data):
     """Создает тикет для покупки выбранной привилегии"""
     try:
-        privilege_type = callback.data.replace("buy_", "")
+        privilege_type = callback_data.privilege
 
-        if privilege_type not in config.PRIVILEGES or privilege_type == "user":
+        if privilege_type not in privilege_catalogue.privileges or privilege_type == "user":
             await callback.answer("❌ Неверный тип привилегии", show_alert=True)
             return
 
-        privilege_info = config.PRIVILEGES[privilege_type]
+        privilege_info = privilege_catalogue.privileges[privilege_type]
         theme = f"💎 Покупка привилегии {privilege_info['label']}"
 
         # Создаем тикет с автоматическим сообщением
@@ -108,18 +115,14 @@ async def create_privilege_ticket(callback: CallbackQuery):
         await ticket_service.add_message_to_ticket(ticket.id, callback.from_user.id, auto_message)
 
         # Уведомляем админов
-        for admin_id in config.ADMIN_IDS:
-            try:
-                await callback.bot.send_message(
-                    admin_id,
-                    f"🎫 Новый тикет на покупку привилегии #{ticket.id}\n"
-                    f"Привилегия: {privilege_info['label']}\n"
-                    f"Цена: {privilege_info['price']} руб\n"
-                    f"Пользователь: @{callback.from_user.username or 'без username'}\n"
-                    f"ID: {callback.from_user.id}"
-                )
-            except Exception as e:
-                logging.error(f"Не удалось уведомить админа {admin_id}: {e}")
+        await admin_notifier.notify_ticket(
+            callback.bot, ticket,
+            f"🎫 Новый тикет на покупку привилегии #{ticket.id}\n"
+            f"Привилегия: {privilege_info['label']}\n"
+            f"Цена: {privilege_info['price']} руб\n"
+            f"Пользователь: @{callback.from_user.username or 'без username'}\n"
+            f"ID: {callback.from_user.id}"
+        )
 
         await callback.message.edit_text(
             f"✅ Тикет на покупку создан! Номер: #{ticket.id}\n"
@@ -165,26 +168,27 @@ async def show_other(callback: CallbackQuery):
         await callback.answer()
 
 
-@router.callback_query(F.data.startswith("ticket_"))
+# Кнопки тем (ticket_themes_keyboard) -> тема тикета
+TICKET_THEMES = {
+    "ticket_bot_help": "❓ Вопросы о боте",
+    "ticket_ads": "📢 Купить рекламу",
+    "ticket_other": "📞 Другое"
+}
+
+
+@router.callback_query(F.data.in_(TICKET_THEMES))
 async def create_ticket_handler(callback: CallbackQuery, state: FSMContext):
     try:
-        theme_map = {
-            "ticket_bot_help": "❓ Вопросы о боте",
-            "ticket_ads": "📢 Купить рекламу",
-            "ticket_other": "📞 Другое"
-        }
-
-        theme = theme_map.get(callback.data)
-        if theme:
-            await state.update_data(ticket_theme=theme)
-            instruction_msg = await callback.message.answer(
-                f"📝 Опишите ваш вопрос по теме '{theme}':\n\n"
-                "Опишите подробно вашу проблему или вопрос, и администратор скоро ответит.",
-                reply_markup=cancel_keyboard()
-            )
-            # Сохраняем message_id инструкции в state для последующего удаления
-            await state.update_data(instruction_message_id=instruction_msg.message_id)
-            await state.set_state(TicketStates.waiting_for_message)
+        theme = TICKET_THEMES[callback.data]
+        await state.update_data(ticket_theme=theme)
+        instruction_msg = await callback.message.answer(
+            f"📝 Опишите ваш вопрос по теме '{theme}':\n\n"
+            "Опишите подробно вашу проблему или вопрос, и администратор скоро ответит.",
+            reply_markup=cancel_keyboard()
+        )
+        # Сохраняем message_id инструкции в state для последующего удаления
+        await state.update_data(instruction_message_id=instruction_msg.message_id)
+        await state.set_state(TicketStates.waiting_for_message)
     except Exception as e:
         logging.error(f"Ошибка создания тикета: {e}")
         await callback.answer("❌ Ошибка", show_alert=True)
@@ -207,17 +211,13 @@ async def process_ticket_message(message: Message, state: FSMContext):
 
         logging.info(f"Тикет создан: #{ticket.id}, UserID={message.from_user.id}, Тема={theme}")
 
-        for admin_id in config.ADMIN_IDS:
-            try:
-                await message.bot.send_message(
-                    admin_id,
-                    f"🎫 Новый тикет #{ticket.id}\n"
-                    f"Тема: {theme}\n"
-                    f"Пользователь: @{message.from_user.username or 'без username'}\n"
-                    f"ID: {message.from_user.id}"
-                )
-            except Exception as e:
-                logging.error(f"Не удалось уведомить админа {admin_id}: {e}")
+        await admin_notifier.notify_ticket(
+            message.bot, ticket,
+            f"🎫 Новый тикет #{ticket.id}\n"
+            f"Тема: {theme}\n"
+            f"Пользователь: @{message.from_user.username or 'без username'}\n"
+            f"ID: {message.from_user.id}"
+        )
 
         await message.answer(
             f"✅ Тикет создан! Номер: #{ticket.id}\n"
@@ -231,109 +231,171 @@ async def process_ticket_message(message: Message, state: FSMContext):
         await message.answer("❌ Ошибка создания тикета")
 
 
+async def show_my_tickets_page(callback: CallbackQuery, cursor: str = None, backward: bool = False):
+    """Страница тикетов пользователя"""
+    tickets, prev_cursor, next_cursor = await ticket_service.get_tickets_page(
+        user_id=callback.from_user.id, cursor=cursor, backward=backward)
+    if not tickets and cursor:
+        tickets, prev_cursor, next_cursor = await ticket_service.get_tickets_page(user_id=callback.from_user.id)
+
+    if not tickets:
+        await callback.message.edit_text(
+            "📭 У вас пока нет тикетов.\n\n"
+            "Создайте тикет через раздел Помощь/Услуги",
+            reply_markup=help_menu()
+        )
+        return
+
+    await callback.message.edit_text(
+        "📋 Ваши тикеты:\n\n"
+        "🆕 - Новый\n"
+        "🔄 - В работе\n"
+        "✅ - Закрыт",
+        reply_markup=my_tickets_keyboard(tickets, prev_cursor, next_cursor)
+    )
+
+
 @router.callback_query(F.data == "my_tickets")
 async def show_my_tickets(callback: CallbackQuery):
     try:
-        tickets = await ticket_service.get_user_tickets(callback.from_user.id)
+        await show_my_tickets_page(callback)
+    except Exception as e:
+        logging.error(f"Ошибка показа тикетов: {e}")
+        await callback.answer("❌ Ошибка загрузки тикетов", show_alert=True)
 
-        if not tickets:
-            await callback.message.edit_text(
-                "📭 У вас пока нет тикетов.\n\n"
-                "Создайте тикет через раздел Помощь/Услуги",
-                reply_markup=help_menu()
-            )
-            return
 
-        await callback.message.edit_text(
-            "📋 Ваши тикеты:\n\n"
-            "🆕 - Новый\n"
-            "🔄 - В работе\n"
-            "✅ - Закрыт",
-            reply_markup=my_tickets_keyboard(tickets)
-        )
+@callbacks(MY_TICKETS_PAGE)
+async def my_tickets_page(callback: CallbackQuery, callback_data):
+    """Листание тикетов пользователя"""
+    try:
+        await callback.answer()
+        await show_my_tickets_page(callback, callback_data.cursor, backward=callback_data.backward)
     except Exception as e:
-        logging.error(f"Ошибка показа тикетов: {e}")
+        logging.error(f"Ошибка листания тикетов: {e}")
         await callback.answer("❌ Ошибка загрузки тикетов", show_alert=True)
 
 
-@router.callback_query(F.data.startswith("view_ticket_"))
-async def view_ticket(callback: CallbackQuery):
+# Подписи отправителей в истории тикета для пользователя: {is_admin: подпись}
+USER_HISTORY_LABELS = {False: "👤 Вы", True: "🛠 Админ"}
+
+
+async def show_user_ticket(callback: CallbackQuery, ticket, cursor: str = None):
+    """Карточка тикета пользователя со страницей истории сообщений"""
+    messages, has_older = await ticket_service.get_ticket_messages_page(ticket.id, before=cursor)
+
+    header = f"🎫 <b>Тикет #{ticket.id}</b>\n"
+    header += f"Тема: {html.escape(ticket.theme or '', quote=False)}\n"
+    header += f"Статус: {ticket.status}\n"
+    header += f"Создан: {ticket.created_at.strftime('%d.%m.%Y %H:%M')}\n\n"
+
+    text, oldest_shown = render_history_page(header, messages, USER_HISTORY_LABELS, has_older)
+    keyboard = ticket_actions_keyboard(
+        ticket.id,
+        older_cursor=encode_ticket_cursor(oldest_shown) if oldest_shown else None,
+        newest=cursor is None,
+        closed=ticket.status == "closed"
+    )
+    await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+
+
+@callbacks(VIEW_TICKET)
+async def view_ticket(callback: CallbackQuery, callback_data):
     try:
-        ticket_id = int(callback.data.split("_")[2])
+        ticket_id = callback_data.ticket_id
         ticket = await ticket_service.get_ticket_by_id(ticket_id)
 
         if not ticket or ticket.user_id != callback.from_user.id:
             await callback.answer("❌ Тикет не найден", show_alert=True)
             return
 
-        messages = await ticket_service.get_ticket_messages(ticket_id)
+        await show_user_ticket(callback, ticket)
+    except Exception as e:
+        logging.error(f"Ошибка просмотра тикета: {e}")
+        await callback.answer("❌ Ошибка загрузки тикета", show_alert=True)
+
 
-        text = f"🎫 Тикет #{ticket.id}\n"
-        text += f"Тема: {ticket.theme}\n"
-        text += f"Статус: {ticket.status}\n"
-        text += f"Создан: {ticket.created_at.strftime('%d.%m.%Y %H:%M')}\n\n"
-        text += "💬 История сообщений:\n\n"
+@callbacks(TICKET_HISTORY)
+async def ticket_history_page(callback: CallbackQuery, callback_data):
+    """Более ранние сообщения тикета"""
+    try:
+        ticket = await ticket_service.get_ticket_by_id(callback_data.ticket_id)
 
-        for msg in messages:
-            sender = "👤 Вы" if not msg.is_admin else "🛠 Админ"
-            text += f"{sender} ({msg.created_at.strftime('%H:%M')}):\n{msg.message_text}\n\n"
+        if not ticket or ticket.user_id != callback.from_user.id:
+            await callback.answer("❌ Тикет не найден", show_alert=True)
+            return
 
-        await callback.message.edit_text(text[:4000], reply_markup=ticket_actions_keyboard(ticket_id))
+        await callback.answer()
+        await show_user_ticket(callback, ticket, cursor=callback_data.cursor)
     except Exception as e:
-        logging.error(f"Ошибка просмотра тикета: {e}")
+        logging.error(f"Ошибка листания истории тикета: {e}")
         await callback.answer("❌ Ошибка загрузки тикета", show_alert=True)
 
 
-@router.callback_query(F.data.startswith("close_ticket_"))
-async def user_close_ticket(callback: CallbackQuery):
+@callbacks(TICKET_EXPORT)
+async def export_ticket_transcript(callback: CallbackQuery, callback_data):
+    """Выгрузка всей переписки по тикету файлом (владельцу тикета и админам)"""
+    path = None
+    try:
+        ticket_id = callback_data.ticket_id
+        ticket = await ticket_service.get_ticket_by_id(ticket_id)
+
+        is_admin = await admin_service.is_admin(callback.from_user.id)
+        if not ticket or (ticket.user_id != callback.from_user.id and not is_admin):
+            await callback.answer("❌ Тикет не найден", show_alert=True)
+            return
+
+        labels = {False: "Пользователь", True: "Администратор"} if is_admin else {False: "Вы", True: "Админ"}
+        path = await write_transcript(ticket, ticket_service.iter_ticket_messages(ticket_id), labels)
+        await callback.message.answer_document(
+            FSInputFile(path, filename=f"ticket_{ticket_id}.txt"),
+            caption=f"📄 Переписка по тикету #{ticket_id}"
+        )
+        await callback.answer()
+    except Exception as e:
+        logging.error(f"Ошибка выгрузки переписки тикета: {e}")
+        await callback.answer("❌ Ошибка выгрузки переписки", show_alert=True)
+    finally:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+@callbacks(CLOSE_TICKET)
+async def user_close_ticket(callback: CallbackQuery, callback_data):
     try:
-        ticket_id = int(callback.data.split("_")[2])
+        ticket_id = callback_data.ticket_id
         ticket = await ticket_service.get_ticket_by_id(ticket_id)
 
         if not ticket or ticket.user_id != callback.from_user.id:
             await callback.answer("❌ Тикет не найден", show_alert=True)
             return
 
-        # УДАЛЕНИЕ тикета вместо закрытия
-        success = await ticket_service.delete_ticket(ticket_id)
+        # Закрытый тикет остается в истории и со временем уходит в архив (ticket_archive)
+        success = await ticket_service.update_ticket_status(ticket_id, "closed")
 
         if success:
-            await callback.answer("✅ Тикет удален")
-            logging.info(f"Тикет удален пользователем: #{ticket_id}, UserID={callback.from_user.id}")
+            await callback.answer("✅ Тикет закрыт")
+            logging.info(f"Тикет закрыт пользователем: #{ticket_id}, UserID={callback.from_user.id}")
             await show_my_tickets(callback)
         else:
-            await callback.answer("❌ Ошибка удаления тикета", show_alert=True)
+            await callback.answer("❌ Ошибка закрытия тикета", show_alert=True)
 
     except Exception as e:
-        logging.error(f"Ошибка удаления тикета пользователем: {e}")
+        logging.error(f"Ошибка закрытия тикета пользователем: {e}")
         await callback.answer("❌ Ошибка", show_alert=True)
 
 
-@router.callback_query(F.data.startswith("start_chat_"))
-async def user_start_chat(callback: CallbackQuery, state: FSMContext):
+@callbacks(START_CHAT)
+async def user_start_chat(callback: CallbackQuery, state: FSMContext, callback_data):
     """Пользователь принимает приглашение в чат"""
     try:
-        ticket_id = int(callback.data.split("_")[2])
+        ticket_id = callback_data.ticket_id
         ticket = await ticket_service.get_ticket_by_id(ticket_id)
 
         if not ticket or ticket.user_id != callback.from_user.id:
             await callback.answer("❌ Тикет не найден", show_alert=True)
             return
 
-        # Обновляем тикет из БД, чтобы получить актуальный admin_id
-        ticket = await ticket_service.get_ticket_by_id(ticket_id)
-        
-        # Если admin_id все еще None, пытаемся найти его из тикетов в работе
-        if not ticket.admin_id:
-            in_progress_tickets = await ticket_service.get_tickets_by_status("in_progress")
-            for t in in_progress_tickets:
-                if t.id == ticket_id and t.admin_id:
-                    ticket.admin_id = t.admin_id
-                    # Обновляем тикет в БД
-                    await ticket_service.update_ticket_status(ticket_id, "in_progress", t.admin_id)
-                    break
-        
-        # Если admin_id все еще None, это проблема
+        # Если admin_id не назначен, это проблема
         if not ticket.admin_id:
             await callback.answer("❌ Ошибка: администратор не назначен на тикет. Попросите администратора отправить приглашение заново.", show_alert=True)
             logging.error(f"Тикет #{ticket_id} принят в чат, но admin_id не установлен")
@@ -349,6 +411,7 @@ async def user_start_chat(callback: CallbackQuery, state: FSMContext):
             active_chat_admin_id=ticket.admin_id,
             chat_active=True
         )
+        chat_sessions.open(ticket_id, ticket.user_id, ticket.admin_id)
 
         await callback.message.edit_text(
             f"💬 <b>Чат с администратором начат</b>\n"
@@ -387,17 +450,19 @@ async def user_start_chat(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Ошибка", show_alert=True)
 
 
-@router.callback_query(F.data.startswith("decline_chat_"))
-async def user_decline_chat(callback: CallbackQuery):
+@callbacks(DECLINE_CHAT)
+async def user_decline_chat(callback: CallbackQuery, callback_data):
     """Пользователь отклоняет приглашение в чат"""
     try:
-        ticket_id = int(callback.data.split("_")[2])
+        ticket_id = callback_data.ticket_id
         ticket = await ticket_service.get_ticket_by_id(ticket_id)
 
         if not ticket or ticket.user_id != callback.from_user.id:
             await callback.answer("❌ Тикет не найден", show_alert=True)
             return
 
+        chat_sessions.close(ticket_id)
+
         # Уведомляем админа об отказе
         if ticket.admin_id:
             try:
@@ -424,50 +489,9 @@ async def user_decline_chat(callback: CallbackQuery):
 async def process_user_chat_message(message: Message, state: FSMContext):
     """Обработка сообщений пользователя в активном чате"""
     try:
-        data = await state.get_data()
-        ticket_id = data.get('active_chat_ticket_id')
-        admin_id = data.get('active_chat_admin_id')
-
-        # Если данные отсутствуют в state, пытаемся восстановить из БД
-        if not ticket_id or not admin_id:
-            # Ищем активный тикет пользователя со статусом in_progress
-            user_tickets = await ticket_service.get_user_tickets(message.from_user.id)
-            active_ticket = None
-            for ticket in user_tickets:
-                if ticket.status == "in_progress" and ticket.admin_id:
-                    active_ticket = ticket
-                    break
-            
-            if active_ticket:
-                ticket_id = active_ticket.id
-                admin_id = active_ticket.admin_id
-                await state.update_data(
-                    active_chat_ticket_id=ticket_id,
-                    active_chat_admin_id=admin_id,
-                    chat_active=True
-                )
-                logging.info(f"Восстановлены данные чата пользователя из БД: TicketID={ticket_id}, AdminID={admin_id}")
-            else:
-                from message_cleaner import message_cleaner
-                from keyboards import main_menu
-                from config import config
-                await message_cleaner.send_temp_message(
-                    message.bot,
-                    message.from_user.id,
-                    "❌ Чат был закрыт. Вы вернулись в главное меню.",
-                    delete_after=5
-                )
-                await message.bot.send_message(
-                    message.from_user.id,
-                    "🏠 Главное меню",
-                    reply_markup=main_menu(message.from_user.id, config.ADMIN_IDS)
-                )
-                await state.clear()
-                return
-
-        # Проверяем, что тикет все еще активен
-        ticket = await ticket_service.get_ticket_by_id(ticket_id)
-        if not ticket or ticket.status != "in_progress" or ticket.admin_id != admin_id:
+        # Активный чат пользователя берется из реестра, без запросов к БД
+        chat = chat_sessions.by_user(message.from_user.id)
+        if not chat:
             from message_cleaner import message_cleaner
             from keyboards import main_menu
             from config import config
@@ -485,6 +509,9 @@ async def process_user_chat_message(message: Message, state: FSMContext):
             await state.clear()
             return
 
+        ticket_id = chat.ticket_id
+        admin_id = chat.admin_id
+
         # Отправляем сообщение админу
         try:
             sent_message = await message.bot.send_message(
@@ -533,16 +560,36 @@ async def process_user_chat_message(message: Message, state: FSMContext):
         )
 
 
-@router.callback_query(F.data.startswith("end_chat_"))
-async def user_end_chat(callback: CallbackQuery, state: FSMContext):
+async def is_own_chat(callback: CallbackQuery, ticket_id: int) -> bool:
+    """Чат тикета принадлежит нажавшему: по реестру чатов, а если чата в нем нет - по тикету"""
+    chat = chat_sessions.get(ticket_id)
+    if chat:
+        owner_id = chat.user_id
+    else:
+        ticket = await ticket_service.get_ticket_by_id(ticket_id)
+        owner_id = ticket.user_id if ticket else None
+    if owner_id != callback.from_user.id:
+        # Подделанная или чужая кнопка не должна завершать чужой чат
+        await callback.answer("❌ Чат не найден", show_alert=True)
+        return False
+    return True
+
+
+@callbacks(END_CHAT)
+async def user_end_chat(callback: CallbackQuery, state: FSMContext, callback_data):
     """Пользователь завершает чат"""
     try:
-        ticket_id = int(callback.data.split("_")[2])
-        ticket = await ticket_service.get_ticket_by_id(ticket_id)
+        ticket_id = callback_data.ticket_id
+        if not await is_own_chat(callback, ticket_id):
+            return
+        chat = chat_sessions.close(ticket_id)
 
-        # Получаем admin_id из тикета или state
+        # Получаем admin_id из реестра чатов, state или тикета
         data = await state.get_data()
-        admin_id = data.get('active_chat_admin_id') or (ticket.admin_id if ticket else None)
+        admin_id = chat.admin_id if chat else data.get('active_chat_admin_id')
+        if not admin_id:
+            ticket = await ticket_service.get_ticket_by_id(ticket_id)
+            admin_id = ticket.admin_id if ticket else None
 
         # Уведомляем админа о завершении чата и возвращаем в админ-панель
         if admin_id:
@@ -576,15 +623,18 @@ async def user_end_chat(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Ошибка")
 
 
-@router.callback_query(F.data.startswith("cancel_chat_"))
-async def user_cancel_chat(callback: CallbackQuery, state: FSMContext):
+@callbacks(CANCEL_CHAT)
+async def user_cancel_chat(callback: CallbackQuery, state: FSMContext, callback_data):
     """Пользователь отменяет чат"""
     try:
-        ticket_id = int(callback.data.split("_")[2])
+        ticket_id = callback_data.ticket_id
+        if not await is_own_chat(callback, ticket_id):
+            return
+        chat = chat_sessions.close(ticket_id)
 
         # Уведомляем админа об отмене чата
         data = await state.get_data()
-        admin_id = data.get('active_chat_admin_id')
+        admin_id = chat.admin_id if chat else data.get('active_chat_admin_id')
 
         if admin_id:
             try:
@@ -1,46 +1,119 @@
 # keyboards.py
+"""
+Клавиатуры бота.
+
+Меню, которые не зависят от пользователя, собираются один раз и дальше отдаются из кэша
+(@cached_keyboard): валидация pydantic-моделей кнопок на каждый callback заметно дороже
+отправки готового объекта. Клавиатуры с ценами и кулдаунами (@cached_keyboard(catalogue=True))
+собираются заново после изменения каталога привилегий.
+
+Клавиатура из кэша - общий объект: ее нельзя менять на месте. Нужен вариант - это
+отдельный аргумент функции (как has_tickets у help_menu).
+"""
+from functools import wraps
+from typing import Callable, Dict, Tuple
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from config import config
+from callbacks import (ADMIN_CANCEL_CHAT, ADMIN_CLOSE_TICKET, ADMIN_END_CHAT, ADMIN_REPLY_CHAT, ADMIN_TAKE_TICKET,
+                       ADMIN_TICKET_HISTORY, ADMIN_TICKETS_PAGE, ADMIN_VIEW_TICKET, APPLY_COOLDOWN, APPLY_PRICE,
+                       BUY_PRIVILEGE, CANCEL_CHAT, CLOSE_TICKET, CUSTOM_COOLDOWN, CUSTOM_PRICE, DECLINE_CHAT,
+                       EDIT_PRIVILEGE, END_CHAT, MY_TICKETS_PAGE, POST_BUMP, POST_SOLD, REOPEN_TICKET, REPLY_TICKET,
+                       SEARCH_NEXT, SET_COOLDOWN, SET_PRICE, START_CHAT, TICKET_EXPORT, TICKET_HISTORY,
+                       TICKET_SEARCH_NEXT, USER_BAN, USER_CHANGE_PRIVILEGE, USER_GRANT_PRIVILEGE, USER_RESET,
+                       USER_RESET_COOLDOWN, USER_SELECT, USER_UNBAN, VIEW_TICKET)
+from privilege_catalogue import privilege_catalogue
+from ticket_priority import get_priority_icon, priority_name
+
+# Кэши всех клавиатур, зависящих от каталога: {функция: {аргументы: клавиатура}}
+_catalogue_caches: Dict[Callable, Dict[Tuple, InlineKeyboardMarkup]] = {}
+_catalogue_version = 0
+
+
+def _check_catalogue_version():
+    """Сбрасывает клавиатуры с ценами и кулдаунами, если каталог привилегий изменился"""
+    global _catalogue_version
+    if _catalogue_version != privilege_catalogue.version:
+        for cache in _catalogue_caches.values():
+            cache.clear()
+        _catalogue_version = privilege_catalogue.version
+
+
+def cached_keyboard(build: Callable = None, *, catalogue: bool = False):
+    """
+    Кэширует клавиатуру по позиционным аргументам функции.
+
+    Аргументы должны принимать немного значений (флаг, тип привилегии) - для клавиатур
+    с user_id или списками из БД кэш не нужен. catalogue=True - клавиатура собрана из
+    каталога привилегий и сбрасывается при смене его версии.
+    """
+    def decorator(build: Callable) -> Callable:
+        cache: Dict[Tuple, InlineKeyboardMarkup] = {}
+        if catalogue:
+            _catalogue_caches[build] = cache
+
+        @wraps(build)
+        def wrapper(*args):
+            if catalogue:
+                _check_catalogue_version()
+            keyboard = cache.get(args)
+            if keyboard is None:
+                keyboard = cache[args] = build(*args)
+            return keyboard
+
+        return wrapper
+
+    return decorator(build) if build is not None else decorator
 
 
 def main_menu(user_id: int = None, admin_ids: list = None):
     """Главное меню с проверкой админки"""
+    return _main_menu(bool(user_id and admin_ids and user_id in admin_ids))
+
+
+@cached_keyboard
+def _main_menu(is_admin: bool):
     keyboard = [
         [InlineKeyboardButton(text="👤 Профиль", callback_data="profile")],
         [InlineKeyboardButton(text="💰 Продать под", callback_data="sell")],
+        [InlineKeyboardButton(text="📦 Мои объявления", callback_data="my_posts")],
         [InlineKeyboardButton(text="🆘 Помощь/Услуги", callback_data="help")]
     ]
 
     # Добавляем админ-панель только для админов
-    if user_id and admin_ids and user_id in admin_ids:
+    if is_admin:
         keyboard.append([InlineKeyboardButton(text="⚙️ Админ панель", callback_data="admin_main")])
 
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
-def help_menu():
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="💎 Купить привилегию", callback_data="buy_privilege")],
-            [InlineKeyboardButton(text="❓ Вопросы о боте", callback_data="faq")],
-            [InlineKeyboardButton(text="📞 Другое", callback_data="other")],
-            [InlineKeyboardButton(text="◀️ Назад", callback_data="main")]
-        ]
-    )
+@cached_keyboard
+def help_menu(has_tickets: bool = False):
+    """Меню помощи; has_tickets - добавить сверху кнопку «Мои тикеты»"""
+    keyboard = [
+        [InlineKeyboardButton(text="💎 Купить привилегию", callback_data="buy_privilege")],
+        [InlineKeyboardButton(text="❓ Вопросы о боте", callback_data="faq")],
+        [InlineKeyboardButton(text="📞 Другое", callback_data="other")],
+        [InlineKeyboardButton(text="◀️ Назад", callback_data="main")]
+    ]
+    if has_tickets:
+        keyboard.insert(0, [InlineKeyboardButton(text="📋 Мои тикеты", callback_data="my_tickets")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
+@cached_keyboard(catalogue=True)
 def privileges_menu():
     """Меню выбора привилегий для покупки"""
     keyboard = []
-    for privilege, info in config.PRIVILEGES.items():
+    for privilege, info in privilege_catalogue.privileges.items():
         if privilege != "user":
             button_text = f"{info['label']} - {info['price']} руб"
-            keyboard.append([InlineKeyboardButton(text=button_text, callback_data=f"buy_{privilege}")])
+            keyboard.append([InlineKeyboardButton(text=button_text, callback_data=BUY_PRIVILEGE.pack(privilege))])
 
     keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data="help")])
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
+@cached_keyboard
 def cancel_keyboard():
     return InlineKeyboardMarkup(
         inline_keyboard=[
@@ -49,6 +122,7 @@ def cancel_keyboard():
     )
 
 
+@cached_keyboard
 def confirm_keyboard():
     return InlineKeyboardMarkup(
         inline_keyboard=[
@@ -58,11 +132,13 @@ def confirm_keyboard():
     )
 
 
+@cached_keyboard
 def admin_menu():
     return InlineKeyboardMarkup(
         inline_keyboard=[
             [InlineKeyboardButton(text="📊 Статистика", callback_data="admin_stats")],
             [InlineKeyboardButton(text="🎫 Управление тикетами", callback_data="admin_tickets")],
+            [InlineKeyboardButton(text="⏱ SLA тикетов", callback_data="admin_sla")],
             [InlineKeyboardButton(text="⚙️ Настройки привилегий", callback_data="admin_privileges")],
             [InlineKeyboardButton(text="👥 Управление пользователями", callback_data="admin_users")],
             [InlineKeyboardButton(text="◀️ На главную", callback_data="main")]
@@ -70,17 +146,21 @@ def admin_menu():
     )
 
 
+@cached_keyboard
 def ticket_status_keyboard():
     """Клавиатура для выбора статуса тикетов"""
     return InlineKeyboardMarkup(
         inline_keyboard=[
             [InlineKeyboardButton(text="🆕 Новые тикеты", callback_data="tickets_new")],
             [InlineKeyboardButton(text="🔄 Тикеты в работе", callback_data="tickets_in_progress")],
+            [InlineKeyboardButton(text="⏭ Взять следующий тикет", callback_data="admin_next_ticket")],
+            [InlineKeyboardButton(text="📊 По приоритетам", callback_data="tickets_by_priority")],
             [InlineKeyboardButton(text="◀️ Назад", callback_data="admin_main")]
         ]
     )
 
 
+@cached_keyboard
 def ticket_priority_keyboard():
     """Клавиатура для работы с приоритетами тикетов"""
     return InlineKeyboardMarkup(
@@ -88,12 +168,14 @@ def ticket_priority_keyboard():
             [InlineKeyboardButton(text="🔴 Высокий приоритет", callback_data="priority_high")],
             [InlineKeyboardButton(text="🟡 Средний приоритет", callback_data="priority_medium")],
             [InlineKeyboardButton(text="🟢 Низкий приоритет", callback_data="priority_low")],
+            [InlineKeyboardButton(text="⏭ Взять следующий тикет", callback_data="admin_next_ticket")],
             [InlineKeyboardButton(text="🎫 Все тикеты", callback_data="admin_tickets")],
             [InlineKeyboardButton(text="◀️ Назад", callback_data="admin_main")]
         ]
     )
 
 
+@cached_keyboard
 def ticket_themes_keyboard():
     return InlineKeyboardMarkup(
         inline_keyboard=[
@@ -105,63 +187,104 @@ def ticket_themes_keyboard():
     )
 
 
-def tickets_list_keyboard(tickets, is_admin=False, back_callback="help"):
+def pagination_row(prev_callback: str = None, next_callback: str = None):
+    """Ряд кнопок навигации по страницам (пустой список, если листать некуда)"""
+    row = []
+    if prev_callback:
+        row.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=prev_callback))
+    if next_callback:
+        row.append(InlineKeyboardButton(text="Далее ➡️", callback_data=next_callback))
+    return row
+
+
+def tickets_list_keyboard(tickets, is_admin=False, back_callback="help", prev_callback=None, next_callback=None):
     """Универсальная функция для списка тикетов"""
     keyboard = []
     for ticket in tickets:
         status_icon = "🆕" if ticket.status == "new" else "🔄" if ticket.status == "in_progress" else "✅"
 
         # ✅ ДОБАВЛЯЕМ ПРИОРИТЕТ К ТЕКСТУ КНОПКИ
-        priority = get_ticket_priority(ticket.theme)
+        priority = priority_name(ticket.priority)
         priority_icon = get_priority_icon(priority)
 
         if is_admin:
             button_text = f"{priority_icon} {status_icon} #{ticket.id} - {ticket.theme}"
-            callback_data = f"admin_view_ticket_{ticket.id}"
+            callback_data = ADMIN_VIEW_TICKET.pack(ticket.id)
         else:
             button_text = f"{status_icon} {ticket.theme} (#{ticket.id})"
-            callback_data = f"view_ticket_{ticket.id}"
+            callback_data = VIEW_TICKET.pack(ticket.id)
 
         keyboard.append([InlineKeyboardButton(text=button_text, callback_data=callback_data)])
 
+    navigation = pagination_row(prev_callback, next_callback)
+    if navigation:
+        keyboard.append(navigation)
+
     back_callback_data = "admin_main" if is_admin else back_callback
     keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data=back_callback_data)])
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
-def my_tickets_keyboard(tickets):
-    """Алиас для удобства"""
-    return tickets_list_keyboard(tickets, is_admin=False, back_callback="help")
+def my_tickets_keyboard(tickets, prev_cursor=None, next_cursor=None):
+    """Список тикетов пользователя; курсоры страниц кодируются в callback_data"""
+    return tickets_list_keyboard(
+        tickets, is_admin=False, back_callback="help",
+        prev_callback=MY_TICKETS_PAGE.pack(True, prev_cursor) if prev_cursor else None,
+        next_callback=MY_TICKETS_PAGE.pack(False, next_cursor) if next_cursor else None
+    )
 
 
-def admin_tickets_list_keyboard(tickets):
+def admin_tickets_list_keyboard(tickets, status="new", prev_cursor=None, next_cursor=None):
     """Клавиатура списка тикетов для админа"""
     keyboard = []
     for ticket in tickets:
         status_icon = "🆕" if ticket.status == "new" else "🔄" if ticket.status == "in_progress" else "✅"
         
         # Добавляем приоритет к тексту кнопки
-        priority = get_ticket_priority(ticket.theme)
+        priority = priority_name(ticket.priority)
         priority_icon = get_priority_icon(priority)
         
         button_text = f"{priority_icon} {status_icon} #{ticket.id} - {ticket.theme}"
-        callback_data = f"admin_view_ticket_{ticket.id}"
+        callback_data = ADMIN_VIEW_TICKET.pack(ticket.id)
         keyboard.append([InlineKeyboardButton(text=button_text, callback_data=callback_data)])
+
+    navigation = pagination_row(
+        ADMIN_TICKETS_PAGE.pack(True, status, prev_cursor) if prev_cursor else None,
+        ADMIN_TICKETS_PAGE.pack(False, status, next_cursor) if next_cursor else None
+    )
+    if navigation:
+        keyboard.append(navigation)
     
     keyboard.append([InlineKeyboardButton(text="◀️ Назад к статусам", callback_data="admin_tickets")])
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
-def ticket_actions_keyboard(ticket_id, is_admin=False):
+def ticket_actions_keyboard(ticket_id, is_admin=False, older_cursor=None, newest=True, closed=False):
+    """Действия с тикетом и навигация по истории: older_cursor - курсор страницы "Ранее",
+    newest=False - показана не последняя страница истории, closed - тикет закрыт"""
     keyboard = []
-    if is_admin:
+
+    history = ADMIN_TICKET_HISTORY if is_admin else TICKET_HISTORY
+    navigation = []
+    if older_cursor:
+        navigation.append(InlineKeyboardButton(text="⏪ Ранее", callback_data=history.pack(ticket_id, older_cursor)))
+    if not newest:
+        latest = ADMIN_VIEW_TICKET if is_admin else VIEW_TICKET
+        navigation.append(InlineKeyboardButton(text="⏩ Последние", callback_data=latest.pack(ticket_id)))
+    if navigation:
+        keyboard.append(navigation)
+    keyboard.append([InlineKeyboardButton(text="📄 Вся переписка файлом", callback_data=TICKET_EXPORT.pack(ticket_id))])
+
+    if is_admin and closed:
+        keyboard.append([InlineKeyboardButton(text="♻️ Открыть заново", callback_data=REOPEN_TICKET.pack(ticket_id))])
+    elif is_admin:
         keyboard.extend([
-            [InlineKeyboardButton(text="🔄 Взять в работу", callback_data=f"admin_take_{ticket_id}")],
-            [InlineKeyboardButton(text="💬 Ответить в чат", callback_data=f"reply_ticket_{ticket_id}")],
-            [InlineKeyboardButton(text="✅ Закрыть тикет", callback_data=f"admin_close_{ticket_id}")],
+            [InlineKeyboardButton(text="🔄 Взять в работу", callback_data=ADMIN_TAKE_TICKET.pack(ticket_id))],
+            [InlineKeyboardButton(text="💬 Ответить в чат", callback_data=REPLY_TICKET.pack(ticket_id))],
+            [InlineKeyboardButton(text="✅ Закрыть тикет", callback_data=ADMIN_CLOSE_TICKET.pack(ticket_id))],
         ])
-    else:
-        keyboard.append([InlineKeyboardButton(text="✅ Закрыть тикет", callback_data=f"close_ticket_{ticket_id}")])
+    elif not closed:
+        keyboard.append([InlineKeyboardButton(text="✅ Закрыть тикет", callback_data=CLOSE_TICKET.pack(ticket_id))])
 
     back_callback = "my_tickets" if not is_admin else "admin_tickets"
     keyboard.append([InlineKeyboardButton(text="◀️ Назад к тикетам", callback_data=back_callback)])
@@ -172,17 +295,18 @@ def start_chat_keyboard(ticket_id):
     """Клавиатура для начала чата с админом"""
     return InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text="💬 Начать чат с админом", callback_data=f"start_chat_{ticket_id}")],
-            [InlineKeyboardButton(text="❌ Отклонить", callback_data=f"decline_chat_{ticket_id}")]
+            [InlineKeyboardButton(text="💬 Начать чат с админом", callback_data=START_CHAT.pack(ticket_id))],
+            [InlineKeyboardButton(text="❌ Отклонить", callback_data=DECLINE_CHAT.pack(ticket_id))]
         ]
     )
 
 
 def active_chat_keyboard(ticket_id, is_admin=False):
-    """Клавиатура для активного чата"""
+    """Клавиатура для активного чата; у админа «Завершить» уведомляет пользователя, а не наоборот"""
     keyboard = []
-    keyboard.append([InlineKeyboardButton(text="✅ Завершить чат", callback_data=f"end_chat_{ticket_id}")])
-    keyboard.append([InlineKeyboardButton(text="❌ Отмена", callback_data=f"cancel_chat_{ticket_id}")])
+    end_chat = ADMIN_END_CHAT if is_admin else END_CHAT
+    keyboard.append([InlineKeyboardButton(text="✅ Завершить чат", callback_data=end_chat.pack(ticket_id))])
+    keyboard.append([InlineKeyboardButton(text="❌ Отмена", callback_data=CANCEL_CHAT.pack(ticket_id))])
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
@@ -190,12 +314,52 @@ def admin_chat_invitation_keyboard(ticket_id):
     """Клавиатура для приглашения в чат от админа"""
     return InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text="💬 Ответить в чат", callback_data=f"admin_reply_chat_{ticket_id}")],
-            [InlineKeyboardButton(text="❌ Отмена", callback_data=f"admin_cancel_chat_{ticket_id}")]
+            [InlineKeyboardButton(text="💬 Ответить в чат", callback_data=ADMIN_REPLY_CHAT.pack(ticket_id))],
+            [InlineKeyboardButton(text="❌ Отмена", callback_data=ADMIN_CANCEL_CHAT.pack(ticket_id))]
         ]
     )
 
 
+def my_posts_keyboard(posts):
+    """Список активных объявлений продавца с кнопками управления"""
+    keyboard = []
+    for post in posts:
+        title = post.title if len(post.title) <= 25 else post.title[:24] + "…"
+        keyboard.append([
+            InlineKeyboardButton(text=f"🔼 {title}", callback_data=POST_BUMP.pack(post.id)),
+            InlineKeyboardButton(text="✅ Продано", callback_data=POST_SOLD.pack(post.id))
+        ])
+
+    keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data="main")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+def search_results_keyboard(next_cursor: str = None):
+    """Клавиатура результатов поиска: следующая страница по курсору"""
+    if not next_cursor:
+        return None
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text="➡️ Дальше", callback_data=SEARCH_NEXT.pack(next_cursor))]
+        ]
+    )
+
+
+def ticket_search_keyboard(hits, next_cursor: str = None):
+    """Результаты поиска по тикетам: кнопка на каждый тикет и следующая страница"""
+    keyboard = []
+    for hit in hits:
+        status_icon = "🆕" if hit.status == "new" else "🔄" if hit.status == "in_progress" else "✅"
+        priority_icon = get_priority_icon(priority_name(hit.priority))
+        keyboard.append([InlineKeyboardButton(
+            text=f"{priority_icon} {status_icon} #{hit.id} - {hit.theme}",
+            callback_data=ADMIN_VIEW_TICKET.pack(hit.id)
+        )])
+    if next_cursor:
+        keyboard.append([InlineKeyboardButton(text="➡️ Дальше", callback_data=TICKET_SEARCH_NEXT.pack(next_cursor))])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
 def contact_seller_keyboard(seller_id: int, seller_username: str = None):
     """Кнопка для связи с продавцом - создает кнопку только если есть реальный username"""
     try:
@@ -219,36 +383,39 @@ def contact_seller_keyboard(seller_id: int, seller_username: str = None):
 
 # ✅ КЛАВИАТУРЫ ДЛЯ УПРАВЛЕНИЯ ПРИВИЛЕГИЯМИ
 
+@cached_keyboard(catalogue=True)
 def privileges_management_keyboard():
     """Главное меню управления привилегиями"""
     keyboard = []
-    for privilege, info in config.PRIVILEGES.items():
+    for privilege, info in privilege_catalogue.privileges.items():
         if privilege != "user":
             button_text = f"{info['label']} - {info['price']} руб"
-            keyboard.append([InlineKeyboardButton(text=button_text, callback_data=f"edit_privilege_{privilege}")])
+            keyboard.append([InlineKeyboardButton(text=button_text, callback_data=EDIT_PRIVILEGE.pack(privilege))])
 
     keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data="admin_main")])
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
+@cached_keyboard(catalogue=True)
 def privilege_edit_keyboard(privilege_type: str):
     """Клавиатура для редактирования конкретной привилегии"""
-    privilege_info = config.PRIVILEGES[privilege_type]
+    privilege_info = privilege_catalogue.privileges[privilege_type]
 
     return InlineKeyboardMarkup(
         inline_keyboard=[
             [InlineKeyboardButton(text=f"💰 Изменить цену ({privilege_info['price']} руб)",
-                                  callback_data=f"set_price_{privilege_type}")],
+                                  callback_data=SET_PRICE.pack(privilege_type))],
             [InlineKeyboardButton(text=f"⏰ Изменить кулдаун ({privilege_info['cooldown']} мин)",
-                                  callback_data=f"set_cooldown_{privilege_type}")],
+                                  callback_data=SET_COOLDOWN.pack(privilege_type))],
             [InlineKeyboardButton(text="◀️ Назад к привилегиям", callback_data="admin_privileges")]
         ]
     )
 
 
+@cached_keyboard(catalogue=True)
 def price_keyboard(privilege_type: str):
     """Клавиатура для выбора цены привилегии"""
-    privilege_info = config.PRIVILEGES[privilege_type]
+    privilege_info = privilege_catalogue.privileges[privilege_type]
     current_price = privilege_info['price']
 
     # Предустановленные цены
@@ -266,18 +433,19 @@ def price_keyboard(privilege_type: str):
             if price == current_price:
                 button_text = f"✅ {button_text}"
             button_row.append(InlineKeyboardButton(text=button_text,
-                                                   callback_data=f"apply_price_{privilege_type}_{price}"))
+                                                   callback_data=APPLY_PRICE.pack(privilege_type, price)))
         keyboard.append(button_row)
 
-    keyboard.append([InlineKeyboardButton(text="✏️ Ввести свою цену", callback_data=f"custom_price_{privilege_type}")])
-    keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data=f"edit_privilege_{privilege_type}")])
+    keyboard.append([InlineKeyboardButton(text="✏️ Ввести свою цену", callback_data=CUSTOM_PRICE.pack(privilege_type))])
+    keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data=EDIT_PRIVILEGE.pack(privilege_type))])
 
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
+@cached_keyboard(catalogue=True)
 def cooldown_keyboard(privilege_type: str):
     """Клавиатура для выбора кулдауна привилегии"""
-    privilege_info = config.PRIVILEGES[privilege_type]
+    privilege_info = privilege_catalogue.privileges[privilege_type]
     current_cooldown = privilege_info['cooldown']
 
     # Предустановленные кулдауны
@@ -295,18 +463,19 @@ def cooldown_keyboard(privilege_type: str):
             if cooldown == current_cooldown:
                 button_text = f"✅ {button_text}"
             button_row.append(InlineKeyboardButton(text=button_text,
-                                                   callback_data=f"apply_cooldown_{privilege_type}_{cooldown}"))
+                                                   callback_data=APPLY_COOLDOWN.pack(privilege_type, cooldown)))
         keyboard.append(button_row)
 
     keyboard.append(
-        [InlineKeyboardButton(text="✏️ Ввести свой кулдаун", callback_data=f"custom_cooldown_{privilege_type}")])
-    keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data=f"edit_privilege_{privilege_type}")])
+        [InlineKeyboardButton(text="✏️ Ввести свой кулдаун", callback_data=CUSTOM_COOLDOWN.pack(privilege_type))])
+    keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data=EDIT_PRIVILEGE.pack(privilege_type))])
 
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
 # ✅ КЛАВИАТУРЫ ДЛЯ УПРАВЛЕНИЯ ПОЛЬЗОВАТЕЛЯМИ
 
+@cached_keyboard
 def user_management_keyboard():
     """Главное меню управления пользователями"""
     return InlineKeyboardMarkup(
@@ -322,6 +491,7 @@ def user_management_keyboard():
     )
 
 
+@cached_keyboard
 def user_search_keyboard():
     """Клавиатура для поиска пользователя"""
     return InlineKeyboardMarkup(
@@ -333,14 +503,12 @@ def user_search_keyboard():
     )
 
 
-def privilege_selection_keyboard(action: str, user_id: int = None):
-    """Клавиатура для выбора привилегии"""
+def privilege_selection_keyboard(user_id: int):
+    """Клавиатура для выбора привилегии, которую выдать пользователю"""
     keyboard = []
-    for privilege, info in config.PRIVILEGES.items():
+    for privilege, info in privilege_catalogue.privileges.items():
         button_text = f"{info['label']}"
-        callback_data = f"{action}_{privilege}"
-        if user_id:
-            callback_data += f"_{user_id}"
+        callback_data = USER_GRANT_PRIVILEGE.pack(user_id, privilege)
         keyboard.append([InlineKeyboardButton(text=button_text, callback_data=callback_data)])
 
     back_callback = "admin_users"
@@ -354,11 +522,11 @@ def user_actions_keyboard(user_id: int):
     """Клавиатура действий с конкретным пользователем"""
     return InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text="🚫 Заблокировать", callback_data=f"ban_{user_id}")],
-            [InlineKeyboardButton(text="✅ Разблокировать", callback_data=f"unban_{user_id}")],
-            [InlineKeyboardButton(text="🔄 Обнулить аккаунт", callback_data=f"reset_{user_id}")],
-            [InlineKeyboardButton(text="⏰ Сбросить кулдаун", callback_data=f"reset_cd_{user_id}")],
-            [InlineKeyboardButton(text="⭐ Изменить привилегию", callback_data=f"change_priv_{user_id}")],
+            [InlineKeyboardButton(text="🚫 Заблокировать", callback_data=USER_BAN.pack(user_id))],
+            [InlineKeyboardButton(text="✅ Разблокировать", callback_data=USER_UNBAN.pack(user_id))],
+            [InlineKeyboardButton(text="🔄 Обнулить аккаунт", callback_data=USER_RESET.pack(user_id))],
+            [InlineKeyboardButton(text="⏰ Сбросить кулдаун", callback_data=USER_RESET_COOLDOWN.pack(user_id))],
+            [InlineKeyboardButton(text="⭐ Изменить привилегию", callback_data=USER_CHANGE_PRIVILEGE.pack(user_id))],
             [InlineKeyboardButton(text="◀️ Назад к управлению", callback_data="admin_users")]
         ]
     )
@@ -369,12 +537,13 @@ def user_search_results_keyboard(users):
     keyboard = []
     for user in users:
         button_text = f"👤 @{user.username or 'без username'} (ID: {user.id})"
-        keyboard.append([InlineKeyboardButton(text=button_text, callback_data=f"select_user_{user.id}")])
+        keyboard.append([InlineKeyboardButton(text=button_text, callback_data=USER_SELECT.pack(user.id))])
 
     keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data="find_user_menu")])
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
+@cached_keyboard
 def back_to_user_management_keyboard():
     """Клавиатура для возврата к управлению пользователями"""
     return InlineKeyboardMarkup(
@@ -389,41 +558,18 @@ def user_quick_actions_keyboard(user_id: int):
     return InlineKeyboardMarkup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text="🚫 Бан", callback_data=f"ban_{user_id}"),
-                InlineKeyboardButton(text="✅ Разбан", callback_data=f"unban_{user_id}")
+                InlineKeyboardButton(text="🚫 Бан", callback_data=USER_BAN.pack(user_id)),
+                InlineKeyboardButton(text="✅ Разбан", callback_data=USER_UNBAN.pack(user_id))
             ],
             [
-                InlineKeyboardButton(text="🔄 Обнулить", callback_data=f"reset_{user_id}"),
-                InlineKeyboardButton(text="⏰ Сбросить КД", callback_data=f"reset_cd_{user_id}")
+                InlineKeyboardButton(text="🔄 Обнулить", callback_data=USER_RESET.pack(user_id)),
+                InlineKeyboardButton(text="⏰ Сбросить КД", callback_data=USER_RESET_COOLDOWN.pack(user_id))
             ],
             [
-                InlineKeyboardButton(text="⭐ Привилегия", callback_data=f"change_priv_{user_id}")
+                InlineKeyboardButton(text="⭐ Привилегия", callback_data=USER_CHANGE_PRIVILEGE.pack(user_id))
             ],
             [
                 InlineKeyboardButton(text="◀️ Назад", callback_data="admin_users")
             ]
         ]
     )
-
-
-# ✅ ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ДЛЯ ПРИОРИТЕТОВ ТИКЕТОВ
-
-def get_ticket_priority(theme):
-    """Определяет приоритет тикета по теме"""
-    theme_lower = theme.lower()
-    if "покупка привилегии" in theme_lower or "реклам" in theme_lower or "купить" in theme_lower:
-        return "high"
-    elif "вопрос" in theme_lower or "бот" in theme_lower or "помощь" in theme_lower:
-        return "low"
-    else:
-        return "medium"
-
-
-def get_priority_icon(priority):
-    """Возвращает иконку для приоритета"""
-    icons = {
-        "high": "🔴",
-        "medium": "🟡",
-        "low": "🟢"
-    }
-    return icons.get(priority, "⚪")
\ No newline at end of file
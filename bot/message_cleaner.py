@@ -3,7 +3,7 @@
 """
 import asyncio
 import logging
-from typing import Dict, Optional
+from typing import Dict, Optional, Set
 from aiogram import Bot
 from aiogram.types import Message, CallbackQuery
 
@@ -19,6 +19,18 @@ class MessageCleaner:
         self.last_messages: Dict[int, int] = {}  # {user_id: message_id}
         self.auto_delete_delay = auto_delete_delay
         self.delete_tasks: Dict[int, asyncio.Task] = {}  # {message_id: task}
+        self._scheduled: Set[asyncio.Task] = set()  # все запланированные удаления, пока не выполнены
+
+    def _schedule(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._scheduled.add(task)
+        task.add_done_callback(self._scheduled.discard)
+        return task
+
+    @property
+    def pending_deletions(self) -> int:
+        """Сколько удалений запланировано и еще не выполнено (метрика baraholka_message_cleaner_pending)"""
+        return len(self._scheduled)
     
     async def send_and_clean(self, bot: Bot, user_id: int, text: str, **kwargs) -> Optional[Message]:
         """
@@ -51,7 +63,7 @@ class MessageCleaner:
             
             # Запускаем задачу автоудаления, если включено
             if self.auto_delete_delay > 0:
-                task = asyncio.create_task(
+                task = self._schedule(
                     self._auto_delete_message(bot, user_id, message.message_id)
                 )
                 self.delete_tasks[message.message_id] = task
@@ -112,7 +124,7 @@ class MessageCleaner:
             message = await bot.send_message(chat_id=user_id, text=text, **kwargs)
             
             # Запускаем задачу удаления
-            asyncio.create_task(self._delete_after_delay(bot, user_id, message.message_id, delete_after))
+            self._schedule(self._delete_after_delay(bot, user_id, message.message_id, delete_after))
             
             return message
         except Exception as e:
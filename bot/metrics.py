@@ -0,0 +1,288 @@
+"""
+Метрики работы бота в текстовом формате Prometheus: GET http://METRICS_HOST:METRICS_PORT/metrics.
+
+Счетчики и гистограммы живут в памяти процесса. Набор меток метрики (labels(...)) создается
+один раз и кэшируется: в горячем пути вызывающий код держит ссылку на готовый набор
+(счетчик - одно сложение, гистограмма - bisect по границам и два сложения), текст меток
+форматируется при создании набора, а не при каждом запросе /metrics.
+
+Что собирается:
+    baraholka_updates_total{type, handled}      - апдейты по типам (handler_profiler)
+    baraholka_handler_seconds{handler}          - время обработчиков и апдейтов (handler_profiler)
+    baraholka_bot_api_seconds{method}           - время запросов к Bot API (telegram_api)
+    baraholka_bot_api_errors_total{method, error} - ошибки Bot API, error="retry_after" - ответы 429
+    baraholka_db_query_seconds                  - время SQL-запросов (query_profiler)
+    baraholka_db_slow_queries_total             - запросы дольше SLOW_QUERY_MS
+    baraholka_publish_in_progress               - публикации в канал, ожидающие ответа Bot API
+    baraholka_message_cleaner_pending           - запланированные удаления сообщений
+    baraholka_fsm_states{state}                 - пользователи в каждом состоянии FSM
+"""
+import bisect
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import web
+
+from config import config
+
+# Границы гистограмм задержек, секунды
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def _new_child(self, labels_text: str):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Набор меток (создается при первом обращении, дальше - из кэша)"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name}: ожидаются метки {self.labelnames}, получено {key}")
+            child = self._children[key] = self._new_child(_labels_text(self.labelnames, key))
+        return child
+
+    def _render_children(self, lines: List[str]):
+        raise NotImplementedError
+
+    def render(self, lines: List[str]):
+        lines.append(f"# HELP {self.name} {self.documentation}")
+        lines.append(f"# TYPE {self.name} {self.kind}")
+        self._render_children(lines)
+
+
+class CounterChild:
+    __slots__ = ("labels_text", "value")
+
+    def __init__(self, labels_text: str):
+        self.labels_text = labels_text
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self, labels_text: str):
+        return CounterChild(labels_text)
+
+    def inc(self, amount: float = 1):
+        self._default.value += amount
+
+    def _render_children(self, lines: List[str]):
+        for child in list(self._children.values()):
+            lines.append(f"{self.name}{child.labels_text} {_number(child.value)}")
+
+
+class HistogramChild:
+    __slots__ = ("labels_text", "bounds", "counts", "sum")
+
+    def __init__(self, labels_text: str, bounds: Tuple[float, ...]):
+        self.labels_text = labels_text
+        self.bounds = bounds
+        # Последняя ячейка - значения больше последней границы (+Inf)
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self, labels_text: str):
+        return HistogramChild(labels_text, self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def _render_children(self, lines: List[str]):
+        for child in list(self._children.values()):
+            # le добавляется к меткам набора: {a="1"} -> {a="1",le="0.5"}
+            prefix = child.labels_text[:-1] + "," if child.labels_text else "{"
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{prefix}le="{_number(bound)}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{child.labels_text} {_number(child.sum)}")
+            lines.append(f"{self.name}_count{child.labels_text} {cumulative}")
+
+
+class Gauge(_Metric):
+    """
+    Текущее значение: либо inc()/dec() из кода, либо collect() - функция, которая при
+    запросе /metrics возвращает [(значения меток, число)]
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 collect: Optional[Callable[[], Iterable[Tuple[Tuple[str, ...], float]]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self, labels_text: str):
+        return CounterChild(labels_text)
+
+    def inc(self, amount: float = 1):
+        self._default.value += amount
+
+    def dec(self, amount: float = 1):
+        self._default.value -= amount
+
+    def _render_children(self, lines: List[str]):
+        if self.collect is None:
+            for child in list(self._children.values()):
+                lines.append(f"{self.name}{child.labels_text} {_number(child.value)}")
+            return
+        try:
+            values = list(self.collect())
+        except Exception as e:
+            logging.error(f"Ошибка сбора метрики {self.name}: {e}")
+            return
+        for label_values, value in values:
+            lines.append(f"{self.name}{self.labels(*label_values).labels_text} {_number(value)}")
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), collect=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, collect))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            metric.render(lines)
+        return "\n".join(lines) + "\n"
+
+
+# Глобальный экземпляр
+registry = MetricsRegistry()
+
+updates_total = registry.counter("baraholka_updates_total", "Обработанные апдейты по типам", ("type", "handled"))
+handler_seconds = registry.histogram(
+    "baraholka_handler_seconds",
+    "Время обработчиков; update:<тип> - апдейт целиком, dispatch:<тип> - маршрутизация", ("handler",))
+bot_api_seconds = registry.histogram("baraholka_bot_api_seconds", "Время запросов к Bot API", ("method",))
+bot_api_errors_total = registry.counter(
+    "baraholka_bot_api_errors_total", "Ошибки Bot API; error=retry_after - ответ 429", ("method", "error"))
+db_query_seconds = registry.histogram("baraholka_db_query_seconds", "Время SQL-запросов", buckets=DB_BUCKETS)
+db_slow_queries_total = registry.counter("baraholka_db_slow_queries_total", "SQL-запросы дольше SLOW_QUERY_MS")
+publish_in_progress = registry.gauge("baraholka_publish_in_progress", "Публикации в канал, ожидающие Bot API")
+
+
+def _pending_deletions():
+    from message_cleaner import message_cleaner
+    return [((), message_cleaner.pending_deletions)]
+
+
+registry.gauge("baraholka_message_cleaner_pending", "Запланированные удаления сообщений", collect=_pending_deletions)
+
+
+class MetricsServer:
+    """HTTP-сервер /metrics на METRICS_HOST:METRICS_PORT (METRICS_PORT = 0 - выключен)"""
+
+    def __init__(self):
+        self._runner: Optional[web.AppRunner] = None
+        self._fsm_gauge: Optional[Gauge] = None
+
+    def watch_fsm(self, storage):
+        """Считать пользователей по состояниям FSM (MemoryStorage; другие хранилища пропускаются)"""
+        records = getattr(storage, "storage", None)
+        if records is None or self._fsm_gauge is not None:
+            return
+
+        def collect():
+            counts: Dict[str, int] = {}
+            for record in list(records.values()):
+                if record.state:
+                    counts[record.state] = counts.get(record.state, 0) + 1
+            return [((state,), count) for state, count in counts.items()]
+
+        self._fsm_gauge = registry.gauge("baraholka_fsm_states", "Пользователи в состояниях FSM", ("state",), collect)
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        return web.Response(body=registry.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+    async def start(self):
+        if config.METRICS_PORT <= 0 or self._runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, config.METRICS_HOST, config.METRICS_PORT).start()
+        except OSError as e:
+            logging.error(f"❌ Не удалось открыть порт метрик {config.METRICS_HOST}:{config.METRICS_PORT}: {e}")
+            await runner.cleanup()
+            return
+        self._runner = runner
+        logging.info(f"📈 Метрики: http://{config.METRICS_HOST}:{config.METRICS_PORT}/metrics")
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+# Глобальный экземпляр
+metrics_server = MetricsServer()
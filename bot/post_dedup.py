@@ -0,0 +1,254 @@
+"""
+Поиск повторных объявлений по отпечаткам фото и текста.
+
+Отпечаток поста - file_unique_id фото (одинаков для одного и того же файла у любых ботов
+и пользователей) и MinHash-сигнатура множества слов заголовка с описанием.
+Индекс отпечатков активных объявлений держится в памяти: фото ищется по словарю,
+текст - через LSH: сигнатура режется на полосы, и сверяются только посты,
+совпавшие с запросом хотя бы в одной полосе, а не весь индекс.
+"""
+import asyncio
+import hashlib
+import logging
+import operator
+from array import array
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from sqlalchemy import select, update
+
+from config import config
+from database import AsyncSessionLocal, Post
+from post_search import tokenize
+
+# 16 хэшей по 32 бита: 4 полосы по 4 хэша. Пост с оценкой сходства 0.8 попадает
+# в кандидаты с вероятностью 1 - (1 - 0.8 ** 4) ** 4 ~ 0.88, с 0.9 - ~ 0.99,
+# а случайный пост со сходством 0.2 - с вероятностью ~ 0.006
+NUM_HASHES = 16
+BANDS = 4
+ROWS = NUM_HASHES // BANDS
+
+# Слишком короткий текст дает неустойчивую сигнатуру - такие посты сверяем только по фото
+MIN_FEATURES = 4
+
+# Шаблонный текст ("продаю, торг, самовывоз") собирает в одной корзине тысячи постов.
+# Из такой корзины сверяются только самые свежие посты, чтобы проверка оставалась быстрой
+MAX_BUCKET_SCAN = 32
+
+LOAD_BATCH = 5000
+
+@dataclass
+class DuplicateMatch:
+    post_id: int
+    user_id: int
+    reason: str  # "photo" или "text"
+    similarity: float = 1.0
+
+
+def text_features(title: str, description: str) -> Set[str]:
+    """Множество слов: перестановка слов и заголовка с описанием отпечаток не меняет"""
+    return set(tokenize(f"{title or ''} {description or ''}"))
+
+
+def minhash(features: Set[str]) -> Optional[bytes]:
+    """
+    MinHash-сигнатура: NUM_HASHES 32-битных минимумов, упакованных в bytes.
+    512-битный blake2b слова режется на 16 независимых 32-битных хэшей -
+    один вызов хэш-функции на слово вместо шестнадцати.
+    """
+    if len(features) < MIN_FEATURES:
+        return None
+    hashes = [array("I", hashlib.blake2b(feature.encode(), digest_size=NUM_HASHES * 4).digest())
+              for feature in features]
+    return array("I", map(min, zip(*hashes))).tobytes()
+
+
+def text_minhash(title: str, description: str) -> Optional[bytes]:
+    return minhash(text_features(title, description))
+
+
+def similarity(first: bytes, second: bytes) -> float:
+    """Оценка коэффициента Жаккара по доле совпавших хэшей"""
+    return sum(map(operator.eq, array("I", first), array("I", second))) / NUM_HASHES
+
+
+def _band_keys(signature: bytes) -> List[int]:
+    size = ROWS * 4
+    return [hash(signature[band * size:(band + 1) * size]) for band in range(BANDS)]
+
+
+class PostDedup:
+    """Индекс отпечатков активных объявлений"""
+
+    def __init__(self):
+        self._photos: Dict[str, Union[int, List[int]]] = {}
+        # Корзины LSH: {ключ полосы: post_id или список post_id по возрастанию}. Почти все
+        # корзины содержат один пост, поэтому список заводится только при совпадении
+        self._bands: List[Dict[int, Union[int, List[int]]]] = [{} for _ in range(BANDS)]
+        # {post_id: (user_id, file_unique_id, сигнатура)}
+        self._posts: Dict[int, Tuple[int, Optional[str], Optional[bytes]]] = {}
+        self._loaded = False
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._posts)
+
+    def add(self, post_id: int, user_id: int, photo_unique_id: Optional[str], signature: Optional[bytes]):
+        self.remove(post_id)
+        self._posts[post_id] = (user_id, photo_unique_id, signature)
+        if photo_unique_id:
+            self._put(self._photos, photo_unique_id, post_id)
+        if signature:
+            for band, key in enumerate(_band_keys(signature)):
+                self._put(self._bands[band], key, post_id)
+
+    def remove(self, post_id: int):
+        """Убирает пост из индекса (продан, снят по сроку)"""
+        entry = self._posts.pop(post_id, None)
+        if entry is None:
+            return
+        _, photo_unique_id, signature = entry
+        if photo_unique_id:
+            self._discard(self._photos, photo_unique_id, post_id)
+        if signature:
+            for band, key in enumerate(_band_keys(signature)):
+                self._discard(self._bands[band], key, post_id)
+
+    def remove_many(self, post_ids):
+        for post_id in post_ids:
+            self.remove(post_id)
+
+    @staticmethod
+    def _put(buckets: dict, key, post_id: int):
+        # Посты добавляются по возрастанию id, так что хвост списка - самые свежие
+        bucket = buckets.get(key)
+        if bucket is None:
+            buckets[key] = post_id
+        elif isinstance(bucket, list):
+            bucket.append(post_id)
+        elif bucket != post_id:
+            buckets[key] = [bucket, post_id]
+
+    @staticmethod
+    def _discard(buckets: dict, key, post_id: int):
+        bucket = buckets.get(key)
+        if bucket == post_id:
+            del buckets[key]
+        elif isinstance(bucket, list) and post_id in bucket:
+            bucket.remove(post_id)
+            if len(bucket) == 1:
+                buckets[key] = bucket[0]
+
+    @staticmethod
+    def _members(buckets: dict, key, limit: int = None) -> list:
+        bucket = buckets.get(key)
+        if bucket is None:
+            return []
+        if isinstance(bucket, list):
+            return bucket[-limit:] if limit else bucket
+        return [bucket]
+
+    def find(self, user_id: int, photo_unique_id: Optional[str], signature: Optional[bytes],
+             min_similarity: float = None) -> Optional[DuplicateMatch]:
+        """
+        Ищет повтор в индексе. Совпадения у того же продавца важнее чужих:
+        свой повтор отклоняется, чужой только отмечается.
+        """
+        if min_similarity is None:
+            min_similarity = config.DEDUP_MIN_SIMILARITY
+
+        matches = []
+        if photo_unique_id:
+            for post_id in self._members(self._photos, photo_unique_id):
+                matches.append(DuplicateMatch(post_id, self._posts[post_id][0], "photo"))
+
+        if signature:
+            candidates = set()
+            for band, key in enumerate(_band_keys(signature)):
+                candidates.update(self._members(self._bands[band], key, MAX_BUCKET_SCAN))
+            query = array("I", signature)
+            for post_id in candidates:
+                post_user_id, _, other_signature = self._posts[post_id]
+                score = sum(map(operator.eq, query, array("I", other_signature))) / NUM_HASHES
+                if score >= min_similarity:
+                    matches.append(DuplicateMatch(post_id, post_user_id, "text", score))
+
+        if not matches:
+            return None
+        return min(matches, key=lambda match: (match.user_id != user_id, -match.similarity, -match.post_id))
+
+    async def ensure_loaded(self):
+        """Строит индекс из активных постов при первом обращении"""
+        if self._loaded:
+            return
+        async with self._lock:
+            if self._loaded:
+                return
+            await self._load()
+            self._loaded = True
+
+    async def warm_up(self):
+        """Строит индекс заранее, чтобы первая публикация не ждала загрузки"""
+        try:
+            await self.ensure_loaded()
+        except Exception as e:
+            logging.error(f"Ошибка построения индекса дубликатов: {e}", exc_info=True)
+
+    def start(self):
+        """Строит индекс в фоне, не задерживая запуск бота"""
+        if not self._loaded and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self.warm_up())
+
+    async def stop(self):
+        # Недостроенный индекс достроится при первой проверке: add() повторно добавлять можно
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _load(self):
+        last_id = 0
+        backfilled = 0
+        async with AsyncSessionLocal() as session:
+            while True:
+                stmt = (
+                    select(Post.id, Post.user_id, Post.photo_unique_id, Post.text_minhash,
+                           Post.title, Post.description)
+                    .where(Post.status == "active", Post.id > last_id)
+                    .order_by(Post.id)
+                    .limit(LOAD_BATCH)
+                )
+                rows = (await session.execute(stmt)).all()
+                if not rows:
+                    break
+
+                # Постам, созданным до появления отпечатков, сигнатура считается один раз и сохраняется
+                missing = []
+                for post_id, user_id, photo_unique_id, signature, title, description in rows:
+                    if signature is None:
+                        signature = text_minhash(title, description)
+                        if signature is not None:
+                            missing.append({"id": post_id, "text_minhash": signature})
+                    self.add(post_id, user_id, photo_unique_id, signature)
+
+                if missing:
+                    # ORM bulk UPDATE по первичному ключу - один executemany на пачку
+                    await session.execute(update(Post), missing)
+                    await session.commit()
+                    backfilled += len(missing)
+                last_id = rows[-1][0]
+
+        logging.info(f"Индекс дубликатов построен: постов={len(self)}, досчитано сигнатур={backfilled}")
+
+    async def check(self, user_id: int, data: dict) -> Optional[DuplicateMatch]:
+        """Проверяет данные формы объявления на повтор среди активных постов"""
+        await self.ensure_loaded()
+        return self.find(user_id, data.get('photo_unique_id'), text_minhash(data['title'], data['description']))
+
+
+# Глобальный экземпляр
+post_dedup = PostDedup()
@@ -0,0 +1,259 @@
+"""
+Жизненный цикл объявлений в канале: продажа, поднятие и автоархивация.
+Хранит ID сообщений в канале и периодически снимает неактуальные посты пачками.
+"""
+import asyncio
+import datetime
+import html
+import logging
+from typing import List, Optional
+
+from aiogram import Bot
+from sqlalchemy import select, update, func
+
+from config import config
+from database import AsyncSessionLocal, Post, User
+from services import UserService, PostService
+from post_search import post_search
+from post_dedup import post_dedup
+
+# Статусы объявлений
+POST_ACTIVE = "active"
+POST_SOLD = "sold"
+POST_EXPIRED = "expired"
+
+
+class PostLifecycle:
+    """Управляет статусами объявлений и их сообщениями в канале"""
+
+    def __init__(self):
+        self.user_service = UserService()
+        self.post_service = PostService()
+        self._sweeper_task: Optional[asyncio.Task] = None
+        self._legacy_backfilled = False
+
+    async def get_user_active_posts(self, user_id: int, limit: int = 20) -> List[Post]:
+        """Активные объявления пользователя, новые сверху"""
+        async with AsyncSessionLocal() as session:
+            stmt = (
+                select(Post)
+                .where(Post.user_id == user_id, Post.status == POST_ACTIVE)
+                .order_by(Post.created_at.desc())
+                .limit(limit)
+            )
+            result = await session.execute(stmt)
+            return result.scalars().all()
+
+    async def get_post(self, post_id: int) -> Optional[Post]:
+        async with AsyncSessionLocal() as session:
+            return await session.get(Post, post_id)
+
+    async def mark_sold(self, bot: Bot, post_id: int, user_id: int) -> bool:
+        """Помечает объявление проданным и обновляет сообщение в канале"""
+        async with AsyncSessionLocal() as session:
+            post = await session.get(Post, post_id)
+            if not post or post.user_id != user_id or post.status != POST_ACTIVE:
+                return False
+
+            await self._retire_channel_message(bot, post, POST_SOLD)
+            post.status = POST_SOLD
+            post.pinned = False
+            await session.commit()
+        post_search.invalidate()
+        post_dedup.remove(post_id)
+
+        logging.info(f"Объявление продано: PostID={post_id}, UserID={user_id}")
+        return True
+
+    async def bump_post(self, bot: Bot, post_id: int, user_id: int) -> tuple:
+        """
+        Поднимает объявление: публикует его заново и удаляет старое сообщение.
+        Подчиняется тем же кулдаунам, что и новая публикация.
+
+        Returns:
+            (успех, оставшийся кулдаун в минутах)
+        """
+        async with AsyncSessionLocal() as session:
+            post = await session.get(Post, post_id)
+            if not post or post.user_id != user_id or post.status != POST_ACTIVE:
+                return False, 0
+
+            user = await session.get(User, user_id)
+            cooldown = await self.user_service._calculate_cooldown(user)
+            if cooldown > 0:
+                return False, cooldown
+
+            post_data = {
+                'photo_ids': [post.photo_id],
+                'title': post.title,
+                'price': post.price,
+                'description': post.description,
+                'username': user.username,
+                'user_id': user_id
+            }
+            new_message_id = await self.post_service.publish_to_channel(post_data, user.privilege)
+
+            # Старое сообщение убираем только после успешной публикации нового
+            if post.channel_message_id:
+                await self._delete_channel_message(bot, post)
+
+            now = datetime.datetime.now()
+            post.channel_message_id = new_message_id
+            post.pinned = user.privilege == "ultra_seller"
+            post.bumped_at = now
+            post.expires_at = now + datetime.timedelta(days=config.POST_LIFETIME_DAYS)
+            user.last_post_time = now
+            await session.commit()
+        post_search.invalidate()
+
+        logging.info(f"Объявление поднято: PostID={post_id}, UserID={user_id}, MessageID={new_message_id}")
+        return True, 0
+
+    async def sweep(self, bot: Bot) -> int:
+        """
+        Один проход свипера: снимает истекшие объявления и просроченные закрепы.
+        Работает пачками по POST_SWEEP_BATCH, чтобы не держать длинные транзакции.
+
+        Returns:
+            Количество снятых объявлений
+        """
+        now = datetime.datetime.now()
+        expired_total = 0
+
+        if not self._legacy_backfilled:
+            await self._backfill_expires_at()
+            self._legacy_backfilled = True
+
+        while True:
+            async with AsyncSessionLocal() as session:
+                stmt = (
+                    select(Post)
+                    .where(Post.status == POST_ACTIVE, Post.expires_at <= now)
+                    .order_by(Post.expires_at)
+                    .limit(config.POST_SWEEP_BATCH)
+                )
+                result = await session.execute(stmt)
+                posts = result.scalars().all()
+                if not posts:
+                    break
+
+                for post in posts:
+                    await self._retire_channel_message(bot, post, POST_EXPIRED)
+
+                # Одним UPDATE на всю пачку
+                await session.execute(
+                    update(Post)
+                    .where(Post.id.in_([post.id for post in posts]))
+                    .values(status=POST_EXPIRED, pinned=False)
+                )
+                await session.commit()
+                post_dedup.remove_many(post.id for post in posts)
+                expired_total += len(posts)
+
+            if len(posts) < config.POST_SWEEP_BATCH:
+                break
+
+        await self._unpin_stale(bot, now)
+
+        if expired_total:
+            post_search.invalidate()
+            logging.info(f"Свипер: снято объявлений: {expired_total}")
+        return expired_total
+
+    async def _backfill_expires_at(self):
+        """Проставляет срок жизни постам, созданным до появления колонки expires_at"""
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(Post)
+                .where(Post.status == POST_ACTIVE, Post.expires_at.is_(None))
+                .values(expires_at=func.datetime(Post.created_at, f"+{config.POST_LIFETIME_DAYS} days"))
+            )
+            await session.commit()
+
+    async def _unpin_stale(self, bot: Bot, now: datetime.datetime):
+        """Снимает закреп ULTRA SELLER по истечении PIN_DURATION_HOURS"""
+        pin_deadline = now - datetime.timedelta(hours=config.PIN_DURATION_HOURS)
+        async with AsyncSessionLocal() as session:
+            stmt = (
+                select(Post)
+                .where(
+                    Post.status == POST_ACTIVE,
+                    Post.pinned == True,
+                    func.coalesce(Post.bumped_at, Post.created_at) <= pin_deadline
+                )
+                .limit(config.POST_SWEEP_BATCH)
+            )
+            result = await session.execute(stmt)
+            posts = result.scalars().all()
+            if not posts:
+                return
+
+            for post in posts:
+                await self._unpin(bot, post)
+
+            await session.execute(
+                update(Post).where(Post.id.in_([post.id for post in posts])).values(pinned=False)
+            )
+            await session.commit()
+
+    async def _retire_channel_message(self, bot: Bot, post: Post, status: str):
+        """Убирает объявление из канала: редактирует подпись или удаляет сообщение"""
+        if not post.channel_message_id or not config.CHANNEL_ID:
+            return
+
+        if post.pinned:
+            await self._unpin(bot, post)
+
+        if config.POST_EXPIRE_ACTION == "delete" and status == POST_EXPIRED:
+            await self._delete_channel_message(bot, post)
+            return
+
+        marker = "✅ <b>ПРОДАНО</b>" if status == POST_SOLD else "⛔ <b>Объявление неактуально</b>"
+        try:
+            await bot.edit_message_caption(
+                chat_id=config.CHANNEL_ID,
+                message_id=post.channel_message_id,
+                caption=f"{marker}\n\n📦 {html.escape(post.title or '')}",
+                reply_markup=None,
+                parse_mode="HTML"
+            )
+        except Exception as e:
+            logging.debug(f"Не удалось отредактировать пост {post.id} в канале: {e}")
+
+    async def _delete_channel_message(self, bot: Bot, post: Post):
+        try:
+            await bot.delete_message(chat_id=config.CHANNEL_ID, message_id=post.channel_message_id)
+        except Exception as e:
+            logging.debug(f"Не удалось удалить пост {post.id} из канала: {e}")
+
+    async def _unpin(self, bot: Bot, post: Post):
+        try:
+            await bot.unpin_chat_message(chat_id=config.CHANNEL_ID, message_id=post.channel_message_id)
+        except Exception as e:
+            logging.debug(f"Не удалось открепить пост {post.id}: {e}")
+
+    async def _sweeper_loop(self, bot: Bot):
+        while True:
+            try:
+                await self.sweep(bot)
+            except Exception as e:
+                logging.error(f"Ошибка свипера объявлений: {e}", exc_info=True)
+            await asyncio.sleep(config.POST_SWEEP_INTERVAL)
+
+    def start_sweeper(self, bot: Bot):
+        """Запускает фоновый свипер (повторный вызов ничего не делает)"""
+        if self._sweeper_task is None or self._sweeper_task.done():
+            self._sweeper_task = asyncio.create_task(self._sweeper_loop(bot))
+
+    async def stop_sweeper(self):
+        if self._sweeper_task:
+            self._sweeper_task.cancel()
+            try:
+                await self._sweeper_task
+            except asyncio.CancelledError:
+                pass
+            self._sweeper_task = None
+
+
+# Глобальный экземпляр
+post_lifecycle = PostLifecycle()
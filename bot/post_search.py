@@ -0,0 +1,271 @@
+"""
+Полнотекстовый поиск по активным объявлениям (SQLite FTS5).
+
+Совпадения берутся окнами по CANDIDATE_WINDOW от новых к старым, и внутри окна
+ранжируются по BM25-подобной оценке (заголовок весит больше описания). Когда окно
+пролистано, выдача продолжается следующим, более старым окном - так доступны все
+совпадения, а стоимость запроса по частому слову остается ограниченной.
+Встроенный bm25() не используется: для подсчета IDF он обходит весь doclist
+каждого слова, и запрос по частому слову на миллионе постов стоит десятки мс.
+Пагинация - keyset: границы окна (id) и пара (score, id) внутри него. Границы
+запоминаются в курсоре после первой выборки окна, так что все страницы одного окна
+ранжируют один и тот же набор кандидатов, даже если между ними вышли новые посты.
+"""
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Hashable, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from database import AsyncSessionLocal
+
+# Максимум слов в запросе: длинные запросы почти ничего не находят, но дорого считаются
+MAX_QUERY_TERMS = 8
+PAGE_SIZE = 10
+
+# Сколько совпадений ранжировать за раз. FTS5 обходит doclist по убыванию rowid
+# и останавливается на лимите, поэтому стоимость запроса ограничена даже для частых слов
+CANDIDATE_WINDOW = 300
+# Границы еще не выбранного окна: [0, NEWEST) - окно берет CANDIDATE_WINDOW самых свежих
+NEWEST = 2 ** 63 - 1
+# Окно: [нижняя граница id, верхняя граница id)
+Window = Tuple[int, int]
+
+# Префиксный поиск дешев только для длин, покрытых prefix-индексом (см. POSTS_FTS_DDL)
+MAX_PREFIX_LENGTH = 4
+
+TITLE_WEIGHT = 5.0
+DESCRIPTION_WEIGHT = 1.0
+BM25_K1 = 1.2
+BM25_B = 0.75
+AVG_TITLE_TERMS = 4.0
+AVG_DESCRIPTION_TERMS = 25.0
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+CANDIDATES_SQL = """
+    SELECT p.id, p.user_id, p.photo_id, p.title, p.price, p.description, p.channel_message_id
+    FROM (
+        SELECT rowid FROM posts_fts
+        WHERE posts_fts MATCH :match AND rowid >= :from_id AND rowid < :before_id
+        ORDER BY rowid DESC
+        LIMIT :window
+    ) AS f
+    JOIN posts p ON p.id = f.rowid
+"""
+
+# Свежие активные объявления (пустой inline-запрос), keyset по id
+LATEST_SQL = """
+    SELECT id, user_id, photo_id, title, price, description, channel_message_id
+    FROM posts
+    WHERE status = 'active' AND id < :before_id
+    ORDER BY id DESC
+    LIMIT :limit
+"""
+
+
+@dataclass
+class SearchHit:
+    id: int
+    user_id: int
+    photo_id: str
+    title: str
+    price: str
+    description: str
+    channel_message_id: Optional[int] = None
+    score: float = 0.0
+
+
+def tokenize(value: str) -> List[str]:
+    return _TOKEN_RE.findall((value or "").lower())
+
+
+def normalize_query(query: str) -> str:
+    """Нормализованный запрос: те же слова, что уйдут в FTS5 (ключ кэша)"""
+    return " ".join(tokenize(query)[:MAX_QUERY_TERMS])
+
+
+def build_match_query(terms: List[str]) -> Optional[str]:
+    """
+    Превращает слова запроса в безопасное FTS5-выражение.
+    Каждое слово экранируется кавычками, слова объединяются через AND.
+    Последнее короткое слово ищется по префиксу (ввод "на лету": "vap" -> vaporesso).
+    """
+    if not terms:
+        return None
+    phrases = [f'"{term}"' for term in terms]
+    if len(terms[-1]) <= MAX_PREFIX_LENGTH:
+        phrases[-1] += "*"
+    return " ".join(phrases)
+
+
+def compile_term_patterns(terms: List[str]) -> List[re.Pattern]:
+    """Регулярки для подсчета вхождений слов запроса; последнее короткое слово - по префиксу"""
+    patterns = []
+    for index, term in enumerate(terms):
+        is_prefix = index == len(terms) - 1 and len(term) <= MAX_PREFIX_LENGTH
+        patterns.append(re.compile(r"\b" + re.escape(term) + (r"\w*" if is_prefix else r"\b")))
+    return patterns
+
+
+def _field_score(value: str, patterns: List[re.Pattern], avg_length: float) -> float:
+    if not value:
+        return 0.0
+    value = value.lower()
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * len(value.split()) / avg_length)
+    score = 0.0
+    for pattern in patterns:
+        tf = len(pattern.findall(value))
+        if tf:
+            score += tf * (BM25_K1 + 1) / (tf + norm)
+    return score
+
+
+def score_hit(hit: SearchHit, patterns: List[re.Pattern]) -> float:
+    """BM25-оценка кандидата; IDF опущен - в AND-запросе все кандидаты содержат все слова"""
+    return (TITLE_WEIGHT * _field_score(hit.title, patterns, AVG_TITLE_TERMS)
+            + DESCRIPTION_WEIGHT * _field_score(hit.description, patterns, AVG_DESCRIPTION_TERMS))
+
+
+def encode_cursor(window: Window, hit: SearchHit) -> str:
+    """Курсор следующей страницы: границы окна, оценка и id последнего результата"""
+    from_id, before_id = window
+    return f"{from_id}:{before_id}:{round(hit.score, 6)}:{hit.id}"
+
+
+def decode_cursor(cursor: Optional[str]) -> Tuple[Window, Optional[Tuple[float, int]]]:
+    """Окно и позиция в нем; пустой или битый курсор означает первую страницу"""
+    if cursor:
+        try:
+            from_id, before_id, score, post_id = cursor.split(":", 3)
+            return (int(from_id), int(before_id)), (float(score), int(post_id))
+        except ValueError:
+            pass
+    return (0, NEWEST), None
+
+
+def rank_window(hits: List[SearchHit], patterns: List[re.Pattern],
+                after: Optional[Tuple[float, int]] = None) -> List[SearchHit]:
+    """Ранжирует кандидатов одного окна и отбрасывает уже показанных (до позиции after)"""
+    for hit in hits:
+        hit.score = round(score_hit(hit, patterns), 6)
+    # Более релевантные выше; при равной оценке - более свежие
+    hits.sort(key=lambda hit: (-hit.score, -hit.id))
+    if after:
+        after_score, after_id = after
+        hits = [hit for hit in hits if (-hit.score, -hit.id) > (-after_score, -after_id)]
+    return hits
+
+
+def collect_page(page: List[Tuple[Window, SearchHit]], window: Window, hits: List[SearchHit],
+                 patterns: List[re.Pattern], after: Optional[Tuple[float, int]], limit: int) -> Optional[Window]:
+    """
+    Добавляет в страницу результаты выбранного окна (с его границами - для курсора).
+
+    Returns:
+        следующее окно или None, если страница собрана (с одним лишним
+        результатом - признаком следующей страницы) или совпадения кончились
+    """
+    from_id, before_id = window
+    if hits:
+        # Фактические границы выбранного окна: новые посты и посты старше него в окно не попадут.
+        # Неполное окно без нижней границы - последнее, ниже него совпадений нет
+        if not from_id and len(hits) == CANDIDATE_WINDOW:
+            from_id = min(hit.id for hit in hits)
+        window = (from_id, max(hit.id for hit in hits) + 1)
+    page.extend((window, hit) for hit in rank_window(hits, patterns, after)[:limit + 1 - len(page)])
+    if len(page) > limit or not from_id:
+        return None
+    return 0, from_id
+
+
+def finish_page(page: List[Tuple[Window, SearchHit]], limit: int) -> Tuple[List[SearchHit], Optional[str]]:
+    next_cursor = encode_cursor(*page[limit - 1]) if len(page) > limit else None
+    return [hit for _, hit in page[:limit]], next_cursor
+
+
+class ResultsCache:
+    """LRU-кэш с ограничением по времени жизни записей"""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable):
+        item = self._items.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._items[key]
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key: Hashable, value: Any):
+        self._items[key] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(key)
+        if len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class PostSearch:
+    def __init__(self):
+        # Кэш готовых страниц inline-выдачи: {(нормализованный запрос, offset): ответ}
+        self.inline_cache = ResultsCache(max_size=1024, ttl=60)
+
+    def invalidate(self):
+        """Сбрасывает кэш выдачи после изменения набора активных объявлений"""
+        self.inline_cache.clear()
+
+    async def latest(self, cursor: str = None, limit: int = PAGE_SIZE) -> Tuple[List[SearchHit], Optional[str]]:
+        """Свежие активные объявления; курсор - id последнего показанного поста"""
+        before_id = int(cursor) if cursor and cursor.isdigit() else 2 ** 63 - 1
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(text(LATEST_SQL), {"before_id": before_id, "limit": limit + 1})
+            hits = [SearchHit(*row) for row in result.all()]
+
+        next_cursor = str(hits[limit - 1].id) if len(hits) > limit else None
+        return hits[:limit], next_cursor
+
+    async def search(self, query: str, cursor: str = None,
+                     limit: int = PAGE_SIZE) -> Tuple[List[SearchHit], Optional[str]]:
+        """
+        Ищет активные объявления.
+
+        Returns:
+            (результаты страницы, курсор следующей страницы или None)
+        """
+        terms = tokenize(query)[:MAX_QUERY_TERMS]
+        match = build_match_query(terms)
+        if not match:
+            return [], None
+
+        patterns = compile_term_patterns(terms)
+        window, after = decode_cursor(cursor)
+        page: List[Tuple[Window, SearchHit]] = []
+        async with AsyncSessionLocal() as session:
+            # Окно за окном, пока не наберется страница; обычно хватает одного
+            while window is not None:
+                result = await session.execute(text(CANDIDATES_SQL), {
+                    "match": match, "from_id": window[0], "before_id": window[1], "window": CANDIDATE_WINDOW
+                })
+                hits = [SearchHit(*row) for row in result.all()]
+                window, after = collect_page(page, window, hits, patterns, after, limit), None
+
+        return finish_page(page, limit)
+
+
+# Глобальный экземпляр
+post_search = PostSearch()
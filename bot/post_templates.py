@@ -0,0 +1,145 @@
+"""
+Подписи объявлений (канал и превью перед публикацией).
+
+Подпись собирается одной f-строкой. Пользовательский текст экранируется, а описание
+обрезается так, чтобы подпись гарантированно укладывалась в лимит Telegram на подпись
+к фото. Точный подсчет видимой длины нужен только длинным постам: обычный пост
+проверяется оценкой сверху без кодирования текста.
+"""
+import html
+import re
+from typing import Optional
+
+from privilege_catalogue import privilege_catalogue
+
+# Лимит подписи к фото; Telegram считает символы после разбора HTML в UTF-16
+CAPTION_LIMIT = 1024
+MAX_TITLE_LENGTH = 100
+ELLIPSIS = "…"
+
+PRIVILEGE_EMOJI = {
+    "user": "👤",
+    "vip": "💎",
+    "premium": "⭐",
+    "god": "👑",
+    "ultra_seller": "🔥"
+}
+
+SEPARATOR = "━━━━━━━━━━━━━━━━━━━━"
+
+CONTACT_BUTTON = "\n💬 <b>Написать продавцу:</b> Нажмите кнопку ниже ⬇️"
+
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def escape(value: str) -> str:
+    """Экранирование для HTML parse_mode; кавычки внутри текста Telegram не требует экранировать"""
+    # Обычно экранировать нечего, а проверка вхождений дешевле трех replace в html.escape
+    if "&" in value or "<" in value or ">" in value:
+        return html.escape(value, quote=False)
+    return value
+
+
+def utf16_length(value: str) -> int:
+    return len(value.encode("utf-16-le")) // 2
+
+
+def visible_length(markup: str) -> int:
+    """Длина текста так, как ее считает Telegram: без тегов, сущности - один символ, в UTF-16"""
+    return utf16_length(html.unescape(_TAG_RE.sub("", markup)))
+
+
+def format_price_line(price: str) -> str:
+    price = price or ""
+    lowered = price.lower()
+    # "торг" и "бесплатно" показываем просто текстом, без "Цена:"
+    if lowered == "торг":
+        return "🤝 <b>Торг</b>"
+    if lowered == "бесплатно":
+        return "🎁 <b>Бесплатно</b>"
+    if price.isdigit():
+        return f"💰 <b>Цена:</b> <code>{price}</code> ₽"
+    return f"💰 <b>Цена:</b> {escape(price)}"
+
+
+def _contact_block(user_id: int, seller_username: Optional[str], include_contact_info: bool) -> str:
+    if not include_contact_info:
+        return CONTACT_BUTTON
+    text = f"\n💬 <b>Связаться с продавцом:</b>\n🆔 ID: <code>{user_id}</code>\n"
+    # Показываем username ТОЛЬКО если он валидный и не "unknown"
+    if seller_username and seller_username not in ("unknown", "без username"):
+        text += f"📛 @{escape(seller_username)}"
+    return text
+
+
+def _truncate(value: str, limit: int) -> str:
+    """Обрезает текст до limit символов UTF-16 с многоточием"""
+    if len(value) <= limit // 2:
+        # Даже если все символы суррогатные пары, текст укладывается - кодировать не нужно
+        return value
+    encoded = value.encode("utf-16-le")
+    if len(encoded) // 2 <= limit:
+        return value
+    if limit <= 0:
+        return ""
+    # errors="ignore" отбрасывает суррогатную половинку, разрезанную на границе
+    return encoded[:(limit - 1) * 2].decode("utf-16-le", errors="ignore").rstrip() + ELLIPSIS
+
+
+def _render(title: str, price_line: str, description: str, emoji: str, label: str, contact: str) -> str:
+    return f"""
+{SEPARATOR}
+<b>📦 {title}</b>
+{SEPARATOR}
+
+{price_line}
+
+{SEPARATOR}
+<b>📝 Описание:</b>
+{SEPARATOR}
+
+{description}
+
+{SEPARATOR}
+{emoji} <b>Статус продавца:</b> {label}
+{SEPARATOR}
+{contact}"""
+
+
+# Оценка сверху для всего, кроме пользовательского текста: разметка шаблона в UTF-16 (она не
+# короче видимого текста) с самыми длинными вариантами цены, эмодзи и блока контактов
+_FIXED_LENGTH_BOUND = utf16_length(_render("", format_price_line("x"), "", "⭐" * 2, "",
+                                           _contact_block(-10 ** 19, "x", True)))
+
+
+def render_post_caption(post_data: dict, privilege: str, seller_username: Optional[str] = None,
+                        include_contact_info: bool = False) -> str:
+    """
+    Подпись объявления.
+
+    Args:
+        post_data: данные формы (title, price, description, user_id)
+        privilege: привилегия продавца
+        seller_username: username уже загруженного продавца (нужен только с include_contact_info)
+        include_contact_info: контакты текстом, если кнопку связи создать нельзя
+    """
+    title = _truncate(post_data.get('title') or "", MAX_TITLE_LENGTH)
+    description = post_data.get('description') or ""
+    price = post_data.get('price') or ""
+    label = (privilege_catalogue.get(privilege) or {}).get("label") or privilege.upper()
+    emoji = PRIVILEGE_EMOJI.get(privilege, "⭐")
+    contact = _contact_block(post_data.get('user_id'), seller_username, include_contact_info) \
+        if include_contact_info else CONTACT_BUTTON
+    title_html, price_line, label_html = escape(title), format_price_line(price), escape(label)
+    caption = _render(title_html, price_line, escape(description), emoji, label_html, contact)
+
+    # Символ занимает не больше двух единиц UTF-16, так что обычный пост не нужно ни мерить, ни резать
+    user_text = len(title) + len(description) + len(price) + len(label) + len(seller_username or "")
+    if _FIXED_LENGTH_BOUND + 2 * user_text <= CAPTION_LIMIT:
+        return caption
+    excess = visible_length(caption) - CAPTION_LIMIT
+    if excess <= 0:
+        return caption
+    # Все, кроме описания, имеет ограниченную длину - описание отдает лишнее
+    description = _truncate(description, utf16_length(description) - excess)
+    return _render(title_html, price_line, escape(description), emoji, label_html, contact)
@@ -0,0 +1,150 @@
+"""
+Каталог привилегий: цены и кулдауны.
+
+Рабочие значения хранятся в таблице privileges; config.PRIVILEGES - только значения по
+умолчанию, которыми таблица наполняется при первом запуске. Каждое изменение из админки
+увеличивает номер версии каталога (колонка version, общий счетчик по таблице).
+
+Процесс держит снимок каталога в памяти - неизменяемый словарь, который целиком
+заменяется новым, так что читатели (проверка кулдауна, клавиатуры, шаблоны постов)
+никогда не видят каталог наполовину обновленным и не ходят в БД. Снимок перечитывается
+после своих изменений и в фоне, раз в PRIVILEGE_REFRESH_SECONDS секунд, если версия
+в БД изменилась (изменение из другого процесса).
+
+Кэши, собранные из каталога, сравнивают privilege_catalogue.version со своей версией.
+"""
+import asyncio
+import logging
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.sqlite import insert
+
+from config import config
+from database import AsyncSessionLocal, PrivilegeSetting
+
+
+def _freeze(privileges: dict) -> Mapping[str, Mapping]:
+    return MappingProxyType({key: MappingProxyType(dict(info)) for key, info in privileges.items()})
+
+
+class PrivilegeCatalogue:
+    def __init__(self):
+        # До загрузки из БД работают значения по умолчанию
+        self._snapshot: Mapping[str, Mapping] = _freeze(config.PRIVILEGES)
+        self._version = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def privileges(self) -> Mapping[str, Mapping]:
+        """Текущий снимок: {привилегия: {"label", "price", "cooldown"}} в порядке меню"""
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get(self, key: str) -> Optional[Mapping]:
+        return self._snapshot.get(key)
+
+    async def load(self):
+        """Наполняет таблицу значениями по умолчанию (только недостающие привилегии) и читает снимок"""
+        rows = [
+            {"key": key, "label": info["label"], "price": info["price"], "cooldown": info["cooldown"],
+             "position": position, "version": 0}
+            for position, (key, info) in enumerate(config.PRIVILEGES.items())
+        ]
+        try:
+            async with AsyncSessionLocal() as session:
+                await session.execute(insert(PrivilegeSetting).on_conflict_do_nothing(), rows)
+                await session.commit()
+            await self._reload()
+            logging.info(f"Каталог привилегий загружен: версия {self._version}, привилегий {len(self._snapshot)}")
+        except Exception as e:
+            logging.error(f"Ошибка загрузки каталога привилегий, работают значения по умолчанию: {e}", exc_info=True)
+
+    async def _reload(self):
+        async with AsyncSessionLocal() as session:
+            settings = (await session.execute(
+                select(PrivilegeSetting).order_by(PrivilegeSetting.position, PrivilegeSetting.key)
+            )).scalars().all()
+
+        version = max((setting.version for setting in settings), default=0)
+        snapshot = _freeze({
+            setting.key: {"cooldown": setting.cooldown, "price": setting.price, "label": setting.label}
+            for setting in settings
+        })
+        # Снимок и версия заменяются вместе, без await между ними
+        self._snapshot, self._version = snapshot, version
+
+    async def refresh(self) -> bool:
+        """Перечитывает снимок, если версия каталога в БД изменилась; True - снимок обновлен"""
+        async with AsyncSessionLocal() as session:
+            version = await session.scalar(select(func.max(PrivilegeSetting.version)))
+        if (version or 0) == self._version:
+            return False
+        await self._reload()
+        return True
+
+    async def update(self, key: str, price: int = None, cooldown: int = None) -> Optional[Mapping]:
+        """
+        Меняет цену и/или кулдаун привилегии и поднимает версию каталога.
+
+        Returns:
+            новые значения привилегии или None, если привилегии нет
+        """
+        values = {}
+        if price is not None:
+            values["price"] = price
+        if cooldown is not None:
+            values["cooldown"] = cooldown
+        if not values:
+            return self.get(key)
+
+        # Новая версия вычисляется в том же UPDATE - SQLite выполняет записи последовательно,
+        # так что два процесса не получат одинаковый номер
+        next_version = select(func.coalesce(func.max(PrivilegeSetting.version), 0) + 1).scalar_subquery()
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                update(PrivilegeSetting)
+                .where(PrivilegeSetting.key == key)
+                .values(version=next_version, **values)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        if not result.rowcount:
+            return None
+
+        await self._reload()
+        logging.info(f"Привилегия {key} изменена: {values}, версия каталога {self._version}")
+        return self.get(key)
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(config.PRIVILEGE_REFRESH_SECONDS)
+            try:
+                if await self.refresh():
+                    logging.info(f"Каталог привилегий обновлен до версии {self._version}")
+            except Exception as e:
+                logging.error(f"Ошибка обновления каталога привилегий: {e}")
+
+    def start(self):
+        """Запускает фоновую проверку версии каталога (PRIVILEGE_REFRESH_SECONDS = 0 - отключена)"""
+        if config.PRIVILEGE_REFRESH_SECONDS <= 0:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Глобальный экземпляр
+privilege_catalogue = PrivilegeCatalogue()
@@ -0,0 +1,179 @@
+"""
+Профилировщик SQL: число и время запросов на уровне движка SQLAlchemy.
+
+События before_cursor_execute/after_cursor_execute движка из database.py засекают каждый
+запрос. Время и число запросов относятся:
+    - к текущему трейсу (QueryTrace в contextvar current_trace) - handler_profiler заводит
+      трейс на каждый апдейт и подписывает его именем обработчика;
+    - к тексту запроса - сводка самых дорогих запросов пишется в лог вместе со сводкой
+      обработчиков.
+
+Запросы дольше SLOW_QUERY_MS пишутся в лог с обработчиком, параметрами и планом
+EXPLAIN QUERY PLAN (план одного и того же запроса получается один раз). Параметры
+пишутся только числом и типами: в них бывают тексты сообщений тикетов и имена
+пользователей. Сами значения - только при SLOW_QUERY_LOG_PARAMS, для отладки. Время запросов
+и число медленных уходят и в метрики (metrics.py).
+"""
+import contextvars
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+
+from config import config
+from database import engine
+from metrics import db_query_seconds, db_slow_queries_total
+
+# Сколько разных текстов запросов хранить в сводке и планов - в кэше
+MAX_STATEMENTS = 500
+# Что показывать из запроса и параметров в логе
+MAX_LOGGED_CHARS = 500
+EXPLAINED_PREFIXES = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+OTHER_STATEMENTS = "<прочие запросы>"
+
+
+class QueryTrace:
+    """Запросы одной единицы работы (апдейта): сколько, за какое время и где"""
+    __slots__ = ("label", "queries", "query_seconds")
+
+    def __init__(self, label: Optional[str] = None):
+        self.label = label
+        self.queries = 0
+        self.query_seconds = 0.0
+
+
+class StatementStats:
+    __slots__ = ("count", "seconds", "max_seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+
+current_trace: contextvars.ContextVar[Optional[QueryTrace]] = contextvars.ContextVar("query_trace", default=None)
+
+
+def _shorten(value, limit: int = MAX_LOGGED_CHARS) -> str:
+    text = " ".join(str(value).split())
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+def _describe_parameters(parameters, executemany: bool) -> str:
+    """Число и типы параметров запроса, без значений (executemany - по первому набору)"""
+    rows = list(parameters) if executemany else [parameters]
+    first = rows[0] if rows else ()
+    values = first.values() if isinstance(first, dict) else first or ()
+    types = ", ".join(type(value).__name__ for value in values)
+    described = f"{len(values)} ({types})" if types else "нет"
+    return f"наборов: {len(rows)}, в каждом {described}" if executemany else described
+
+
+class QueryProfiler:
+    def __init__(self):
+        self._statements: Dict[str, StatementStats] = {}
+        self._plans: Dict[str, str] = {}
+        self.queries = 0
+        self.seconds = 0.0
+        self.slow_queries = 0
+        self._installed = False
+
+    def install(self):
+        """Подписывается на события движка БД (повторный вызов ничего не делает)"""
+        if self._installed:
+            return
+        event.listen(engine.sync_engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine.sync_engine, "after_cursor_execute", self._after_execute)
+        self._installed = True
+
+    @staticmethod
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_query_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        self.queries += 1
+        self.seconds += elapsed
+        db_query_seconds.observe(elapsed)
+
+        trace = current_trace.get()
+        if trace is not None:
+            trace.queries += 1
+            trace.query_seconds += elapsed
+
+        stats = self._statements.get(statement)
+        if stats is None:
+            key = statement if len(self._statements) < MAX_STATEMENTS else OTHER_STATEMENTS
+            stats = self._statements.get(key)
+            if stats is None:
+                stats = self._statements[key] = StatementStats()
+        stats.count += 1
+        stats.seconds += elapsed
+        if elapsed > stats.max_seconds:
+            stats.max_seconds = elapsed
+
+        if config.SLOW_QUERY_MS > 0 and elapsed * 1e3 >= config.SLOW_QUERY_MS:
+            self.slow_queries += 1
+            db_slow_queries_total.inc()
+            self._log_slow(conn, statement, parameters, executemany, elapsed, trace)
+
+    def _plan(self, conn, statement: str, parameters, executemany: bool) -> Optional[str]:
+        """EXPLAIN QUERY PLAN запроса; отдельным курсором, чтобы не трогать результат основного"""
+        if statement in self._plans:
+            return self._plans[statement]
+        if executemany or not statement.lstrip().upper().startswith(EXPLAINED_PREFIXES):
+            return None
+        try:
+            cursor = conn.connection.dbapi_connection.cursor()
+            try:
+                cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+                plan = "\n".join(f"    {row[-1]}" for row in cursor.fetchall())
+            finally:
+                cursor.close()
+        except Exception as e:
+            logging.debug(f"Не удалось получить план запроса: {e}")
+            return None
+        if len(self._plans) < MAX_STATEMENTS:
+            self._plans[statement] = plan
+        return plan
+
+    def _log_slow(self, conn, statement: str, parameters, executemany: bool, elapsed: float,
+                  trace: Optional[QueryTrace]):
+        where = trace.label if trace is not None and trace.label else "вне обработчика"
+        plan = self._plan(conn, statement, parameters, executemany)
+        if config.SLOW_QUERY_LOG_PARAMS:
+            params = _shorten(parameters, 200)
+        else:
+            params = _describe_parameters(parameters, executemany)
+        logging.warning(f"🐢 Медленный SQL-запрос {elapsed * 1e3:.0f} мс ({where}): {_shorten(statement)}"
+                        f" | параметры: {params}" + (f"\n  План:\n{plan}" if plan else ""))
+
+    def top(self, limit: int = 10) -> List[Tuple[str, int, float, float]]:
+        """[(запрос, выполнений, всего секунд, максимум секунд)] по убыванию суммарного времени"""
+        rows = [(statement, stats.count, stats.seconds, stats.max_seconds)
+                for statement, stats in self._statements.items()]
+        rows.sort(key=lambda row: -row[2])
+        return rows[:limit]
+
+    def reset(self):
+        self._statements.clear()
+        self.queries = 0
+        self.seconds = 0.0
+        self.slow_queries = 0
+
+    def report(self, limit: int = 10):
+        if not self.queries:
+            return
+        logging.info(f"🗄 SQL: {self.queries} запросов, {self.seconds:.2f} с, "
+                     f"медленных (от {config.SLOW_QUERY_MS:g} мс): {self.slow_queries}")
+        for statement, count, seconds, max_seconds in self.top(limit):
+            logging.info(f"🗄   {seconds * 1e3:10.1f} мс  {count:7} раз  макс {max_seconds * 1e3:7.1f} мс  "
+                         f"{_shorten(statement, 150)}")
+
+
+# Глобальный экземпляр
+query_profiler = QueryProfiler()
@@ -3,15 +3,46 @@
 Сервисы для работы с бизнес-логикой бота.
 Содержит классы для работы с пользователями, постами, тикетами и админ-функциями.
 """
-from aiogram import Bot
 from aiogram.types import InputMediaPhoto
 from database import AsyncSessionLocal, User, Post, Ticket, TicketMessage, Referral
 from config import config
+from privilege_catalogue import privilege_catalogue
 import datetime
 import logging
-from sqlalchemy import select, func, delete
+from sqlalchemy import select, func, update, and_, or_
 
 from simple_referral import simple_referral
+from post_search import post_search
+from post_templates import render_post_caption
+from post_dedup import post_dedup, text_minhash
+from ticket_priority import PRIORITY_NAMES, priority_name
+from chat_sessions import chat_sessions
+from telegram_api import create_bot
+from metrics import publish_in_progress
+from ticket_sla import ticket_sla
+from ticket_message_buffer import ticket_message_buffer
+from ticket_history import HISTORY_PAGE_SIZE
+
+# Тикетов на одной странице списка
+TICKETS_PAGE_SIZE = 10
+TICKET_STATUSES = ("new", "in_progress", "closed")
+
+_CURSOR_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def encode_ticket_cursor(ticket) -> str:
+    """Курсор тикета (или сообщения тикета) для callback_data: микросекунды created_at и id"""
+    microseconds = (ticket.created_at - _CURSOR_EPOCH) // datetime.timedelta(microseconds=1)
+    return f"{microseconds}.{ticket.id}"
+
+
+def decode_ticket_cursor(cursor: str):
+    """Разбирает курсор; битый курсор означает первую страницу"""
+    try:
+        microseconds, ticket_id = cursor.split(".", 1)
+        return _CURSOR_EPOCH + datetime.timedelta(microseconds=int(microseconds)), int(ticket_id)
+    except (AttributeError, ValueError):
+        return None
 
 
 class UserService:
@@ -77,7 +108,8 @@ class UserService:
     async def _calculate_cooldown(self, user):
         if user.last_post_time:
             time_passed = datetime.datetime.now() - user.last_post_time
-            cooldown_minutes = config.PRIVILEGES[user.privilege]["cooldown"]
+            # Снимок каталога в памяти - без запроса к БД
+            cooldown_minutes = privilege_catalogue.privileges[user.privilege]["cooldown"]
             remaining = cooldown_minutes - (time_passed.total_seconds() / 60)
             return max(0, int(remaining))
         return 0
@@ -164,115 +196,72 @@ class UserService:
             return result.scalar_one_or_none()
 
 
+# Бот для публикации в канал - общий для всех PostService, создается при первой публикации
+_channel_bot = None
+
+
+async def close_channel_bot():
+    """Закрывает сессию бота публикации (при остановке)"""
+    global _channel_bot
+    if _channel_bot is not None:
+        bot, _channel_bot = _channel_bot, None
+        await bot.session.close()
+
+
 class PostService:
-    def __init__(self):
-        self._bot = None
-    
     @property
     def bot(self):
         """Ленивая инициализация бота"""
-        if self._bot is None:
+        global _channel_bot
+        if _channel_bot is None:
             if not config.BOT_TOKEN:
                 raise ValueError("BOT_TOKEN не установлен! Создайте файл .env с токеном бота.")
-            self._bot = Bot(token=config.BOT_TOKEN)
-        return self._bot
+            _channel_bot = create_bot()
+        return _channel_bot
 
-    async def create_post(self, user_id: int, data: dict):
+    async def create_post(self, user_id: int, data: dict, channel_message_id: int = None, pinned: bool = False):
         async with AsyncSessionLocal() as session:
+            now = datetime.datetime.now()
             post = Post(
                 user_id=user_id,
                 photo_id=data['photo_ids'][0],  # Берем только первую фото
                 title=data['title'],
                 price=data['price'],
-                description=data['description']
+                description=data['description'],
+                created_at=now,
+                channel_message_id=channel_message_id,
+                pinned=pinned,
+                expires_at=now + datetime.timedelta(days=config.POST_LIFETIME_DAYS),
+                photo_unique_id=data.get('photo_unique_id'),
+                text_minhash=text_minhash(data['title'], data['description'])
             )
 
             user = await session.get(User, user_id)
             user.posts_count += 1
-            user.last_post_time = datetime.datetime.now()
+            user.last_post_time = now
 
             session.add(post)
             await session.commit()
+            post_search.invalidate()
+            post_dedup.add(post.id, user_id, post.photo_unique_id, post.text_minhash)
             return post
 
-    async def format_post_text(self, post_data: dict, user_privilege: str, include_contact_info: bool = False):
-        privilege_label = config.PRIVILEGES[user_privilege]["label"]
-        
-        # Определяем цвет и стиль для привилегии
-        privilege_emoji = {
-            "user": "👤",
-            "vip": "💎",
-            "premium": "⭐",
-            "god": "👑",
-            "ultra_seller": "🔥"
-        }
-        privilege_emoji_icon = privilege_emoji.get(user_privilege, "⭐")
-
-        # Форматируем цену для отображения
-        price_display = post_data['price']
-        price_line = ""
-
-        # Если цена - "торг" или "бесплатно", показываем просто текст без "Цена:"
-        if price_display.lower() == "торг":
-            price_line = "🤝 <b>Торг</b>"
-        elif price_display.lower() == "бесплатно":
-            price_line = "🎁 <b>Бесплатно</b>"
-        elif price_display.isdigit():
-            # Если цена - цифры, показываем с "Цена:"
-            price_line = f"💰 <b>Цена:</b> <code>{price_display}</code> ₽"
-        else:
-            # На всякий случай, если что-то другое
-            price_line = f"💰 <b>Цена:</b> {price_display}"
-
-        # Красивое оформление поста
-        text = f"""
-━━━━━━━━━━━━━━━━━━━━
-<b>📦 {post_data['title']}</b>
-━━━━━━━━━━━━━━━━━━━━
-
-{price_line}
-
-━━━━━━━━━━━━━━━━━━━━
-<b>📝 Описание:</b>
-━━━━━━━━━━━━━━━━━━━━
-
-{post_data['description']}
-
-━━━━━━━━━━━━━━━━━━━━
-{privilege_emoji_icon} <b>Статус продавца:</b> {privilege_label}
-━━━━━━━━━━━━━━━━━━━━
-"""
-
-        # Добавляем контактную информацию в текст поста
-        if include_contact_info:
-            async with AsyncSessionLocal() as session:
-                user = await session.get(User, post_data['user_id'])
-                seller_username = user.username if user else None
-
-            text += f"\n💬 <b>Связаться с продавцом:</b>\n"
-            text += f"🆔 ID: <code>{post_data['user_id']}</code>\n"
-
-            # Показываем username ТОЛЬКО если он валидный и не "unknown"
-            if seller_username and seller_username != "unknown" and seller_username != "без username":
-                text += f"📛 @{seller_username}"
-        else:
-            text += "\n💬 <b>Написать продавцу:</b> Нажмите кнопку ниже ⬇️"
-
-        return text
-
     async def publish_to_channel(self, post_data: dict, user_privilege: str):
+        publish_in_progress.inc()
         try:
-            # Получаем информацию о продавце
-            async with AsyncSessionLocal() as session:
-                user = await session.get(User, post_data['user_id'])
-                seller_username = user.username if user else None
+            # Вызывающий код уже загрузил продавца - в базу идем, только если username не передан
+            seller_username = post_data.get('username')
+            if seller_username is None:
+                async with AsyncSessionLocal() as session:
+                    user = await session.get(User, post_data['user_id'])
+                    seller_username = user.username if user else None
 
             from keyboards import contact_seller_keyboard
             seller_keyboard = contact_seller_keyboard(post_data['user_id'], seller_username)
 
             # Если кнопка создалась успешно - отправляем с кнопкой
             if seller_keyboard:
-                post_text = await self.format_post_text(post_data, user_privilege, include_contact_info=False)
+                post_text = render_post_caption(post_data, user_privilege)
 
                 message = await self.bot.send_photo(
                     chat_id=config.CHANNEL_ID,
@@ -283,7 +272,7 @@ class PostService:
                 )
             else:
                 # Если кнопку создать не удалось - добавляем контактную информацию в текст
-                post_text = await self.format_post_text(post_data, user_privilege, include_contact_info=True)
+                post_text = render_post_caption(post_data, user_privilege, seller_username, include_contact_info=True)
 
                 message = await self.bot.send_photo(
                     chat_id=config.CHANNEL_ID,
@@ -305,6 +294,8 @@ class PostService:
         except Exception as e:
             logging.error(f"Ошибка публикации в канал: {e}")
             raise
+        finally:
+            publish_in_progress.dec()
 
 
 class TicketService:
@@ -316,16 +307,8 @@ class TicketService:
             return ticket
 
     async def add_message_to_ticket(self, ticket_id: int, user_id: int, message_text: str, is_admin: bool = False):
-        async with AsyncSessionLocal() as session:
-            message = TicketMessage(
-                ticket_id=ticket_id,
-                user_id=user_id,
-                message_text=message_text,
-                is_admin=is_admin
-            )
-            session.add(message)
-            await session.commit()
-            return message
+        """Сохраняет сообщение тикета через буфер отложенной записи (см. ticket_message_buffer)"""
+        await ticket_message_buffer.add(ticket_id, user_id, message_text, is_admin)
 
     async def get_user_tickets(self, user_id: int):
         async with AsyncSessionLocal() as session:
@@ -339,56 +322,232 @@ class TicketService:
             result = await session.execute(stmt)
             return result.scalars().all()
 
+    async def get_tickets_page(self, status: str = None, user_id: int = None, cursor: str = None,
+                               backward: bool = False, limit: int = TICKETS_PAGE_SIZE, priority: int = None):
+        """
+        Страница тикетов, новые сверху. Keyset-пагинация по (created_at, id):
+        каждая страница - один запрос по индексу, без OFFSET и без загрузки всего списка.
+
+        Args:
+            cursor: курсор границы страницы (см. encode_ticket_cursor); None - первая страница
+            backward: листать к более новым тикетам (кнопка "назад")
+            priority: только тикеты этого приоритета (вместе со status идет по индексу
+                (status, priority, created_at))
+
+        Returns:
+            (тикеты страницы, курсор предыдущей страницы или None, курсор следующей страницы или None)
+        """
+        after = decode_ticket_cursor(cursor) if cursor else None
+
+        stmt = select(Ticket)
+        if status:
+            stmt = stmt.where(Ticket.status == status)
+        if user_id:
+            stmt = stmt.where(Ticket.user_id == user_id)
+        if priority is not None:
+            stmt = stmt.where(Ticket.priority == priority)
+
+        if after:
+            created_at, ticket_id = after
+            # Диапазон по created_at берется из индекса, id разрешает только равные created_at
+            if backward:
+                stmt = stmt.where(and_(Ticket.created_at >= created_at,
+                                       or_(Ticket.created_at > created_at, Ticket.id > ticket_id)))
+            else:
+                stmt = stmt.where(and_(Ticket.created_at <= created_at,
+                                       or_(Ticket.created_at < created_at, Ticket.id < ticket_id)))
+
+        if backward:
+            stmt = stmt.order_by(Ticket.created_at.asc(), Ticket.id.asc())
+        else:
+            stmt = stmt.order_by(Ticket.created_at.desc(), Ticket.id.desc())
+
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(stmt.limit(limit + 1))
+            tickets = list(result.scalars().all())
+
+        has_more = len(tickets) > limit
+        tickets = tickets[:limit]
+        if backward:
+            tickets.reverse()
+            has_prev, has_next = has_more, bool(after)
+        else:
+            has_prev, has_next = bool(after), has_more
+
+        if not tickets:
+            return [], None, None
+        prev_cursor = encode_ticket_cursor(tickets[0]) if has_prev else None
+        next_cursor = encode_ticket_cursor(tickets[-1]) if has_next else None
+        return tickets, prev_cursor, next_cursor
+
     async def get_ticket_by_id(self, ticket_id: int):
         async with AsyncSessionLocal() as session:
             ticket = await session.get(Ticket, ticket_id)
             return ticket
 
     async def get_ticket_messages(self, ticket_id: int):
+        await ticket_message_buffer.flush_ticket(ticket_id)
         async with AsyncSessionLocal() as session:
             stmt = select(TicketMessage).where(TicketMessage.ticket_id == ticket_id).order_by(
                 TicketMessage.created_at.asc())
             result = await session.execute(stmt)
             return result.scalars().all()
 
+    async def get_ticket_messages_page(self, ticket_id: int, before: str = None, limit: int = HISTORY_PAGE_SIZE):
+        """
+        Страница истории тикета: последние limit сообщений до курсора before,
+        от новых к старым, по индексу (ticket_id, created_at).
+
+        Returns:
+            (сообщения от новых к старым, есть ли сообщения старше)
+        """
+        await ticket_message_buffer.flush_ticket(ticket_id)
+
+        stmt = select(TicketMessage).where(TicketMessage.ticket_id == ticket_id)
+        if before:
+            created_at, message_id = decode_ticket_cursor(before)
+            stmt = stmt.where(and_(TicketMessage.created_at <= created_at,
+                                   or_(TicketMessage.created_at < created_at, TicketMessage.id < message_id)))
+        stmt = stmt.order_by(TicketMessage.created_at.desc(), TicketMessage.id.desc()).limit(limit + 1)
+
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(stmt)
+            messages = list(result.scalars().all())
+        return messages[:limit], len(messages) > limit
+
+    async def iter_ticket_messages(self, ticket_id: int, batch_size: int = 500):
+        """Все сообщения тикета по порядку, пачками по batch_size - без загрузки всей истории в память"""
+        await ticket_message_buffer.flush_ticket(ticket_id)
+
+        after = None
+        while True:
+            stmt = select(TicketMessage).where(TicketMessage.ticket_id == ticket_id)
+            if after:
+                stmt = stmt.where(and_(TicketMessage.created_at >= after.created_at,
+                                       or_(TicketMessage.created_at > after.created_at, TicketMessage.id > after.id)))
+            stmt = stmt.order_by(TicketMessage.created_at.asc(), TicketMessage.id.asc()).limit(batch_size)
+
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(stmt)
+                messages = result.scalars().all()
+
+            for message in messages:
+                yield message
+            if len(messages) < batch_size:
+                return
+            after = messages[-1]
+
     async def update_ticket_status(self, ticket_id: int, status: str, admin_id: int = None):
         async with AsyncSessionLocal() as session:
             ticket = await session.get(Ticket, ticket_id)
             if ticket:
+                now = datetime.datetime.now()
+                closing = status == "closed" and ticket.status != "closed"
+                # SLA считается от первого взятия в работу до первого закрытия: повторное открытие
+                # и закрытие отметки не сдвигают, и тикет учитывается один раз - как в ticket_sla.load.
+                # Тикет, который закрыли, не взяв в работу (пользователь закрыл новый), решенным
+                # не считается: отметка ставится при первом закрытии после взятия
+                taking = status == "in_progress" and ticket.taken_at is None
+                resolving = closing and ticket.resolved_at is None and ticket.taken_at is not None
+                if closing:
+                    ticket.closed_at = now
+                elif status != "closed":
+                    ticket.closed_at = None
+                if taking:
+                    ticket.taken_at = now
+                if resolving:
+                    ticket.resolved_at = now
                 ticket.status = status
                 if admin_id:
                     ticket.admin_id = admin_id
                 await session.commit()
+
+                if taking:
+                    ticket_sla.record("take", ticket.theme, ticket.admin_id, ticket.created_at, ticket.taken_at)
+                if resolving:
+                    ticket_sla.record("resolve", ticket.theme, ticket.admin_id, ticket.taken_at, ticket.resolved_at)
+
+                # Чат живет, пока тикет в работе у того же админа
+                chat = chat_sessions.get(ticket_id)
+                if chat and (status != "in_progress" or chat.admin_id != ticket.admin_id):
+                    chat_sessions.close(ticket_id)
                 return True
             return False
 
-    async def get_tickets_count_by_status(self, status: str = None):
+    async def get_tickets_count_by_status(self, status: str = None, priority: int = None):
         async with AsyncSessionLocal() as session:
+            stmt = select(func.count(Ticket.id))
             if status:
-                stmt = select(func.count(Ticket.id)).where(Ticket.status == status)
-            else:
-                stmt = select(func.count(Ticket.id))
+                stmt = stmt.where(Ticket.status == status)
+            if priority is not None:
+                stmt = stmt.where(Ticket.priority == priority)
             result = await session.execute(stmt)
             return result.scalar()
 
-    async def delete_ticket(self, ticket_id: int) -> bool:
-        """Удаляет тикет и все его сообщения"""
-        try:
-            async with AsyncSessionLocal() as session:
-                # Удаляем все сообщения тикета
-                stmt = delete(TicketMessage).where(TicketMessage.ticket_id == ticket_id)
-                await session.execute(stmt)
-
-                # Удаляем сам тикет
-                stmt = delete(Ticket).where(Ticket.id == ticket_id)
-                await session.execute(stmt)
+    async def take_next_ticket(self, admin_id: int):
+        """
+        Берет в работу самый важный из новых тикетов (при равном приоритете - самый старый).
+        Вершина очереди читается из индекса (status, priority, created_at) без сортировки,
+        а UPDATE с условием status = 'new' не дает двум админам взять один и тот же тикет.
 
+        Returns:
+            Ticket или None, если новых тикетов нет
+        """
+        async with AsyncSessionLocal() as session:
+            # Каждый повтор значит, что другой админ уже забрал вершину очереди, так что цикл конечен
+            while True:
+                stmt = (
+                    select(Ticket.id)
+                    .where(Ticket.status == "new")
+                    .order_by(Ticket.priority.asc(), Ticket.created_at.asc(), Ticket.id.asc())
+                    .limit(1)
+                )
+                ticket_id = await session.scalar(stmt)
+                if ticket_id is None:
+                    return None
+
+                now = datetime.datetime.now()
+                result = await session.execute(
+                    update(Ticket)
+                    .where(Ticket.id == ticket_id, Ticket.status == "new")
+                    .values(status="in_progress", admin_id=admin_id,
+                            taken_at=func.coalesce(Ticket.taken_at, now))
+                    .execution_options(synchronize_session=False)
+                )
                 await session.commit()
-                logging.info(f"Тикет удален: #{ticket_id}")
-                return True
-        except Exception as e:
-            logging.error(f"Ошибка удаления тикета {ticket_id}: {e}")
-            return False
+                if result.rowcount:
+                    ticket = await session.get(Ticket, ticket_id)
+                    if ticket.taken_at == now:
+                        ticket_sla.record("take", ticket.theme, admin_id, ticket.created_at, now)
+                    return ticket
+
+    async def get_ticket_summary(self, user_id: int = None) -> dict:
+        """
+        Сводка по тикетам одним GROUP BY-запросом: количество по статусам
+        и по приоритетам внутри каждого статуса. С user_id - только тикеты пользователя.
+        """
+        # Группировка по (status, priority) целиком читается из индекса, без обращения к таблице
+        stmt = select(Ticket.status, Ticket.priority, func.count(Ticket.id)).group_by(Ticket.status, Ticket.priority)
+        if user_id:
+            stmt = stmt.where(Ticket.user_id == user_id)
+
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(stmt)
+            rows = result.all()
+
+        summary = {
+            'total': 0,
+            'by_status': {status: 0 for status in TICKET_STATUSES},
+            'by_priority': {status: dict.fromkeys(PRIORITY_NAMES, 0) for status in TICKET_STATUSES}
+        }
+        for status, priority, count in rows:
+            summary['total'] += count
+            summary['by_status'][status] = summary['by_status'].get(status, 0) + count
+            priorities = summary['by_priority'].setdefault(status, dict.fromkeys(PRIORITY_NAMES, 0))
+            priorities[priority_name(priority)] += count
+
+        summary['active'] = summary['by_status']['new'] + summary['by_status']['in_progress']
+        return summary
 
 
 class AdminService:
@@ -436,7 +595,7 @@ class AdminService:
 
             # Статистика по привилегиям
             privileges_stats = {}
-            for privilege in config.PRIVILEGES.keys():
+            for privilege in privilege_catalogue.privileges.keys():
                 stmt = select(func.count(User.id)).where(User.privilege == privilege)
                 result = await session.execute(stmt)
                 privileges_stats[privilege] = result.scalar()
@@ -0,0 +1,58 @@
+"""
+Профилировщик запуска бота.
+
+Замеряет фазы запуска (импорты, инициализация БД, загрузка каталогов, подключение
+роутеров) и время от старта процесса до первого полученного апдейта - сколько бот
+"молчит" после деплоя. Итог пишется в лог одной таблицей перед началом polling.
+
+Модуль использует только стандартную библиотеку, чтобы его можно было импортировать
+первым и замерить все остальные импорты.
+"""
+import importlib
+import logging
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+
+class StartupProfiler:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+        self._first_update_seen = False
+
+    @contextmanager
+    def phase(self, name: str):
+        """Замеряет блок кода: with profiler.phase("init_db"): ..."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    def import_module(self, name: str):
+        """Импортирует модуль и записывает время импорта отдельной фазой"""
+        with self.phase(f"import {name}"):
+            return importlib.import_module(name)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def report(self):
+        """Пишет в лог время каждой фазы и общее время с запуска процесса"""
+        width = max((len(name) for name, _ in self.phases), default=0)
+        logging.info("⏱ Профиль запуска:")
+        for name, seconds in self.phases:
+            logging.info(f"⏱   {name:<{width}} {seconds * 1e3:8.1f} мс")
+        logging.info(f"⏱ До начала polling: {self.elapsed() * 1e3:.1f} мс")
+
+    async def first_update_middleware(self, handler, event, data):
+        """Outer-middleware апдейтов: один раз пишет время до первого апдейта"""
+        if not self._first_update_seen:
+            self._first_update_seen = True
+            logging.info(f"⏱ Первый апдейт через {self.elapsed() * 1e3:.1f} мс после запуска")
+        return await handler(event, data)
+
+
+# Глобальный экземпляр: создается при первом импорте - как можно раньше в bot.py
+startup_profiler = StartupProfiler()
@@ -0,0 +1,74 @@
+"""
+Создание Bot: все экземпляры бота ходят в один и тот же сервер Bot API.
+
+По умолчанию это api.telegram.org; TELEGRAM_API_URL подменяет его - например, на
+поддельный сервер из benchmarks/fake_telegram.py при нагрузочном тесте.
+
+На сессию каждого бота ставится BotAPIMetrics: время запросов и ошибки по методам
+(метрики baraholka_bot_api_*, см. metrics.py).
+"""
+import time
+from typing import Dict, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter, TelegramServerError,
+)
+
+from config import config
+from metrics import HistogramChild, bot_api_errors_total, bot_api_seconds
+
+# Тип ошибки для метки error; порядок важен - подклассы раньше базовых классов
+ERROR_KINDS: Tuple[Tuple[type, str], ...] = (
+    (TelegramRetryAfter, "retry_after"),
+    (TelegramNetworkError, "network"),
+    (TelegramServerError, "server"),
+    (TelegramForbiddenError, "forbidden"),
+    (TelegramBadRequest, "bad_request"),
+)
+
+
+def error_kind(error: Exception) -> str:
+    for error_type, kind in ERROR_KINDS:
+        if isinstance(error, error_type):
+            return kind
+    return "other"
+
+
+class BotAPIMetrics(BaseRequestMiddleware):
+    """Middleware сессии: время каждого запроса к Bot API и ошибки по методам"""
+
+    def __init__(self):
+        # Наборы меток по методам - при первом вызове метода, дальше без создания объектов
+        self._latency: Dict[str, HistogramChild] = {}
+
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        histogram = self._latency.get(name)
+        if histogram is None:
+            histogram = self._latency[name] = bot_api_seconds.labels(name)
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            bot_api_errors_total.labels(name, error_kind(e)).inc()
+            raise
+        finally:
+            histogram.observe(time.perf_counter() - started)
+
+
+# Глобальный экземпляр - общий для всех ботов процесса
+bot_api_metrics = BotAPIMetrics()
+
+
+def create_bot() -> Bot:
+    """Bot с токеном из настроек и сервером Bot API из TELEGRAM_API_URL"""
+    if config.TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(config.TELEGRAM_API_URL))
+    else:
+        session = AiohttpSession()
+    session.middleware(bot_api_metrics)
+    return Bot(token=config.BOT_TOKEN, session=session)
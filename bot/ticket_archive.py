@@ -0,0 +1,254 @@
+"""
+Архивация закрытых тикетов.
+
+Тикеты, закрытые больше TICKET_ARCHIVE_DAYS дней назад, вместе с сообщениями переносятся
+из tickets/ticket_messages в сжатые файлы TICKET_ARCHIVE_DIR/tickets-YYYY-MM.jsonl.gz
+(месяц закрытия, одна строка JSON на тикет). В БД остается только строка оглавления
+archived_tickets, по которой тикет находится и восстанавливается для повторного открытия.
+Рабочие таблицы и их индексы остаются размером с актуальную переписку.
+
+Файлы сжимаются gzip из стандартной библиотеки: каждая пачка дописывается
+отдельным gzip-членом, такой файл читается целиком обычным gzip.open.
+"""
+import asyncio
+import datetime
+import gzip
+import json
+import logging
+import os
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, func, insert, select
+
+from config import config
+from database import AsyncSessionLocal, ArchivedTicket, Ticket, TicketMessage
+
+ARCHIVE_BATCH = 200
+
+
+def _dump_datetime(value: Optional[datetime.datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _load_datetime(value: Optional[str]) -> Optional[datetime.datetime]:
+    return datetime.datetime.fromisoformat(value) if value else None
+
+
+def _load_resolved_at(record: dict) -> Optional[datetime.datetime]:
+    if "resolved_at" in record:
+        return _load_datetime(record["resolved_at"])
+    taken_at, closed_at = _load_datetime(record.get("taken_at")), _load_datetime(record.get("closed_at"))
+    return closed_at if taken_at and closed_at and closed_at >= taken_at else None
+
+
+def _record_prefix(ticket_id: int) -> str:
+    # id пишется первым ключом - нужная строка находится без разбора JSON остальных
+    return f'{{"id": {ticket_id},'
+
+
+class TicketArchive:
+    """Перенос закрытых тикетов в архивные файлы и восстановление из них"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        # Архивация и восстановление не должны пересекаться по одному тикету
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def archive_path(month: str) -> str:
+        return os.path.join(config.TICKET_ARCHIVE_DIR, f"tickets-{month}.jsonl.gz")
+
+    async def archive_closed(self, now: datetime.datetime = None) -> int:
+        """Архивирует все закрытые тикеты старше TICKET_ARCHIVE_DAYS дней, пачками"""
+        deadline = (now or datetime.datetime.now()) - datetime.timedelta(days=config.TICKET_ARCHIVE_DAYS)
+        archived_total = 0
+        while True:
+            async with self._lock:
+                archived = await self._archive_batch(deadline)
+            archived_total += archived
+            if archived < ARCHIVE_BATCH:
+                break
+
+        if archived_total:
+            logging.info(f"Архив тикетов: перенесено тикетов: {archived_total}")
+        return archived_total
+
+    async def _archive_batch(self, deadline: datetime.datetime) -> int:
+        async with AsyncSessionLocal() as session:
+            # id архивных тикетов повторно не выдаются: tickets объявлена с AUTOINCREMENT
+            stmt = (
+                select(Ticket)
+                .where(
+                    Ticket.status == "closed",
+                    func.coalesce(Ticket.closed_at, Ticket.created_at) < deadline
+                )
+                .order_by(Ticket.id)
+                .limit(ARCHIVE_BATCH)
+            )
+            tickets = (await session.execute(stmt)).scalars().all()
+            if not tickets:
+                return 0
+
+            ticket_ids = [ticket.id for ticket in tickets]
+            messages: Dict[int, List[dict]] = defaultdict(list)
+            stmt = (
+                select(TicketMessage)
+                .where(TicketMessage.ticket_id.in_(ticket_ids))
+                .order_by(TicketMessage.ticket_id, TicketMessage.created_at, TicketMessage.id)
+            )
+            for message in (await session.execute(stmt)).scalars():
+                messages[message.ticket_id].append({
+                    "user_id": message.user_id,
+                    "message_text": message.message_text,
+                    "is_admin": bool(message.is_admin),
+                    "created_at": _dump_datetime(message.created_at)
+                })
+
+            lines_by_month: Dict[str, List[str]] = defaultdict(list)
+            index_rows = []
+            for ticket in tickets:
+                closed_at = ticket.closed_at or ticket.created_at
+                month = closed_at.strftime("%Y-%m")
+                record = {
+                    "id": ticket.id,
+                    "user_id": ticket.user_id,
+                    "theme": ticket.theme,
+                    "admin_id": ticket.admin_id,
+                    "priority": ticket.priority,
+                    "created_at": _dump_datetime(ticket.created_at),
+                    "closed_at": _dump_datetime(closed_at),
+                    "taken_at": _dump_datetime(ticket.taken_at),
+                    "first_reply_at": _dump_datetime(ticket.first_reply_at),
+                    "resolved_at": _dump_datetime(ticket.resolved_at),
+                    "messages": messages.get(ticket.id, [])
+                }
+                lines_by_month[month].append(json.dumps(record, ensure_ascii=False))
+                index_rows.append({
+                    "ticket_id": ticket.id,
+                    "user_id": ticket.user_id,
+                    "theme": ticket.theme,
+                    "closed_at": closed_at,
+                    "archive_month": month,
+                    "messages_count": len(record["messages"])
+                })
+
+            # Сначала файл на диске, потом удаление из БД: при сбое между ними тикет
+            # просто заархивируется повторно, а при поиске берется последняя запись
+            await asyncio.to_thread(self._append, lines_by_month)
+
+            await session.execute(insert(ArchivedTicket).prefix_with("OR REPLACE"), index_rows)
+            await session.execute(delete(TicketMessage).where(TicketMessage.ticket_id.in_(ticket_ids)))
+            await session.execute(delete(Ticket).where(Ticket.id.in_(ticket_ids)))
+            await session.commit()
+            return len(tickets)
+
+    def _append(self, lines_by_month: Dict[str, List[str]]):
+        os.makedirs(config.TICKET_ARCHIVE_DIR, exist_ok=True)
+        for month, lines in lines_by_month.items():
+            data = ("\n".join(lines) + "\n").encode("utf-8")
+            with open(self.archive_path(month), "ab") as raw:
+                with gzip.GzipFile(fileobj=raw, mode="ab") as archive:
+                    archive.write(data)
+                raw.flush()
+                os.fsync(raw.fileno())
+
+    async def get_archived(self, ticket_id: int) -> Optional[ArchivedTicket]:
+        """Строка оглавления архива по номеру тикета"""
+        async with AsyncSessionLocal() as session:
+            return await session.get(ArchivedTicket, ticket_id)
+
+    async def load(self, ticket_id: int) -> Optional[dict]:
+        """Полная запись архивного тикета с сообщениями (чтение файла месяца потоком)"""
+        entry = await self.get_archived(ticket_id)
+        if not entry:
+            return None
+        return await asyncio.to_thread(self._scan, self.archive_path(entry.archive_month), ticket_id)
+
+    @staticmethod
+    def _scan(path: str, ticket_id: int) -> Optional[dict]:
+        if not os.path.exists(path):
+            logging.error(f"Файл архива тикетов не найден: {path}")
+            return None
+        prefix = _record_prefix(ticket_id)
+        found = None
+        with gzip.open(path, "rt", encoding="utf-8") as archive:
+            for line in archive:
+                if line.startswith(prefix):
+                    found = line
+        return json.loads(found) if found else None
+
+    async def restore(self, ticket_id: int, admin_id: int = None) -> Optional[Ticket]:
+        """
+        Возвращает архивный тикет в рабочие таблицы для повторного открытия:
+        в работу к admin_id или, без него, в новые.
+        """
+        async with self._lock:
+            record = await self.load(ticket_id)
+            if not record:
+                return None
+
+            ticket = Ticket(
+                id=record["id"],
+                user_id=record["user_id"],
+                theme=record["theme"],
+                status="in_progress" if admin_id else "new",
+                admin_id=admin_id or record["admin_id"],
+                priority=record["priority"],
+                created_at=_load_datetime(record["created_at"]),
+                # В архивах, записанных до появления отметок SLA, их нет
+                taken_at=_load_datetime(record.get("taken_at")),
+                first_reply_at=_load_datetime(record.get("first_reply_at")),
+                # Решение уже учтено в SLA: повторное закрытие не добавит второй замер.
+                # В архивах до появления resolved_at решением считается закрытие после взятия
+                resolved_at=_load_resolved_at(record)
+            )
+            async with AsyncSessionLocal() as session:
+                session.add(ticket)
+                # Сообщения получают новые id: старые могли уже достаться новым сообщениям
+                rows = [
+                    {
+                        "ticket_id": ticket_id,
+                        "user_id": message["user_id"],
+                        "message_text": message["message_text"],
+                        "is_admin": message["is_admin"],
+                        "created_at": _load_datetime(message["created_at"])
+                    }
+                    for message in record["messages"]
+                ]
+                await session.flush()
+                if rows:
+                    await session.execute(insert(TicketMessage), rows)
+                await session.execute(delete(ArchivedTicket).where(ArchivedTicket.ticket_id == ticket_id))
+                await session.commit()
+
+        logging.info(f"Тикет восстановлен из архива: #{ticket_id}, AdminID={admin_id}")
+        return ticket
+
+    async def _archive_loop(self):
+        while True:
+            try:
+                await self.archive_closed()
+            except Exception as e:
+                logging.error(f"Ошибка архивации тикетов: {e}", exc_info=True)
+            await asyncio.sleep(config.TICKET_ARCHIVE_INTERVAL)
+
+    def start(self):
+        """Запускает фоновую архивацию (TICKET_ARCHIVE_DAYS = 0 - отключена)"""
+        if config.TICKET_ARCHIVE_DAYS <= 0:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._archive_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Глобальный экземпляр
+ticket_archive = TicketArchive()
@@ -0,0 +1,96 @@
+"""
+История переписки по тикету.
+
+Карточка тикета показывает только последние HISTORY_PAGE_SIZE сообщений и листается
+к более ранним по курсору; страница собирается от новых сообщений к старым, пока
+помещается в лимит сообщения Telegram. Полная переписка выгружается файлом:
+сообщения читаются из БД пачками и сразу пишутся в файл, не собираясь в памяти.
+"""
+import html
+import os
+import tempfile
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from post_templates import utf16_length, visible_length
+
+# Сообщений на странице истории
+HISTORY_PAGE_SIZE = 10
+
+# Лимит текста сообщения Telegram (видимые символы в UTF-16)
+MESSAGE_LIMIT = 4096
+
+# Длинное сообщение в истории обрезается, чтобы на странице поместились и соседние
+MAX_MESSAGE_PREVIEW = 800
+
+HISTORY_TITLE = "💬 <b>История сообщений:</b>\n\n"
+EMPTY_HISTORY = "<i>Сообщений пока нет</i>"
+OLDER_HINT = "<i>⏪ Более ранние сообщения - кнопкой «Ранее»</i>\n\n"
+
+
+def _preview(text: str) -> str:
+    text = text or ""
+    if len(text) > MAX_MESSAGE_PREVIEW:
+        text = text[:MAX_MESSAGE_PREVIEW - 1] + "…"
+    return text
+
+
+def render_history_page(header: str, messages: list, sender_labels: Dict[bool, str],
+                        has_older: bool) -> Tuple[str, Optional[object]]:
+    """
+    Собирает текст карточки: header (HTML) и страница истории.
+
+    Args:
+        messages: сообщения страницы от новых к старым
+        sender_labels: подпись отправителя по is_admin
+        has_older: есть ли в БД сообщения старше страницы
+
+    Returns:
+        (HTML-текст, самое старое показанное сообщение, если есть что листать дальше, иначе None)
+    """
+    budget = MESSAGE_LIMIT - visible_length(header) - visible_length(HISTORY_TITLE) - visible_length(OLDER_HINT)
+
+    entries: List[str] = []
+    oldest_shown = None
+    for message in messages:
+        text = _preview(message.message_text)
+        label = f"{sender_labels[bool(message.is_admin)]} ({message.created_at.strftime('%d.%m %H:%M')}):"
+        length = utf16_length(label) + utf16_length(text) + 3  # переводы строк
+        if length > budget and entries:
+            # Остальные сообщения страницы уйдут на следующую страницу "Ранее"
+            has_older = True
+            break
+        budget -= length
+        entries.append(f"<b>{html.escape(label, quote=False)}</b>\n{html.escape(text, quote=False)}\n\n")
+        oldest_shown = message
+
+    if not entries:
+        return header + HISTORY_TITLE + EMPTY_HISTORY, None
+
+    entries.reverse()
+    text = header + HISTORY_TITLE + (OLDER_HINT if has_older else "") + "".join(entries)
+    return text.rstrip("\n"), oldest_shown if has_older else None
+
+
+async def write_transcript(ticket, messages: AsyncIterator, sender_labels: Dict[bool, str]) -> str:
+    """
+    Пишет полную переписку по тикету во временный текстовый файл.
+    Сообщения приходят из асинхронного итератора и пишутся по одному.
+
+    Returns:
+        путь к файлу (удалить после отправки)
+    """
+    fd, path = tempfile.mkstemp(prefix=f"ticket_{ticket.id}_", suffix=".txt")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(f"Тикет #{ticket.id}\n")
+            file.write(f"Тема: {ticket.theme}\n")
+            file.write(f"Статус: {ticket.status}\n")
+            file.write(f"Создан: {ticket.created_at.strftime('%d.%m.%Y %H:%M')}\n\n")
+            async for message in messages:
+                label = sender_labels[bool(message.is_admin)]
+                file.write(f"[{message.created_at.strftime('%d.%m.%Y %H:%M:%S')}] {label}:\n")
+                file.write(f"{message.message_text or ''}\n\n")
+    except Exception:
+        os.remove(path)
+        raise
+    return path
@@ -0,0 +1,193 @@
+"""
+Отложенная запись сообщений тикетов (write-behind).
+
+В активном чате каждое пересланное сообщение сохранялось отдельной транзакцией -
+отдельный commit и fsync SQLite на каждое сообщение. Буфер копит сообщения и пишет
+их одной транзакцией раз в TICKET_MESSAGE_FLUSH_MS миллисекунд или сразу, как только
+наберется TICKET_MESSAGE_BATCH строк.
+
+Если пачка не записалась, ее строки пишутся по одной: одна битая строка не задерживает
+остальные. Не записанные строки повторяются с растущей паузой (до MAX_RETRY_DELAY).
+Ошибка самой строки (не OperationalError) считается попыткой, и после MAX_ROW_ATTEMPTS
+попыток строка отбрасывается; OperationalError - БД заблокирована или недоступна -
+попыткой не считается, такие строки ждут, очередь ограничена MAX_PENDING.
+
+Режим TICKET_MESSAGE_DURABILITY:
+    batched   - запись пачками; при аварийном падении процесса теряются сообщения
+                за последний интервал (сами сообщения к этому моменту уже доставлены)
+    immediate - каждое сообщение коммитится сразу, как раньше
+"""
+import asyncio
+import datetime
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, update
+from sqlalchemy.exc import OperationalError
+
+from config import config
+from database import AsyncSessionLocal, Ticket, TicketMessage
+from ticket_sla import ticket_sla
+
+# Сколько строк держать в буфере, если БД недоступна: дальше старые сообщения отбрасываются
+MAX_PENDING = 10000
+# Паузы перед повтором неудавшейся записи: удваиваются от первой до максимальной (секунды)
+FIRST_RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 60.0
+# Сколько раз пробовать строку, которую отвергает сама БД (не OperationalError)
+MAX_ROW_ATTEMPTS = 5
+
+
+class TicketMessageBuffer:
+    """Буфер вставок TicketMessage"""
+
+    def __init__(self):
+        self._pending: List[dict] = []
+        # Строки, не записанные прошлыми сбросами, с числом неудачных попыток
+        self._failed: List[Tuple[dict, int]] = []
+        self._retry_delay = 0.0
+        self._flush_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        # Режим записи; бенчмарк переключает его, не трогая настройки
+        self.durability = config.TICKET_MESSAGE_DURABILITY
+
+    @property
+    def batched(self) -> bool:
+        return self.durability == "batched"
+
+    def __len__(self):
+        return len(self._pending) + len(self._failed)
+
+    async def add(self, ticket_id: int, user_id: int, message_text: str, is_admin: bool = False):
+        """Ставит сообщение в очередь на запись (в режиме immediate - пишет сразу)"""
+        row = {
+            "ticket_id": ticket_id,
+            "user_id": user_id,
+            "message_text": message_text,
+            "is_admin": is_admin,
+            # Время фиксируется при получении, а не при записи пачки
+            "created_at": datetime.datetime.now()
+        }
+        if not self.batched:
+            await self._write([row])
+            return
+
+        self._pending.append(row)
+        if len(self._pending) >= config.TICKET_MESSAGE_BATCH:
+            await self.flush()
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later(config.TICKET_MESSAGE_FLUSH_MS / 1000))
+
+    async def _flush_later(self, delay: float):
+        await asyncio.sleep(delay)
+        # Отмена таймера (close) не должна прерывать уже начатую запись: изъятая из буфера
+        # пачка потерялась бы
+        await asyncio.shield(self.flush())
+
+    async def flush(self):
+        """Пишет накопленные сообщения одной транзакцией"""
+        async with self._lock:
+            if not self._pending and not self._failed:
+                return
+            failed, self._failed = self._failed, []
+            rows, self._pending = self._pending, []
+            if rows:
+                try:
+                    await self._write(rows)
+                    rows = []
+                except Exception as e:
+                    logging.error(f"Ошибка записи сообщений тикетов ({len(rows)} шт.): {e}, пишем по одному")
+            # Порядок вставки не важен: история сортируется по created_at, заданному при получении
+            if failed or rows:
+                await self._write_one_by_one(failed + [(row, 0) for row in rows])
+
+    async def _write_one_by_one(self, rows: List[Tuple[dict, int]]):
+        """Пишет строки по одной; не записанные возвращает в очередь и планирует повтор"""
+        failed: List[Tuple[dict, int]] = []
+        dropped: List[dict] = []
+        error = None
+        for row, attempts in rows:
+            try:
+                await self._write([row])
+            except OperationalError as e:
+                # БД недоступна - строка не виновата, попытку не считаем
+                failed.append((row, attempts))
+                error = e
+            except Exception as e:
+                error = e
+                if attempts + 1 >= MAX_ROW_ATTEMPTS:
+                    dropped.append(row)
+                else:
+                    failed.append((row, attempts + 1))
+
+        if dropped:
+            logging.error(f"Отброшены сообщения тикетов после {MAX_ROW_ATTEMPTS} попыток записи: "
+                          f"{[(row['ticket_id'], row['user_id']) for row in dropped]}, ошибка: {error}")
+        if not failed:
+            self._retry_delay = 0.0
+            return
+
+        self._failed = failed[-MAX_PENDING:]
+        self._retry_delay = min(max(self._retry_delay * 2, FIRST_RETRY_DELAY), MAX_RETRY_DELAY)
+        logging.error(f"Не записано сообщений тикетов: {len(self._failed)}, ошибка: {error}; "
+                      f"повтор через {self._retry_delay:g} с")
+        # Прежний таймер заменяется повтором; если он уже пишет, запись защищена shield
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        self._flush_task = asyncio.create_task(self._flush_later(self._retry_delay))
+
+    async def flush_ticket(self, ticket_id: int):
+        """Сбрасывает буфер, если в нем есть сообщения тикета (перед чтением или удалением)"""
+        # Пока идет запись пачки, ее строк уже нет в _pending - ждем окончания записи
+        if (self._lock.locked() or any(row["ticket_id"] == ticket_id for row in self._pending)
+                or any(row["ticket_id"] == ticket_id for row, _ in self._failed)):
+            await self.flush()
+
+    @staticmethod
+    async def _write(rows: List[dict]):
+        # Первый ответ админа по тикету (для SLA): самое раннее сообщение админа в пачке
+        admin_replies: Dict[int, dict] = {}
+        for row in rows:
+            if row["is_admin"]:
+                admin_replies.setdefault(row["ticket_id"], row)
+
+        first_replies = []
+        async with AsyncSessionLocal() as session:
+            await session.execute(insert(TicketMessage), rows)
+            # Отметка ставится только один раз - пока first_reply_at пуст
+            for ticket_id, row in admin_replies.items():
+                result = await session.execute(
+                    update(Ticket)
+                    .where(Ticket.id == ticket_id, Ticket.first_reply_at.is_(None))
+                    .values(first_reply_at=row["created_at"])
+                    .returning(Ticket.theme, Ticket.admin_id, Ticket.created_at)
+                    .execution_options(synchronize_session=False)
+                )
+                ticket = result.first()
+                if ticket:
+                    first_replies.append((ticket, row))
+            await session.commit()
+
+        for ticket, row in first_replies:
+            ticket_sla.record("first_reply", ticket.theme, ticket.admin_id or row["user_id"],
+                              ticket.created_at, row["created_at"])
+
+    async def close(self):
+        """Дожидается отложенного сброса и дописывает буфер (при остановке бота)"""
+        # Таймер (в том числе долгую паузу перед повтором) отменяем - начатая им запись
+        # защищена shield и доведется до конца, flush ниже дождется ее на блокировке
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        self._flush_task = None
+        await self.flush()
+        # Повтор, запланированный неудачной записью выше, после остановки уже не нужен
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if len(self):
+            logging.error(f"При остановке не записано сообщений тикетов: {len(self)}")
+
+
+# Глобальный экземпляр
+ticket_message_buffer = TicketMessageBuffer()
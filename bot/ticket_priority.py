@@ -0,0 +1,51 @@
+"""
+Приоритет тикета.
+
+Приоритет определяется по теме один раз при создании тикета и хранится в колонке
+tickets.priority числом: чем меньше, тем важнее. Поэтому очередь "самый важный и самый
+старый тикет" - это просто ORDER BY priority, created_at по индексу.
+"""
+from typing import Optional
+
+HIGH = 0
+MEDIUM = 1
+LOW = 2
+
+# Имена приоритетов по значению колонки priority
+PRIORITY_NAMES = ("high", "medium", "low")
+PRIORITY_VALUES = {name: value for value, name in enumerate(PRIORITY_NAMES)}
+
+PRIORITY_ICONS = {
+    "high": "🔴",
+    "medium": "🟡",
+    "low": "🟢"
+}
+
+PRIORITY_TITLES = {
+    "high": "🔴 ВЫСОКИЙ",
+    "medium": "🟡 СРЕДНИЙ",
+    "low": "🟢 НИЗКИЙ"
+}
+
+
+def priority_from_theme(theme: Optional[str]) -> int:
+    """Определяет приоритет тикета по теме (значение для колонки priority)"""
+    theme_lower = (theme or "").lower()
+    if "покупка привилегии" in theme_lower or "реклам" in theme_lower or "купить" in theme_lower:
+        return HIGH
+    elif "вопрос" in theme_lower or "бот" in theme_lower or "помощь" in theme_lower:
+        return LOW
+    else:
+        return MEDIUM
+
+
+def priority_name(priority: Optional[int]) -> str:
+    """Имя приоритета ("high"/"medium"/"low") по значению колонки"""
+    if priority is None or not 0 <= priority < len(PRIORITY_NAMES):
+        return "medium"
+    return PRIORITY_NAMES[priority]
+
+
+def get_priority_icon(priority: str) -> str:
+    """Возвращает иконку для приоритета"""
+    return PRIORITY_ICONS.get(priority, "⚪")
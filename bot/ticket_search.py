@@ -0,0 +1,199 @@
+"""
+Полнотекстовый поиск по переписке в тикетах для админов (SQLite FTS5).
+
+Индексы ticket_messages_fts (текст сообщений) и tickets_fts (тема) описаны в
+database.TICKETS_FTS_DDL и обновляются триггерами при каждой записи сообщения.
+Результат - тикеты, в теме или переписке которых есть все слова запроса, от новых
+к старым. Слова не обязаны стоять в одном сообщении: каждое слово ищется отдельно, и
+тикет подходит, если каждое нашлось хотя бы в одном его сообщении или в теме. К тикету
+показывается фрагмент самого свежего сообщения с любым из слов.
+Тикеты просматриваются окнами по TICKET_WINDOW от новых к старым (как окна совпадений
+в post_search): каждая ветка поиска ограничена тикетами окна, а FTS читает только
+сообщения из диапазона id их переписки. Страница стоит не дороже MAX_WINDOWS_PER_PAGE
+окон: если подходящих тикетов мало, страница может выйти неполной (или пустой) с
+курсором, который продолжает поиск дальше. Пагинация - keyset по id тикета.
+Архивные тикеты в поиск не попадают (см. /ticket).
+"""
+import html
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, text
+
+from database import AsyncSessionLocal
+from post_search import MAX_QUERY_TERMS, build_match_query, tokenize
+from ticket_message_buffer import ticket_message_buffer
+
+PAGE_SIZE = 5
+
+# Тикетов в окне поиска и окон на одну страницу
+TICKET_WINDOW = 200
+MAX_WINDOWS_PER_PAGE = 25
+
+# Слов во фрагменте сообщения вокруг совпадения
+SNIPPET_TOKENS = 12
+
+# Маркеры совпадений в выводе snippet()/highlight(): текст экранируется для HTML
+# целиком, и только потом маркеры заменяются тегами
+_MARK_OPEN = "\x02"
+_MARK_CLOSE = "\x03"
+
+# Окно: TICKET_WINDOW тикетов ниже :before_id; меньше - окно последнее
+WINDOW_SQL = text("""
+    SELECT MIN(id), COUNT(*) FROM (
+        SELECT id FROM tickets WHERE id < :before_id ORDER BY id DESC LIMIT :window
+    )
+""")
+
+# Диапазон id сообщений тикетов окна - граница для FTS (rowid сообщений)
+MESSAGE_SPAN_SQL = text("""
+    SELECT MIN(id), MAX(id) FROM ticket_messages WHERE ticket_id >= :from_id AND ticket_id < :before_id
+""")
+
+# Совпадения одного слова запроса (:term_N) в сообщениях и в теме тикетов окна
+TERM_HITS_SQL = """
+        SELECT m.ticket_id, {index}, m.id
+        FROM ticket_messages_fts f
+        JOIN ticket_messages m ON m.id = f.rowid
+        WHERE ticket_messages_fts MATCH :term_{index}
+          AND f.rowid >= :first_message_id AND f.rowid <= :last_message_id
+          AND m.ticket_id >= :from_id AND m.ticket_id < :before_id
+        UNION ALL
+        SELECT rowid, {index}, NULL FROM tickets_fts
+        WHERE tickets_fts MATCH :term_{index} AND rowid >= :from_id AND rowid < :before_id
+"""
+
+# Тикет подходит, если в нем нашлись все слова (:terms) - в любых сообщениях или в теме
+TICKETS_SQL = """
+    WITH hits(ticket_id, term, message_id) AS ({hits})
+    SELECT t.id, t.user_id, t.theme, t.status, t.priority,
+           COUNT(DISTINCT h.message_id) AS matches, MAX(h.message_id) AS last_message_id
+    FROM hits h
+    JOIN tickets t ON t.id = h.ticket_id
+    GROUP BY t.id
+    HAVING COUNT(DISTINCT h.term) = :terms
+    ORDER BY t.id DESC
+    LIMIT :limit
+"""
+
+SNIPPETS_SQL = text(f"""
+    SELECT rowid, snippet(ticket_messages_fts, 0, char(2), char(3), '…', {SNIPPET_TOKENS})
+    FROM ticket_messages_fts
+    WHERE ticket_messages_fts MATCH :match AND rowid IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+
+THEMES_SQL = text("""
+    SELECT rowid, highlight(tickets_fts, 0, char(2), char(3))
+    FROM tickets_fts
+    WHERE tickets_fts MATCH :match AND rowid IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+
+
+@dataclass
+class TicketSearchHit:
+    id: int
+    user_id: int
+    theme: str
+    status: str
+    priority: int
+    matches: int
+    # HTML с выделенными совпадениями
+    theme_html: str = ""
+    snippet_html: Optional[str] = None
+
+
+def highlight_html(value: str) -> str:
+    """Экранирует фрагмент FTS5 для parse_mode=HTML и выделяет совпадения жирным"""
+    value = html.escape(value or "", quote=False)
+    return value.replace(_MARK_OPEN, "<b>").replace(_MARK_CLOSE, "</b>")
+
+
+class TicketSearch:
+    async def search(self, query: str, cursor: str = None,
+                     limit: int = PAGE_SIZE) -> Tuple[List[TicketSearchHit], Optional[str]]:
+        """
+        Ищет тикеты по теме и переписке.
+
+        Returns:
+            (тикеты страницы, курсор следующей страницы или None)
+        """
+        match = build_match_query(tokenize(query)[:MAX_QUERY_TERMS])
+        if not match:
+            return [], None
+        # Выражения отдельных слов (экранированы build_match_query, пробелов внутри нет)
+        term_matches = match.split(" ")
+        # Фрагменты и подсветка - по любому из слов: в сообщении может быть только часть
+        any_match = " OR ".join(term_matches)
+        before_id = int(cursor) if cursor and cursor.isdigit() else 2 ** 63 - 1
+        tickets_sql = text(TICKETS_SQL.format(
+            hits=" UNION ALL ".join(TERM_HITS_SQL.format(index=index) for index in range(len(term_matches)))
+        ))
+        params = {f"term_{index}": term for index, term in enumerate(term_matches)}
+        params["terms"] = len(term_matches)
+
+        # Сообщения из буфера записи тоже должны находиться
+        await ticket_message_buffer.flush()
+
+        async with AsyncSessionLocal() as session:
+            rows = []
+            next_cursor = None
+            for _ in range(MAX_WINDOWS_PER_PAGE):
+                from_id, count = (await session.execute(
+                    WINDOW_SQL, {"before_id": before_id, "window": TICKET_WINDOW}
+                )).one()
+                if not count:
+                    break
+                last = count < TICKET_WINDOW
+                if last:
+                    from_id = 0
+                first_message_id, last_message_id = (await session.execute(
+                    MESSAGE_SPAN_SQL, {"from_id": from_id, "before_id": before_id}
+                )).one()
+                rows += (await session.execute(tickets_sql, {
+                    **params, "from_id": from_id, "before_id": before_id,
+                    "first_message_id": first_message_id or 0, "last_message_id": last_message_id or -1,
+                    "limit": limit + 1 - len(rows)
+                })).all()
+                if len(rows) > limit:
+                    rows = rows[:limit]
+                    next_cursor = str(rows[-1].id)
+                    break
+                if last:
+                    break
+                before_id = from_id
+            else:
+                # Лимит окон на страницу исчерпан - дальше продолжит следующая страница
+                next_cursor = str(before_id)
+            if not rows:
+                return [], next_cursor
+
+            ticket_ids = [row.id for row in rows]
+            message_ids = [row.last_message_id for row in rows if row.last_message_id]
+            themes: Dict[int, str] = dict(
+                (await session.execute(THEMES_SQL, {"match": any_match, "ids": ticket_ids})).all()
+            )
+            snippets: Dict[int, str] = {}
+            if message_ids:
+                snippets = dict(
+                    (await session.execute(SNIPPETS_SQL, {"match": any_match, "ids": message_ids})).all()
+                )
+
+        hits = []
+        for row in rows:
+            snippet = snippets.get(row.last_message_id)
+            hits.append(TicketSearchHit(
+                id=row.id,
+                user_id=row.user_id,
+                theme=row.theme,
+                status=row.status,
+                priority=row.priority,
+                matches=row.matches,
+                theme_html=highlight_html(themes.get(row.id, row.theme)),
+                snippet_html=highlight_html(snippet) if snippet is not None else None
+            ))
+
+        return hits, next_cursor
+
+
+# Глобальный экземпляр
+ticket_search = TicketSearch()
@@ -0,0 +1,167 @@
+"""
+SLA по тикетам: как быстро поддержка берет тикеты и отвечает.
+
+Метрики (в секундах):
+    take         - от создания тикета до взятия в работу (new -> in_progress)
+    first_reply  - от создания тикета до первого ответа админа
+    resolve      - от взятия в работу до первого закрытия (in_progress -> closed)
+
+Перцентили считаются потоковыми квантильными скетчами (логарифмическая гистограмма,
+как в DDSketch): значение попадает в корзину, границы которых растут в геометрической
+прогрессии, и любой квантиль оценивается с относительной погрешностью SKETCH_ACCURACY.
+Скетч - несколько сотен счетчиков независимо от числа тикетов, строки не хранятся
+и не сортируются. Скетчи ведутся по темам и по админам и обновляются событиями из
+TicketService и буфера сообщений; при запуске бота строятся одним проходом по tickets
+(архивные тикеты в статистику не входят).
+"""
+import datetime
+import logging
+import math
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import or_, select
+
+from database import AsyncSessionLocal, Ticket
+
+# Относительная погрешность квантилей: 2% - медиана "10 мин" означает 9.8-10.2 мин
+SKETCH_ACCURACY = 0.02
+
+# Интервалы короче секунды считаются нулевыми
+MIN_SECONDS = 1.0
+
+LOAD_BATCH = 1000
+
+METRICS = ("take", "first_reply", "resolve")
+
+METRIC_TITLES = {
+    "take": "⏳ Взятие в работу",
+    "first_reply": "💬 Первый ответ",
+    "resolve": "✅ Решение",
+}
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class QuantileSketch:
+    """Потоковая оценка квантилей с относительной погрешностью accuracy; значения меньше min_value считаются нулем"""
+
+    def __init__(self, accuracy: float = SKETCH_ACCURACY, min_value: float = MIN_SECONDS):
+        self.min_value = min_value
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = defaultdict(int)
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value: float):
+        self.count += 1
+        if value < self.min_value:
+            self.zero_count += 1
+        else:
+            # Корзина k покрывает интервал (gamma^(k-1), gamma^k]
+            self.buckets[math.ceil(math.log(value) / self._log_gamma)] += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        # Сортируются корзины (сотни), а не значения
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "—"
+    if seconds < 60:
+        return f"{seconds:.0f} с"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} мин"
+    if seconds < 86400:
+        return f"{seconds / 3600:.1f} ч"
+    return f"{seconds / 86400:.1f} д"
+
+
+class TicketSLA:
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        # {метрика: {("all", None) | ("theme", тема) | ("admin", admin_id): скетч}}
+        self._sketches: Dict[str, Dict[Tuple[str, object], QuantileSketch]] = {
+            metric: defaultdict(QuantileSketch) for metric in METRICS
+        }
+
+    def record(self, metric: str, theme: str, admin_id: Optional[int],
+               start: Optional[datetime.datetime], end: Optional[datetime.datetime]):
+        """Учитывает интервал start -> end в общем скетче метрики, скетче темы и скетче админа"""
+        if start is None or end is None:
+            return
+        seconds = (end - start).total_seconds()
+        if seconds < 0:
+            # Отметки не по порядку - битые данные, а не мгновенный ответ: в скетч не идут
+            logging.debug(f"SLA {metric}: конец интервала раньше начала ({start} -> {end}), пропущено")
+            return
+        sketches = self._sketches[metric]
+        sketches[("all", None)].add(seconds)
+        sketches[("theme", theme or "—")].add(seconds)
+        if admin_id:
+            sketches[("admin", admin_id)].add(seconds)
+
+    def record_ticket(self, ticket):
+        """Учитывает все отметки тикета (при построении скетчей из БД)"""
+        self.record("take", ticket.theme, ticket.admin_id, ticket.created_at, ticket.taken_at)
+        self.record("first_reply", ticket.theme, ticket.admin_id, ticket.created_at, ticket.first_reply_at)
+        self.record("resolve", ticket.theme, ticket.admin_id, ticket.taken_at, ticket.resolved_at)
+
+    def summary(self, metric: str, group: str) -> List[Tuple[object, int, List[Optional[float]]]]:
+        """
+        Перцентили QUANTILES метрики по группе ("all", "theme" или "admin").
+
+        Returns:
+            [(тема или admin_id, количество, [p50, p90, p99])], сначала самые частые
+        """
+        rows = [
+            (key, sketch.count, [sketch.quantile(q) for q in QUANTILES])
+            for (kind, key), sketch in self._sketches[metric].items()
+            if kind == group
+        ]
+        rows.sort(key=lambda row: -row[1])
+        return rows
+
+    async def load(self):
+        """Строит скетчи одним проходом по тикетам (keyset по id, пачками)"""
+        try:
+            self._reset()
+            after_id = 0
+            loaded = 0
+            while True:
+                stmt = (
+                    select(Ticket.id, Ticket.theme, Ticket.admin_id, Ticket.created_at,
+                           Ticket.taken_at, Ticket.first_reply_at, Ticket.resolved_at)
+                    .where(Ticket.id > after_id, or_(Ticket.taken_at.isnot(None), Ticket.first_reply_at.isnot(None)))
+                    .order_by(Ticket.id)
+                    .limit(LOAD_BATCH)
+                )
+                async with AsyncSessionLocal() as session:
+                    rows = (await session.execute(stmt)).all()
+                for row in rows:
+                    self.record_ticket(row)
+                loaded += len(rows)
+                if len(rows) < LOAD_BATCH:
+                    break
+                after_id = rows[-1].id
+            logging.info(f"SLA тикетов: учтено тикетов: {loaded}")
+        except Exception as e:
+            logging.error(f"Ошибка построения SLA тикетов: {e}", exc_info=True)
+
+
+# Глобальный экземпляр
+ticket_sla = TicketSLA()